@@ -1,5 +1,9 @@
 from flask import Flask
+from app.utils import metrics
 from app.utils.data_service import data_service
+from app.utils.enrichment import enricher
+from app.utils.status_poller import status_poller
+from app.utils.tag_cache import tag_cache
 import os
 
 def create_app():
@@ -12,6 +16,12 @@ def create_app():
     # This will create the data directory and initialize databases
     data_service.storify  # Access to initialize
     
+    # The status poller thread starts with the first /player/events client
+    status_poller.init_app(app)
+    
+    # Request latency per blueprint, exposed with the player metrics on /metrics
+    metrics.init_app(app)
+    
     # Ensure the instance folder exists
     os.makedirs(app.instance_path, exist_ok=True)
     
@@ -26,9 +36,14 @@ def create_app():
     app.register_blueprint(playlists_bp, url_prefix='/playlists')
     app.register_blueprint(files_bp, url_prefix='/files')
     
-    # Register cleanup handler
-    @app.teardown_appcontext
-    def close_data_service(error):
-        data_service.flush_all()
+    # Open the configured storage; changes are written to disk in the
+    # background, not after every request
+    data_service.init_app(app)
+    
+    # Tags already read from unchanged files aren't parsed again
+    tag_cache.init_app(app)
+    
+    # Reads the tags of tracks added before their files were read (LAZY_METADATA)
+    enricher.init_app(app)
     
     return app 
\ No newline at end of file
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from app.utils import filesystem, audtool
 from app.utils.playlist_service import PlaylistService
+from app.utils.player_queue import player_queue
 
 files_bp = Blueprint('files', __name__)
 
@@ -28,6 +29,7 @@ def play_file():
         }), 400
     
     # Clear current playlist and add the new file
+    player_queue.cancel()
     audtool.clear_playlist()
     audtool.add_song(file_path)
     audtool.play()
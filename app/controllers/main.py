@@ -1,7 +1,7 @@
-from flask import Blueprint, render_template, jsonify, current_app
-from app.utils import audtool
+from flask import Blueprint, Response, render_template, jsonify, current_app
+from app.utils import audtool, metrics
 from app.utils.playlist_service import PlaylistService
-from app.utils.data_service import data_service
+from app.utils.status_poller import build_player_status
 
 main_bp = Blueprint('main', __name__)
 
@@ -30,95 +30,33 @@ def index():
     """Render the main application page."""
     return render_template('index.html')
 
+@main_bp.route('/metrics')
+def metrics_endpoint():
+    """Expose player call and request metrics in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 @main_bp.route('/status')
 def status():
     """Get the current player status for the UI."""
     try:
-        # Get playback status and song info with fallbacks for errors
-        try:
-            current_song = audtool.get_current_song_info()
-        except Exception as e:
-            current_app.logger.error(f"Error getting current song info: {str(e)}")
-            current_song = {
-                'title': None, 'artist': None, 'album': None, 'length': None,
-                'length_seconds': 0, 'position': None, 'position_seconds': 0, 
-                'bitrate': None, 'filename': None
-            }
-            
-        try:
-            status = audtool.get_playback_status()
-        except Exception:
-            status = 'stopped'
-            
-        try:
-            volume = audtool.get_volume()
-            if volume is None:
-                volume = 50  # Default volume
-        except Exception:
-            volume = 50  # Default volume
-            
-        try:
-            position = audtool.get_playlist_position()
-            if position is None:
-                position = 0
-        except Exception:
-            position = 0
-            
-        try:
-            playlist_length = audtool.get_playlist_length()
-            if playlist_length is None or playlist_length == '0':
-                playlist_length = 0
-        except Exception:
-            playlist_length = 0
-        
-        # Get settings with fallbacks for errors
-        try:
-            repeat = audtool.get_repeat_status()
-        except Exception:
-            repeat = 'off'
-            
-        try:
-            shuffle = audtool.get_shuffle_status()
-        except Exception:
-            shuffle = 'off'
-            
-        try:
-            stop_after = audtool.get_stop_after_status()
-        except Exception:
-            stop_after = 'off'
-            
-        try:
-            auto_advance = audtool.get_auto_advance_status()
-        except Exception:
-            auto_advance = 'on'
+        # The same status /player/status reports, queued volume and seek included
+        player_status = build_player_status(audtool.get_player_snapshot())
         
         # Get all playlists from our database
         playlists = [p.to_dict() for p in PlaylistService.get_all_playlists()]
         
-        # Try to find the track in our database
-        track_id = None
-        if current_song.get('filename'):
-            tracks_db = data_service.get_tracks_db()
-            for track in tracks_db.data.values():
-                if hasattr(track, 'filename') and track.filename == current_song['filename']:
-                    track_id = track.id
-                    break
-        
         return jsonify({
             'success': True,
-            'status': status,
-            'current_song': current_song,
-            'track_id': track_id,
-            'volume': volume,
-            'position': position,
-            'playlist_length': playlist_length,
+            'status': player_status['status'],
+            'player_available': player_status['player_available'],
+            'current_song': player_status['song'],
+            'track_id': player_status['track_id'],
+            'volume': player_status['volume'],
+            'position': player_status['position'],
+            'playlist_length': player_status['playlist_length'],
+            'load_progress': player_status['load_progress'],
             'playlists': playlists,
-            'settings': {
-                'repeat': repeat == 'on',
-                'shuffle': shuffle == 'on',
-                'stop_after': stop_after == 'on',
-                'auto_advance': auto_advance == 'on'
-            }
+            'settings': player_status['settings']
         })
     except Exception as e:
         return jsonify({
@@ -1,30 +1,46 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from queue import Empty
 from app.utils import audtool
-from app.utils.data_service import data_service
+from app.utils.command_queue import command_queue
+from app.utils.player_queue import player_queue
+from app.utils.status_poller import status_poller, build_player_status, format_sse
 
 player_bp = Blueprint('player', __name__)
 
+# Seconds between keep-alive comments on idle event streams
+EVENTS_KEEPALIVE = 15
+
 @player_bp.route('/status', methods=['GET'])
 def get_status():
     """Get the current playback status and song information."""
-    status = audtool.get_playback_status()
-    song_info = audtool.get_current_song_info()
+    status = build_player_status(audtool.get_player_snapshot())
+    status['success'] = True
+    return jsonify(status)
+
+@player_bp.route('/events', methods=['GET'])
+def events():
+    """Stream player status changes as Server-Sent Events."""
+    client = status_poller.subscribe()
     
-    # Try to find the track in our database by filename
-    track = None
-    if song_info.get('filename'):
-        tracks_db = data_service.get_tracks_db()
-        for existing_track in tracks_db.data.values():
-            if hasattr(existing_track, 'filename') and existing_track.filename == song_info['filename']:
-                track = existing_track
-                break
+    def stream():
+        try:
+            # Start every client off with the current state, positioned at this instant
+            yield format_sse('status', build_player_status(audtool.get_player_snapshot()))
+            while True:
+                try:
+                    event, data = client.get(timeout=EVENTS_KEEPALIVE)
+                except Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(event, data)
+        finally:
+            status_poller.unsubscribe(client)
     
-    return jsonify({
-        'success': True,
-        'status': status,
-        'song': song_info,
-        'track_id': track.id if track else None
-    })
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @player_bp.route('/play', methods=['POST'])
 def play():
@@ -74,8 +90,15 @@ def seek():
             'error': 'Missing position parameter'
         }), 400
     
-    audtool.seek(position)
-    return jsonify({'success': True})
+    # Applied in the background; a newer seek replaces one still waiting
+    try:
+        position = command_queue.submit('seek', max(0, int(float(position))))
+        return jsonify({'success': True, 'position': position})
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Position must be a number of seconds'
+        }), 400
 
 @player_bp.route('/seek-relative', methods=['POST'])
 def seek_relative():
@@ -116,8 +139,9 @@ def set_volume():
     # Ensure volume is in valid range
     try:
         volume = max(0, min(100, int(volume)))
-        audtool.set_volume(volume)
-        return jsonify({'success': True})
+        # Applied in the background; a newer volume replaces one still waiting
+        command_queue.submit('volume', volume)
+        return jsonify({'success': True, 'volume': volume})
     except ValueError:
         return jsonify({
             'success': False,
@@ -127,19 +151,11 @@ def set_volume():
 @player_bp.route('/settings', methods=['GET'])
 def get_settings():
     """Get current player settings."""
-    repeat = audtool.get_repeat_status()
-    shuffle = audtool.get_shuffle_status()
-    stop_after = audtool.get_stop_after_status()
-    auto_advance = audtool.get_auto_advance_status()
+    snapshot = audtool.get_player_snapshot()
     
     return jsonify({
         'success': True,
-        'settings': {
-            'repeat': repeat == 'on',
-            'shuffle': shuffle == 'on',
-            'stop_after': stop_after == 'on',
-            'auto_advance': auto_advance == 'on'
-        }
+        'settings': dict(snapshot['settings'])
     })
 
 @player_bp.route('/settings/toggle-repeat', methods=['POST'])
@@ -169,6 +185,7 @@ def toggle_auto_advance():
 @player_bp.route('/clear', methods=['POST'])
 def clear_audacious():
     """Clear the Audacious playlist (to maintain clean slate)."""
+    player_queue.cancel()
     audtool.clear_playlist()
     return jsonify({'success': True})
 
@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from app.utils import audtool
 from app.utils.playlist_service import PlaylistService
+from app.utils.player_queue import player_queue
 
 playlists_bp = Blueprint('playlists', __name__)
 
@@ -233,6 +234,21 @@ def update_settings(playlist_id):
 def play_playlist(playlist_id):
     """Load a playlist into Audacious and start playback."""
     try:
+        data = request.get_json(silent=True) or {}
+        start_index = int(data.get('start_index', 0))
+        
+        if current_app.config.get('PROGRESSIVE_PLAYLIST_START', True):
+            # Start the selected track right away, load the rest in the background
+            success = PlaylistService.play_playlist(playlist_id, start_index)
+            
+            if not success:
+                return jsonify({
+                    'success': False,
+                    'error': f'Failed to load playlist {playlist_id}'
+                }), 404
+            
+            return jsonify({'success': True})
+        
         # First, ensure we have fully cleared Audacious
         audtool.clear_playlist()
         
@@ -246,6 +262,8 @@ def play_playlist(playlist_id):
             }), 404
         
         # Start playback
+        if start_index:
+            audtool.jump_to_song(start_index + 1)  # audtool uses 1-indexed positions
         audtool.play()
         
         return jsonify({'success': True})
@@ -263,6 +281,7 @@ def migrate_playlists():
         
         # Clear all Audacious playlists 
         # (we'll use our new system from now on)
+        player_queue.cancel()
         num_playlists = audtool.get_number_of_playlists()
         if num_playlists:
             for i in range(int(num_playlists)):
@@ -455,7 +474,7 @@ def debug_playlist(playlist_id):
         debug_info = {
             'playlist_id': playlist_id,
             'playlist_name': playlist.name,
-            'track_ids': playlist.track_ids,
+            'track_ids': list(playlist.track_ids),
             'tracks_count': len(tracks),
             'tracks': [
                 {
@@ -50,6 +50,16 @@ async function fetchAPI(endpoint, method = 'GET', data = null) {
 // Global state
 let currentPlaylist = null;
 let updateInterval = null;
+let statusEvents = null;
+let positionTimer = null;
+let seeking = false;
+
+// Playback position as last reported by the server
+let playback = { positionMs: 0, lengthSeconds: 0, playing: false, receivedAt: 0 };
+
+// How often to resync the interpolated position, or to poll without SSE
+const POSITION_RESYNC_MS = 30000;
+const STATUS_POLL_MS = 5000;
 
 // Initialize the application
 async function init() {
@@ -59,7 +69,7 @@ async function init() {
     // Set up event handlers
     setupEventHandlers();
     
-    // Start status update interval
+    // Start receiving player status updates
     startStatusUpdates();
     
     logDebug('Application initialized');
@@ -99,6 +109,7 @@ async function loadPlaylistTracks(playlistId) {
         
         response.playlist.tracks.forEach((track, index) => {
             const tr = document.createElement('tr');
+            tr.dataset.trackId = track.id;
             
             tr.innerHTML = `
                 <td>${track.id}</td>
@@ -139,6 +150,20 @@ async function loadPlaylistTracks(playlistId) {
     }
 }
 
+// Fill in the tags of listed tracks that were read after they were added
+function updateTrackRows(tracks) {
+    tracks.forEach(track => {
+        const tr = document.querySelector(`#tracks-table tbody tr[data-track-id="${track.id}"]`);
+        if (!tr) {
+            return;
+        }
+        tr.cells[1].textContent = track.title || 'Unknown';
+        tr.cells[2].textContent = track.artist || 'Unknown';
+        tr.cells[3].textContent = track.album || 'Unknown';
+        tr.cells[4].textContent = track.length || '0:00';
+    });
+}
+
 // Load settings for a playlist
 async function loadPlaylistSettings(playlistId) {
     const response = await fetchAPI(`/playlists/${playlistId}`);
@@ -251,19 +276,14 @@ async function playTrack(playlistId, index) {
     // First ensure this playlist is the current one
     await setCurrentPlaylist(playlistId);
     
-    // Then load the playlist into the player
-    const loadResponse = await fetchAPI(`/playlists/${playlistId}/play`, 'POST');
+    // Then load the playlist into the player, starting at the chosen track;
+    // the server starts playback right away and loads the rest in the background
+    const loadResponse = await fetchAPI(`/playlists/${playlistId}/play`, 'POST', {
+        start_index: index || 0
+    });
     
     if (loadResponse.success) {
         logDebug(`Loaded playlist ${playlistId} for playback`);
-        
-        // Jump to the specific track if index is provided
-        if (index !== undefined) {
-            await fetchAPI(`/player/jump-to/${index}`, 'POST');
-            
-            // Then start playback
-            await fetchAPI('/player/play', 'POST');
-        }
     }
 }
 
@@ -301,34 +321,74 @@ async function updatePlayerStatus() {
     const response = await fetchAPI('/player/status');
     
     if (response.success) {
-        const song = response.song;
-        const status = response.status;
-        
-        // Update now playing info
-        document.getElementById('current-title').textContent = song.title || '-';
-        document.getElementById('current-artist').textContent = song.artist || '-';
-        document.getElementById('current-album').textContent = song.album || '-';
-        document.getElementById('current-filename').textContent = song.filename || '-';
-        
-        // Update time display
-        const currentTime = document.getElementById('current-time');
-        const totalTime = document.getElementById('total-time');
-        currentTime.textContent = song.position || '0:00';
-        totalTime.textContent = song.length || '0:00';
-        
-        // Update seek slider
-        const seekSlider = document.getElementById('seek-slider');
-        if (song.length_seconds && parseInt(song.length_seconds) > 0) {
-            seekSlider.disabled = false;
-            seekSlider.max = song.length_seconds;
-            seekSlider.value = song.position_seconds || 0;
-        } else {
-            seekSlider.disabled = true;
-            seekSlider.value = 0;
-        }
+        renderPlayerStatus(response);
+    }
+}
+
+// Render a status payload from /player/status or the /player/events stream
+function renderPlayerStatus(response) {
+    const song = response.song;
+    
+    // Update now playing info
+    document.getElementById('current-title').textContent =
+        response.player_available === false ? 'Audacious is not responding' : (song.title || '-');
+    document.getElementById('current-artist').textContent = song.artist || '-';
+    document.getElementById('current-album').textContent = song.album || '-';
+    document.getElementById('current-filename').textContent = song.filename || '-';
+    document.getElementById('total-time').textContent = song.length || '0:00';
+    
+    // Remember where playback was when the server sent this; the position
+    // is moved forward locally from here until the next update
+    playback = {
+        positionMs: song.position_ms || (parseInt(song.position_seconds) || 0) * 1000,
+        lengthSeconds: parseInt(song.length_seconds) || 0,
+        playing: response.status === 'playing',
+        receivedAt: performance.now()
+    };
+    
+    // Update seek slider
+    const seekSlider = document.getElementById('seek-slider');
+    if (playback.lengthSeconds > 0) {
+        seekSlider.disabled = false;
+        seekSlider.max = playback.lengthSeconds;
+    } else {
+        seekSlider.disabled = true;
+        seekSlider.value = 0;
+    }
+    
+    renderPosition();
+}
+
+// Current playback position in milliseconds, interpolated from the last update
+function currentPositionMs() {
+    let position = playback.positionMs;
+    if (playback.playing) {
+        position += performance.now() - playback.receivedAt;
+    }
+    if (playback.lengthSeconds > 0) {
+        position = Math.min(position, playback.lengthSeconds * 1000);
+    }
+    return position;
+}
+
+// Update the time display and seek slider without asking the server
+function renderPosition() {
+    const seconds = Math.floor(currentPositionMs() / 1000);
+    document.getElementById('current-time').textContent = formatTime(seconds);
+    
+    const seekSlider = document.getElementById('seek-slider');
+    if (!seekSlider.disabled && !seeking) {
+        seekSlider.value = seconds;
     }
 }
 
+// Format seconds as m:ss
+function formatTime(seconds) {
+    const minutes = Math.floor(seconds / 60);
+    const rest = seconds % 60;
+    return `${minutes}:${rest < 10 ? '0' : ''}${rest}`;
+}
+
 // Update UI with current playlist
 function updateCurrentPlaylistUI() {
     if (currentPlaylist) {
@@ -422,28 +482,48 @@ function setupEventHandlers() {
     const volumeSlider = document.getElementById('volume-slider');
     const volumeValue = document.getElementById('volume-value');
     
+    // The server only applies the latest volume, so it can follow the drag
     volumeSlider.addEventListener('input', () => {
         volumeValue.textContent = volumeSlider.value;
-    });
-    
-    volumeSlider.addEventListener('change', () => {
         setVolume(volumeSlider.value);
     });
     
     // Seek control
     const seekSlider = document.getElementById('seek-slider');
+    seekSlider.addEventListener('input', () => {
+        seeking = true;
+    });
     seekSlider.addEventListener('change', () => {
+        seeking = false;
         seekTo(seekSlider.value);
     });
 }
 
-// Start interval to update status
+// Subscribe to status changes pushed by the server
 function startStatusUpdates() {
-    // First update immediately
+    // Move the seek bar locally; the server is only asked when something changes
+    positionTimer = setInterval(renderPosition, 250);
+    
+    // Resync now and then in case the local clock drifted from the player
     updatePlayerStatus();
+    updateInterval = setInterval(updatePlayerStatus, window.EventSource ? POSITION_RESYNC_MS : STATUS_POLL_MS);
+    
+    if (!window.EventSource) {
+        // No Server-Sent Events support, so the interval above polls instead
+        return;
+    }
     
-    // Then set an interval to update every second
-    updateInterval = setInterval(updatePlayerStatus, 1000);
+    // The server sends the current state on connect and then only changes;
+    // EventSource reconnects on its own if the connection drops
+    statusEvents = new EventSource('/player/events');
+    statusEvents.addEventListener('status', (e) => {
+        const status = JSON.parse(e.data);
+        logDebug('Player status changed', status);
+        renderPlayerStatus(status);
+    });
+    statusEvents.addEventListener('tracks', (e) => {
+        updateTrackRows(JSON.parse(e.data).tracks);
+    });
 }
 
 // Debug a playlist
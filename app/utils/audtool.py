@@ -1,23 +1,376 @@
-import subprocess
+import functools
+import re
 import shlex
+import tempfile
+import threading
+import time
 from flask import current_app
 import os
+from app.utils import metrics, player_backend
+from app.utils.fake_audacious import format_time
+
+def _call_player(method, *args):
+    """Call a backend method within the player's call limits.
+
+    Returns None (or None per command for batches) without touching the
+    player while the circuit breaker is open or no call slot frees up in time.
+    Every call is timed and counted in the player metrics.
+    """
+    if method == 'run_batch':
+        empty = [None] * len(args[0])
+        command = f"{args[0][0][0]} (batch)" if args[0] else 'batch'
+    else:
+        empty = None
+        command = args[0] if args else ''
+    route = metrics.current_route()
+    timeout = current_app.config.get('AUDTOOL_TIMEOUT', 2.0)
+    breaker = player_backend.breaker
+
+    with player_backend.call_slot(timeout) as acquired:
+        if not acquired:
+            metrics.player_call_errors.inc(command=command, route=route, reason='rejected')
+            current_app.logger.warning("Too many player calls in flight, giving up on this one")
+            return empty
+        if not breaker.allow():
+            metrics.player_call_errors.inc(command=command, route=route, reason='rejected')
+            return empty
+
+        metrics.player_calls.inc(command=command, route=route)
+        started = time.perf_counter()
+        try:
+            result = getattr(player_backend.get_backend(), method)(*args)
+        except player_backend.PlayerUnavailable as e:
+            metrics.player_call_errors.inc(command=command, route=route, reason='unavailable')
+            if breaker.record_failure():
+                current_app.logger.error(f"Audacious is not responding, pausing player calls: {e}")
+            return empty
+        except Exception as e:
+            metrics.player_call_errors.inc(command=command, route=route, reason='error')
+            breaker.record_success()
+            current_app.logger.error(f"Error executing audtool: {str(e)}")
+            return empty
+        finally:
+            metrics.player_call_seconds.observe(time.perf_counter() - started, command=command, route=route)
+
+        if breaker.record_success():
+            current_app.logger.info("Audacious is responding again")
+        return result
 
 def run_audtool(*args):
-    """Run audtool with the given arguments."""
+    """Run an audtool command through the configured player backend."""
+    return _call_player('run', *args)
+
+def run_audtool_batch(commands):
+    """Run several one-line audtool commands in as few player calls as possible.
+
+    Returns one output (or None) per command, in order.
+    """
+    return _call_player('run_batch', list(commands))
+
+def player_available():
+    """False while the circuit breaker has given up on reaching the player."""
+    return not player_backend.breaker.is_open
+
+# Player snapshot
+#
+# Every status endpoint needs the same handful of facts about the player. They
+# are collected together in one round and shared by all callers for
+# PLAYER_SNAPSHOT_TTL seconds, so N clients polling at once cost one set of
+# player queries per TTL window instead of one per request.
+#
+# While the same song keeps playing, its details and the playback position are
+# not re-read on every snapshot: the position is extrapolated from the last
+# measurement and only re-measured every PLAYER_POSITION_RESYNC seconds, when
+# the song or playback state changes, or after one of our own commands.
+_snapshot = None
+_snapshot_expires = 0.0
+_snapshot_lock = threading.Lock()
+_invalidation_callbacks = []
+_song_cache = None
+_position_stale = True
+_position_sync = 0
+
+# Milliseconds a re-measured position may differ from the extrapolated one
+# before it counts as a seek
+POSITION_JUMP_TOLERANCE = 2000
+
+def _empty_song_info():
+    return {
+        'title': None,
+        'artist': None,
+        'album': None,
+        'length': None,
+        'length_seconds': 0,
+        'position': None,
+        'position_seconds': 0,
+        'position_ms': 0,
+        'bitrate': None,
+        'filename': None
+    }
+
+def _to_int(value, default=0):
     try:
-        cmd = [current_app.config['AUDTOOL_COMMAND']] + list(args)
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        
-        if result.returncode != 0:
-            if result.stderr:
-                current_app.logger.error(f"Error in audtool: stderr: {result.stderr}")
-            return None
-        
-        return result.stdout.strip()
-    except Exception as e:
-        current_app.logger.error(f"Error executing audtool: {str(e)}")
-        return None
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def set_song_position(song, position_ms):
+    """Fill the position fields of a song info dict from milliseconds."""
+    position_ms = max(0, int(position_ms))
+    if song['length_seconds']:
+        position_ms = min(position_ms, song['length_seconds'] * 1000)
+    song['position_ms'] = position_ms
+    song['position_seconds'] = position_ms // 1000
+    song['position'] = format_time(position_ms // 1000)
+
+# Details of the current song, re-read only when the song changes. Lengths
+# are fetched in seconds and formatted here rather than asking audtool for
+# both the formatted and the numeric value.
+_SONG_QUERIES = [
+    ('current-song-length-seconds',),
+    ('current-song',),
+    ('current-song-tuple-data', 'artist'),
+    ('current-song-tuple-data', 'album'),
+    ('current-song-bitrate-kbps',)
+]
+
+def _song_info(filename, outputs):
+    """Build the current song's details from the outputs of _SONG_QUERIES."""
+    length_output, title, artist, album, bitrate = outputs
+    length_seconds = _to_int(length_output)
+    info = _empty_song_info()
+    info.update({
+        'title': title,
+        'artist': artist or None,
+        'album': album or None,
+        'length': format_time(length_seconds),
+        'length_seconds': length_seconds,
+        'bitrate': bitrate,
+        'filename': filename
+    })
+
+    # If title is None but we have a filename, use the filename as the title
+    if info['title'] is None and info['filename']:
+        info['title'] = os.path.basename(info['filename'])
+
+    return info
+
+def _collect_player_snapshot():
+    """Query the player for everything the status endpoints report.
+
+    The one-line queries every snapshot needs go to the player as one batch
+    (one audtool process on the subprocess backend), and the song details
+    and playback position as a second one only when they must be re-read.
+    """
+    global _song_cache, _position_stale, _position_sync
+
+    settings_version = _settings_version
+    outputs = run_audtool_batch([
+        ('playback-status',),
+        ('playlist-length',),
+        ('playlist-position',),
+        ('current-song-filename',),
+        ('get-volume',)
+    ] + _SETTINGS_QUERIES)
+    status, length_output, position_output, filename, volume = outputs[:5]
+    if not player_available():
+        return _unavailable_snapshot()
+    if status not in ('playing', 'paused', 'stopped'):
+        status = 'stopped'
+    settings = _update_player_settings(settings_version, outputs[5:])
+
+    playlist_length = _to_int(length_output)
+    position = _to_int(position_output, 1) - 1 if playlist_length else 0
+
+    now = time.monotonic()
+    current_song = _empty_song_info()
+    if playlist_length > 0:
+        key = (position, filename, status)
+        cached = _song_cache
+        resync = current_app.config.get('PLAYER_POSITION_RESYNC', 10.0)
+
+        if not _position_stale and cached and cached['key'] == key and now - cached['measured_at'] < resync:
+            current_song.update(cached['info'])
+            position_ms = cached['position_ms']
+            if status == 'playing':
+                position_ms += (now - cached['measured_at']) * 1000
+        else:
+            if cached and cached['key'] == key:
+                current_song.update(cached['info'])
+                position_ms = _to_int(run_audtool('current-song-output-length-frames'))
+            else:
+                song_outputs = run_audtool_batch(_SONG_QUERIES + [('current-song-output-length-frames',)])
+                current_song.update(_song_info(filename, song_outputs[:-1]))
+                position_ms = _to_int(song_outputs[-1])
+
+            # Tell clients to resync when the song jumped somewhere unexpected
+            if cached and cached['key'] == key:
+                predicted = cached['position_ms']
+                if status == 'playing':
+                    predicted += (now - cached['measured_at']) * 1000
+                if abs(predicted - position_ms) > POSITION_JUMP_TOLERANCE:
+                    _position_sync += 1
+            else:
+                _position_sync += 1
+
+            _song_cache = {
+                'key': key,
+                'info': dict(current_song),
+                'position_ms': position_ms,
+                'measured_at': now
+            }
+            _position_stale = False
+
+        set_song_position(current_song, position_ms)
+
+    return {
+        'status': status,
+        'current_song': current_song,
+        'sampled_at': now,
+        'position_sync': _position_sync,
+        'volume': _to_int(volume, 50),
+        'position': max(position, 0),
+        'playlist_length': playlist_length,
+        'settings': settings,
+        'player_available': player_available()
+    }
+
+def _unavailable_snapshot():
+    """The snapshot reported while the player cannot be reached."""
+    return {
+        'status': 'stopped',
+        'current_song': _empty_song_info(),
+        'sampled_at': time.monotonic(),
+        'position_sync': _position_sync,
+        'volume': 0,
+        'position': 0,
+        'playlist_length': 0,
+        'settings': {name: False for name in PLAYER_SETTINGS},
+        'player_available': False
+    }
+
+def get_player_snapshot():
+    """Get the current player state, collected at most once per PLAYER_SNAPSHOT_TTL.
+
+    The returned dict is shared between callers and must not be modified.
+    """
+    global _snapshot, _snapshot_expires
+
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() < _snapshot_expires:
+        return snapshot
+
+    with _snapshot_lock:
+        # Another thread may have refreshed the snapshot while we waited
+        if _snapshot is not None and time.monotonic() < _snapshot_expires:
+            return _snapshot
+
+        snapshot = _collect_player_snapshot()
+        _snapshot = snapshot
+        _snapshot_expires = time.monotonic() + current_app.config.get('PLAYER_SNAPSHOT_TTL', 0.25)
+        return snapshot
+
+def invalidate_player_snapshot():
+    """Drop the cached snapshot so the next read reflects a command we just sent."""
+    global _snapshot_expires, _position_stale
+    _snapshot_expires = 0.0
+    _position_stale = True
+    for callback in _invalidation_callbacks:
+        callback()
+
+def add_invalidation_callback(callback):
+    """Call callback whenever the snapshot is invalidated by a player command."""
+    if callback not in _invalidation_callbacks:
+        _invalidation_callbacks.append(callback)
+
+# Player settings mirror
+#
+# Repeat, shuffle, stop-after and auto-advance can only be toggled, so making
+# them match a playlist means knowing their current state first. The last
+# known state is kept here: every snapshot refreshes it, our own toggles flip
+# it, and it is re-read once it is older than PLAYER_SETTINGS_MAX_AGE seconds.
+# Applying a playlist's settings then costs one toggle per flag that differs
+# and no status queries at all.
+PLAYER_SETTINGS = {
+    'repeat': 'repeat',
+    'shuffle': 'shuffle',
+    'stop_after': 'stop-after',
+    'auto_advance': 'auto-advance'
+}
+_settings = None
+_settings_read_at = 0.0
+_settings_version = 0
+_settings_lock = threading.RLock()
+_SETTINGS_QUERIES = [(f'playlist-{command}-status',) for command in PLAYER_SETTINGS.values()]
+
+def _read_player_settings():
+    """Query all four settings from the player and refresh the mirror."""
+    version = _settings_version
+    return _update_player_settings(version, run_audtool_batch(_SETTINGS_QUERIES))
+
+def _update_player_settings(version, outputs):
+    """Refresh the mirror from the outputs of _SETTINGS_QUERIES sent at settings version."""
+    global _settings, _settings_read_at
+    settings = {name: output == 'on' for name, output in zip(PLAYER_SETTINGS, outputs)}
+    with _settings_lock:
+        # A toggle sent while we were reading makes this result outdated, and
+        # an unreachable player makes it meaningless
+        if version == _settings_version and player_available():
+            _settings = dict(settings)
+            _settings_read_at = time.monotonic()
+    return settings
+
+def get_player_settings():
+    """Get the player's settings, from the mirror when it is recent enough."""
+    with _settings_lock:
+        max_age = current_app.config.get('PLAYER_SETTINGS_MAX_AGE', 30.0)
+        if _settings is not None and time.monotonic() - _settings_read_at < max_age:
+            return dict(_settings)
+        return _read_player_settings()
+
+def invalidate_player_settings():
+    """Forget the mirrored settings so the next read asks the player."""
+    global _settings
+    with _settings_lock:
+        _settings = None
+
+def _toggle_setting(name):
+    """Toggle one setting in the player and flip it in the mirror."""
+    global _settings, _settings_version
+    with _settings_lock:
+        _settings_version += 1
+        result = run_audtool(f'playlist-{PLAYER_SETTINGS[name]}-toggle')
+        if result is None:
+            # We can't tell whether the toggle reached the player
+            _settings = None
+        elif _settings is not None:
+            _settings[name] = not _settings[name]
+        return result
+
+def apply_player_settings(settings):
+    """Toggle exactly the settings whose state differs from the given dict.
+
+    Returns the number of settings that were toggled.
+    """
+    with _settings_lock:
+        current = get_player_settings()
+        changed = [name for name in PLAYER_SETTINGS
+                   if name in settings and bool(settings[name]) != current[name]]
+        for name in changed:
+            _toggle_setting(name)
+    if changed:
+        invalidate_player_snapshot()
+    return len(changed)
+
+def _changes_player_state(func):
+    """Decorator for commands that change what the snapshot reports."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            invalidate_player_snapshot()
+    return wrapper
 
 # Player control functions
 def get_current_song():
@@ -25,55 +378,7 @@ def get_current_song():
 
 def get_current_song_info():
     """Get detailed information about the current song."""
-    # First check if there's a song playing or if the playlist is empty
-    status = get_playback_status()
-    length = get_playlist_length()
-    
-    if not length or int(length or 0) == 0:
-        return {
-            'title': None,
-            'artist': None,
-            'album': None,
-            'length': None,
-            'length_seconds': 0,
-            'position': None,
-            'position_seconds': 0,
-            'bitrate': None,
-            'filename': None
-        }
-    
-    # Try to get current song info
-    try:
-        info = {
-            'title': run_audtool('current-song'),
-            'artist': run_audtool('current-song-tuple-data', 'artist'),
-            'album': run_audtool('current-song-tuple-data', 'album'),
-            'length': run_audtool('current-song-length'),
-            'length_seconds': run_audtool('current-song-length-seconds') or 0,
-            'position': run_audtool('current-song-output-length'),
-            'position_seconds': run_audtool('current-song-output-length-seconds') or 0,
-            'bitrate': run_audtool('current-song-bitrate-kbps'),
-            'filename': run_audtool('current-song-filename')
-        }
-        
-        # If title is None but we have a filename, use the filename as the title
-        if info['title'] is None and info['filename']:
-            info['title'] = os.path.basename(info['filename'])
-            
-        return info
-    except Exception as e:
-        current_app.logger.error(f"Error getting current song info: {e}")
-        return {
-            'title': None,
-            'artist': None,
-            'album': None,
-            'length': None,
-            'length_seconds': 0,
-            'position': None,
-            'position_seconds': 0,
-            'bitrate': None,
-            'filename': None
-        }
+    return dict(get_player_snapshot()['current_song'])
 
 def get_playback_status():
     if run_audtool('playback-playing') is not None:
@@ -83,33 +388,42 @@ def get_playback_status():
     else:
         return 'stopped'
 
+@_changes_player_state
 def play():
     return run_audtool('playback-play')
 
+@_changes_player_state
 def pause():
     return run_audtool('playback-pause')
 
+@_changes_player_state
 def playpause():
     return run_audtool('playback-playpause')
 
+@_changes_player_state
 def stop():
     return run_audtool('playback-stop')
 
+@_changes_player_state
 def seek(position):
     return run_audtool('playback-seek', str(position))
 
+@_changes_player_state
 def seek_relative(offset):
     return run_audtool('playback-seek-relative', str(offset))
 
+@_changes_player_state
 def next_song():
     return run_audtool('playlist-advance')
 
+@_changes_player_state
 def previous_song():
     return run_audtool('playlist-reverse')
 
 def get_volume():
     return run_audtool('get-volume')
 
+@_changes_player_state
 def set_volume(volume):
     return run_audtool('set-volume', str(volume))
 
@@ -126,6 +440,7 @@ def get_playlist_position():
         # Return 0 if there's no current song or command fails
         return 0
 
+@_changes_player_state
 def jump_to_song(position):
     return run_audtool('playlist-jump', str(position))
 
@@ -144,8 +459,75 @@ def get_playlist_song(position):
     except (ValueError, TypeError):
         return None
 
+# One playlist-display entry: "%4d | title | m:ss", the title padded to 60
+# characters and the minutes going past 60 for long tracks; entries of
+# unknown length (streams) are just "%4d | title". A title may itself contain
+# " | ", so it runs up to the last separator that is followed by a length.
+_DISPLAY_ENTRY = re.compile(r'^\s*(\d+) \| (.*?)(?: \| (\d+(?::\d\d){1,2}))?\s*$')
+_DISPLAY_HEADER = re.compile(r'^(\d+) tracks?\.$')
+
+def parse_playlist_display(output):
+    """Parse ``playlist-display`` output into a list of entries.
+
+    Each entry is a dict with the 0-based ``position``, ``title`` and
+    ``length`` (as printed, m:ss, or None if unknown). Returns None if the
+    output does not look like a playlist dump or lists a different number of
+    entries than its header announces.
+    """
+    if output is None:
+        return None
+
+    lines = output.splitlines()
+    header = _DISPLAY_HEADER.match(lines[0].strip()) if lines else None
+    if not header:
+        return None
+
+    entries = []
+    for line in lines[1:]:
+        match = _DISPLAY_ENTRY.match(line)
+        if not match:
+            continue
+        entries.append({
+            'position': int(match.group(1)) - 1,
+            'title': match.group(2).rstrip(),
+            'length': match.group(3)
+        })
+
+    if len(entries) != int(header.group(1)):
+        return None
+    return entries
+
 def get_all_songs():
-    """Get all songs in the current playlist."""
+    """Get all songs in the current playlist.
+
+    Titles and lengths come from one ``playlist-display`` call and filenames
+    from batched lookups, instead of three audtool calls per entry.
+    """
+    entries = parse_playlist_display(run_audtool('playlist-display'))
+    if entries is None:
+        current_app.logger.warning("Could not parse playlist-display output, reading songs one by one")
+        return _get_all_songs_individually()
+
+    filenames = run_audtool_batch([('playlist-song-filename', str(entry['position'] + 1))
+                                   for entry in entries])
+
+    songs = []
+    for entry, filename in zip(entries, filenames):
+        # Skip if we couldn't get the required information
+        if filename is None:
+            continue
+
+        songs.append({
+            'position': entry['position'],
+            'title': entry['title'] or os.path.basename(filename),
+            'filename': filename,
+            'length': entry['length'] or '0:00'
+        })
+
+    return songs
+
+def _get_all_songs_individually():
+    """Get all songs in the current playlist with three audtool calls per entry."""
     length = get_playlist_length()
     if not length:
         return []
@@ -180,12 +562,61 @@ def get_all_songs():
     
     return songs
 
+@_changes_player_state
 def clear_playlist():
     return run_audtool('playlist-clear')
 
+@_changes_player_state
 def add_song(url):
     return run_audtool('playlist-addurl', url)
 
+# Seconds a generated M3U file is kept around; Audacious reads added playlist
+# files in the background, so it must not disappear right after the call
+M3U_LINGER = 120
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+@_changes_player_state
+def add_songs(urls, position=None):
+    """Add many songs with a single player call.
+
+    The songs are written to a temporary M3U file which Audacious expands
+    into individual entries, appended to the playlist or inserted before the
+    1-based ``position``.
+    """
+    urls = list(urls)
+    if not urls:
+        return ''
+    if len(urls) == 1:
+        if position is None:
+            return run_audtool('playlist-addurl', urls[0])
+        return run_audtool('playlist-insurl', urls[0], str(position))
+
+    # A line break would split an entry in two, so such names can't be listed
+    skipped = {url for url in urls if '\n' in url or '\r' in url}
+    if skipped:
+        current_app.logger.warning(f"Skipping {len(skipped)} songs with line breaks in their names")
+        urls = [url for url in urls if url not in skipped]
+
+    fd, path = tempfile.mkstemp(prefix='audacious-web-', suffix='.m3u')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U\n')
+        f.write('\n'.join(urls))
+        f.write('\n')
+
+    timer = threading.Timer(M3U_LINGER, _remove_quietly, [path])
+    timer.daemon = True
+    timer.start()
+
+    if position is None:
+        return run_audtool('playlist-addurl', path)
+    return run_audtool('playlist-insurl', path, str(position))
+
+@_changes_player_state
 def delete_song(position):
     return run_audtool('playlist-delete', str(position))
 
@@ -196,6 +627,7 @@ def get_number_of_playlists():
 def get_current_playlist():
     return run_audtool('current-playlist')
 
+@_changes_player_state
 def set_current_playlist(playlist):
     return run_audtool('set-current-playlist', str(playlist))
 
@@ -205,9 +637,11 @@ def get_current_playlist_name():
 def set_current_playlist_name(name):
     return run_audtool('set-current-playlist-name', shlex.quote(name))
 
+@_changes_player_state
 def new_playlist():
     return run_audtool('new-playlist')
 
+@_changes_player_state
 def delete_current_playlist():
     return run_audtool('delete-current-playlist')
 
@@ -215,23 +649,27 @@ def delete_current_playlist():
 def get_repeat_status():
     return run_audtool('playlist-repeat-status')
 
+@_changes_player_state
 def toggle_repeat():
-    return run_audtool('playlist-repeat-toggle')
+    return _toggle_setting('repeat')
 
 def get_shuffle_status():
     return run_audtool('playlist-shuffle-status')
 
+@_changes_player_state
 def toggle_shuffle():
-    return run_audtool('playlist-shuffle-toggle')
+    return _toggle_setting('shuffle')
 
 def get_stop_after_status():
     return run_audtool('playlist-stop-after-status')
 
+@_changes_player_state
 def toggle_stop_after():
-    return run_audtool('playlist-stop-after-toggle')
+    return _toggle_setting('stop_after')
 
 def get_auto_advance_status():
     return run_audtool('playlist-auto-advance-status')
 
+@_changes_player_state
 def toggle_auto_advance():
-    return run_audtool('playlist-auto-advance-toggle') 
\ No newline at end of file
+    return _toggle_setting('auto_advance') 
\ No newline at end of file
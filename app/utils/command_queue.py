@@ -0,0 +1,80 @@
+import threading
+import time
+
+from flask import current_app
+
+from app.utils import audtool
+
+
+class CommandQueue:
+    """Applies player commands for slider-like controls in the background, last write wins.
+
+    Each control (volume, seek) has at most one pending value and one worker
+    thread. Submitting a value replaces whatever is still pending, so however
+    many values arrive while a command is running, only the latest one is sent
+    next. Commands for a control are at least PLAYER_COMMAND_INTERVAL seconds
+    apart. The worker exits once nothing is pending.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = {}
+        self._pending = {}
+        self._applying = {}
+        self._workers = {}
+
+    def register(self, control, handler):
+        """Use handler(value) to apply the values submitted for control."""
+        self._handlers[control] = handler
+
+    def submit(self, control, value):
+        """Queue value for control, replacing any value still pending, and return it."""
+        if control not in self._handlers:
+            raise KeyError(f"Unknown control: {control}")
+
+        with self._lock:
+            self._pending[control] = value
+            if control not in self._workers:
+                worker = threading.Thread(
+                    target=self._run,
+                    args=(current_app._get_current_object(), control),
+                    name=f'{control}-commands',
+                    daemon=True
+                )
+                self._workers[control] = worker
+                worker.start()
+        return value
+
+    def pending(self, control):
+        """Return the value waiting for or being applied to control, or None."""
+        with self._lock:
+            return self._pending.get(control, self._applying.get(control))
+
+    def _run(self, app, control):
+        with app.app_context():
+            interval = app.config.get('PLAYER_COMMAND_INTERVAL', 0.1)
+            while True:
+                with self._lock:
+                    if control not in self._pending:
+                        del self._workers[control]
+                        return
+                    value = self._pending.pop(control)
+                    self._applying[control] = value
+
+                started = time.monotonic()
+                try:
+                    self._handlers[control](value)
+                except Exception as e:
+                    app.logger.error(f"Error applying {control} {value}: {e}")
+                finally:
+                    with self._lock:
+                        del self._applying[control]
+
+                # Values submitted while we wait collapse into the next command
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+# Global instance
+command_queue = CommandQueue()
+command_queue.register('volume', audtool.set_volume)
+command_queue.register('seek', audtool.seek)
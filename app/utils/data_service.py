@@ -1,11 +1,115 @@
 from storify import Storify
-from app.utils.models import Playlist, Track, WatchPath
+from storify.model import Model
+from app.utils.models import Playlist, Track, TrackedModel, WatchPath
+from app.utils.playlist_log import PlaylistLog
+from app.utils.sqlite_store import SQLiteStore, migrate_from_storify
+from contextlib import nullcontext
+import atexit
 import os
+import signal
+import sys
+import threading
+import time
+
+class _Loader(Model):
+    """Stands in for a model class in Storify's model list.
+    
+    Storify decodes every stored model as ``model_class()._from_dict(data)``,
+    building a default instance per record only to throw it away (for a
+    Track, a fresh uuid and timestamp). A loader costs nothing to build and
+    hands the data to the real class.
+    """
+    model_class = None
+    
+    @classmethod
+    def _keyname(cls):
+        return cls.model_class._keyname()
+    
+    @classmethod
+    def _from_dict(cls, data):
+        return cls.model_class._from_dict(data)
+
+
+def _loader(model_class):
+    return type(f'{model_class.__name__}Loader', (_Loader,), {'model_class': model_class})
+
+
+class TrackedDatabase:
+    """Wraps a Storify or SQLite database and reports every write to the data service."""
+    
+    def __init__(self, db, on_change):
+        self._db = db
+        self._on_change = on_change
+    
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+    
+    def __getitem__(self, key):
+        return self._db[key]
+    
+    def __setitem__(self, key, value):
+        self._db[key] = value
+        self._on_change()
+    
+    def __delitem__(self, key):
+        del self._db[key]
+        self._on_change()
+    
+    def __contains__(self, key):
+        return key in self._db.data
+    
+    def __iter__(self):
+        return iter(self._db)
+    
+    def __len__(self):
+        return len(self._db)
+    
+    def changed(self, model):
+        """Report a model stored in this database that was changed in place."""
+        if hasattr(self._db, 'changed'):
+            self._db.changed(model)
+        self._on_change()
+
 
 class DataService:
+    """Access to the databases, with write-behind persistence.
+    
+    Data lives in Storify files by default. With STORAGE_BACKEND=sqlite it
+    lives in one SQLite file instead (see sqlite_store), where lookups by
+    filename and playlist use the table indexes rather than in-memory ones.
+    
+    Nothing is written to disk as part of a request. Writes to a database and
+    changes to the models stored in it mark that database dirty; a background
+    thread flushes only the dirty databases every PERSIST_INTERVAL seconds, or
+    sooner once PERSIST_MAX_PENDING changes have piled up, and whatever is
+    still dirty is flushed when the process exits.
+    
+    Playlist edits (track adds, removes and moves, settings) don't mark the
+    playlists database dirty; they are appended to the playlist log (see
+    playlist_log) and replayed when the playlists are loaded. Once the log
+    holds PLAYLIST_LOG_COMPACT_ENTRIES entries the edited playlists are
+    written in full and the log is emptied.
+    
+    ``init_app`` loads the playlists right away but leaves the tracks to a
+    background warm-up thread (PRELOAD_TRACKS), so the first requests don't
+    wait for a large library to be read. Anything that needs the tracks
+    before then waits for them; ``get_track_id(..., wait=False)`` doesn't.
+    """
+    # Database holding each model type, for change notifications
+    MODEL_DATABASES = {Playlist: 'playlists', Track: 'tracks', WatchPath: 'watch_paths'}
+    
     _instance = None
     _storify = None
+    _sqlite = None
     _databases = {}
+    _track_ids_by_filename = None
+    _filenames_by_track_id = None
+    _watch_path_ids_by_playlist = None
+    _watch_path_ids_by_key = None
+    _index_lock = threading.RLock()
+    _dirty_lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _flush_wanted = threading.Event()
     
     def __new__(cls):
         if cls._instance is None:
@@ -27,23 +131,97 @@ class DataService:
             
             self._storify = Storify(
                 root=data_dir,
-                models=[Playlist, Track, WatchPath],
+                models=[_loader(model) for model in (Playlist, Track, WatchPath)],
                 save_interval=60,  # Auto-save every minute
                 verbose=True
             )
             
-            # Initialize database cache
+            # Initialize database cache, with a lock per database so loading
+            # one doesn't hold up the others
             self._databases = {}
+            self._db_locks = {}
+            self._warm_up = None
+            
+            # Write-behind state: changes per database since the last flush
+            self._dirty = {}
+            self._flusher = None
+            self._max_pending = 500
+            self._logger = None
+            
+            # Playlist edits since the last compaction, and the playlists they touched
+            self._playlist_log = PlaylistLog(os.path.join(data_dir, 'playlists.log'))
+            self._logged_playlists = {}
+            self._compact_at = 10000
+            TrackedModel.change_listener = self._model_changed
     
     @property
     def storify(self):
         return self._storify
     
+    def init_app(self, app):
+        """Open the configured storage backend, load the playlists and start the background threads."""
+        if app.config.get('STORAGE_BACKEND', 'storify') == 'sqlite' and self._sqlite is None:
+            self._open_sqlite(app.logger)
+        self.start_write_behind(app)
+        
+        self.get_playlists_db()
+        if app.config.get('PRELOAD_TRACKS', True):
+            self.start_warm_up(app.logger)
+    
+    def _open_sqlite(self, logger):
+        """Switch to the SQLite file, migrating the Storify data into it on first use."""
+        models = [Playlist, Track, WatchPath]
+        path = os.path.join(self._storify.root, 'library.sqlite3')
+        if not os.path.exists(path):
+            counts = migrate_from_storify(self._storify.root, path, models)
+            if counts:
+                logger.info(f"Migrated Storify data to {path}: {counts}")
+        
+        self._sqlite = SQLiteStore(path, models)
+        self._databases = {}
+    
     def _get_cached_db(self, db_name):
-        """Get a cached database instance."""
-        if db_name not in self._databases:
-            self._databases[db_name] = self._storify.get_db(db_name)
-        return self._databases[db_name]
+        """Get a cached database instance, loading it on first use."""
+        db = self._databases.get(db_name)
+        if db is not None:
+            return db
+        
+        with self._db_locks.setdefault(db_name, threading.RLock()):
+            if db_name not in self._databases:
+                source = self._sqlite or self._storify
+                db = TrackedDatabase(
+                    source.get_db(db_name),
+                    lambda: self.mark_dirty(db_name)
+                )
+                if db_name == 'playlists':
+                    self._replay_playlist_log(db)
+                self._databases[db_name] = db
+            return self._databases[db_name]
+    
+    def start_warm_up(self, logger=None):
+        """Load the tracks and build the lookup indexes in a background thread."""
+        if self._sqlite or (self._warm_up is not None and self._warm_up.is_alive()):
+            # SQLite reads rows and looks them up on demand; nothing to load
+            return
+        
+        def run():
+            start = time.perf_counter()
+            try:
+                self._track_index()
+                self._watch_path_index()
+            except Exception as e:
+                if logger:
+                    logger.error(f"Error loading the library: {e}")
+                return
+            if logger:
+                logger.info(f"Indexed {len(self._filenames_by_track_id)} tracks in {time.perf_counter() - start:.2f}s")
+        
+        self._warm_up = threading.Thread(target=run, name='warm-up', daemon=True)
+        self._warm_up.start()
+    
+    def tracks_ready(self):
+        """Whether tracks can be looked up by filename without waiting for them to load."""
+        return bool(self._sqlite) or self._track_ids_by_filename is not None
     
     def get_playlists_db(self):
         """Get the playlists database."""
@@ -57,18 +235,355 @@ class DataService:
         """Get the watch paths database."""
         return self._get_cached_db("watch_paths")
     
+    def _track_index(self):
+        """Return the filename -> track id index, building it from the tracks database."""
+        if self._track_ids_by_filename is None:
+            with self._index_lock:
+                if self._track_ids_by_filename is None:
+                    by_filename = {}
+                    by_track_id = {}
+                    for track_id, track in self.get_tracks_db().data.items():
+                        if isinstance(track, Track) and track.filename:
+                            # Duplicates resolve to the first track, as the old scans did
+                            by_filename.setdefault(track.filename, track_id)
+                            by_track_id[track_id] = track.filename
+                    self._filenames_by_track_id = by_track_id
+                    self._track_ids_by_filename = by_filename
+        return self._track_ids_by_filename
+    
+    def get_track(self, track_id):
+        """Get a track by id, or None."""
+        return self.get_tracks_db().data.get(track_id)
+    
+    def pending_track_ids(self):
+        """Ids of the tracks whose tags are still to be read."""
+        if self._sqlite:
+            return self.get_tracks_db().lookup('pending', True)
+        return [track_id for track_id, track in list(self.get_tracks_db().data.items())
+                if isinstance(track, Track) and track.pending]
+    
+    def find_track_by_filename(self, filename):
+        """Get the track for a file path, or None if it is not in the library."""
+        track_id = self.get_track_id(filename)
+        if track_id is None:
+            return None
+        return self.get_tracks_db().data.get(track_id)
+    
+    def get_track_id(self, filename, wait=True):
+        """Get the id of the track for a file path, or None.
+        
+        With wait=False, returns None rather than waiting while the tracks
+        are still loading.
+        """
+        if not wait and not self.tracks_ready():
+            return None
+        if self._sqlite:
+            track_ids = self.get_tracks_db().lookup('filename', filename)
+            return track_ids[0] if track_ids else None
+        return self._track_index().get(filename)
+    
+    def add_track(self, track):
+        """Store a track (new or changed) and index it by filename."""
+        self.add_tracks([track])
+        return track
+    
+    def add_tracks(self, tracks):
+        """Store tracks (new or changed) and index them by filename, as one change to the database."""
+        tracks = list(tracks)
+        if not tracks:
+            return
+        
+        # Write to the database itself and mark it dirty once for the batch
+        tracks_db = self.get_tracks_db()._db
+        with self._index_lock:
+            if self._sqlite:
+                for track in tracks:
+                    tracks_db[track.id] = track
+            else:
+                index = self._track_index()
+                for track in tracks:
+                    old_filename = self._filenames_by_track_id.pop(track.id, None)
+                    if old_filename is not None and index.get(old_filename) == track.id:
+                        del index[old_filename]
+                    
+                    tracks_db[track.id] = track
+                    if track.filename:
+                        index[track.filename] = track.id
+                        self._filenames_by_track_id[track.id] = track.filename
+        self.mark_dirty('tracks')
+    
+    def remove_track(self, track_id):
+        """Delete a track from the database and the filename index."""
+        if self._sqlite:
+            tracks_db = self.get_tracks_db()
+            if track_id in tracks_db.data:
+                del tracks_db[track_id]
+            return
+        
+        with self._index_lock:
+            index = self._track_index()
+            filename = self._filenames_by_track_id.pop(track_id, None)
+            if filename is not None and index.get(filename) == track_id:
+                del index[filename]
+            
+            tracks_db = self.get_tracks_db()
+            if track_id in tracks_db.data:
+                del tracks_db[track_id]
+    
+    def _watch_path_index(self):
+        """Return the playlist id -> watch path ids index, building it from the database."""
+        if self._watch_path_ids_by_playlist is None:
+            with self._index_lock:
+                if self._watch_path_ids_by_playlist is None:
+                    by_playlist = {}
+                    by_key = {}
+                    for wp_id, wp in self.get_watch_paths_db().data.items():
+                        if isinstance(wp, WatchPath):
+                            # Dicts keep the database order and allow O(1) removal
+                            by_playlist.setdefault(wp.playlist_id, {})[wp_id] = None
+                            by_key.setdefault((wp.playlist_id, wp.path), wp_id)
+                    self._watch_path_ids_by_key = by_key
+                    self._watch_path_ids_by_playlist = by_playlist
+        return self._watch_path_ids_by_playlist
+    
+    def get_watch_paths_for_playlist(self, playlist_id):
+        """Get the watch paths of a playlist."""
+        watch_paths_db = self.get_watch_paths_db()
+        if self._sqlite:
+            wp_ids = watch_paths_db.lookup('playlist_id', playlist_id)
+        else:
+            wp_ids = self._watch_path_index().get(playlist_id, {})
+        return [watch_paths_db.data[wp_id] for wp_id in list(wp_ids) if wp_id in watch_paths_db.data]
+    
+    def find_watch_path(self, playlist_id, path):
+        """Get a playlist's watch path for a directory, or None."""
+        if self._sqlite:
+            matches = [wp for wp in self.get_watch_paths_for_playlist(playlist_id) if wp.path == path]
+            return matches[0] if matches else None
+        
+        self._watch_path_index()
+        wp_id = self._watch_path_ids_by_key.get((playlist_id, path))
+        if wp_id is None:
+            return None
+        return self.get_watch_paths_db().data.get(wp_id)
+    
+    def add_watch_path(self, watch_path):
+        """Store a new watch path and index it by playlist."""
+        if self._sqlite:
+            self.get_watch_paths_db()[watch_path.id] = watch_path
+            return watch_path
+        
+        with self._index_lock:
+            by_playlist = self._watch_path_index()
+            self.get_watch_paths_db()[watch_path.id] = watch_path
+            by_playlist.setdefault(watch_path.playlist_id, {})[watch_path.id] = None
+            self._watch_path_ids_by_key.setdefault((watch_path.playlist_id, watch_path.path), watch_path.id)
+        return watch_path
+    
+    def remove_watch_path(self, watch_path_id):
+        """Delete a watch path from the database and the indexes; False if it didn't exist."""
+        if self._sqlite:
+            watch_paths_db = self.get_watch_paths_db()
+            if watch_path_id not in watch_paths_db.data:
+                return False
+            del watch_paths_db[watch_path_id]
+            return True
+        
+        with self._index_lock:
+            by_playlist = self._watch_path_index()
+            watch_paths_db = self.get_watch_paths_db()
+            watch_path = watch_paths_db.data.get(watch_path_id)
+            if watch_path is None:
+                return False
+            
+            del watch_paths_db[watch_path_id]
+            if isinstance(watch_path, WatchPath):
+                wp_ids = by_playlist.get(watch_path.playlist_id, {})
+                wp_ids.pop(watch_path_id, None)
+                if not wp_ids:
+                    by_playlist.pop(watch_path.playlist_id, None)
+                key = (watch_path.playlist_id, watch_path.path)
+                if self._watch_path_ids_by_key.get(key) == watch_path_id:
+                    del self._watch_path_ids_by_key[key]
+            return True
+    
     def get_settings_db(self):
         """Get the settings database for app-wide settings."""
         return self._get_cached_db("settings")
     
+    def _model_changed(self, model, edit=None):
+        db = self._databases.get(self.MODEL_DATABASES.get(type(model)))
+        if db is None:
+            # Its database isn't loaded, so this isn't a stored model
+            return
+        if edit is not None and self._compact_at and isinstance(model, Playlist):
+            self._log_playlist_edit(model, edit)
+            return
+        db.changed(model)
+    
+    def _log_playlist_edit(self, playlist, edit):
+        with self._dirty_lock:
+            seq = self._playlist_log.append(playlist.id, edit)
+            object.__setattr__(playlist, 'oplog_seq', seq)
+            # Keep the edited playlist in memory (SQLite only caches weakly)
+            # until compaction has written it out
+            self._logged_playlists[playlist.id] = playlist
+            pending = sum(self._dirty.values()) + self._playlist_log.pending()
+        if pending >= self._max_pending:
+            self._flush_wanted.set()
+    
+    def _replay_playlist_log(self, playlists_db):
+        """Apply the logged edits the stored playlists don't include yet."""
+        entries = self._playlist_log.read()
+        replayed = 0
+        for seq, playlist_id, edit in entries:
+            playlist = playlists_db.data.get(playlist_id)
+            if not isinstance(playlist, Playlist) or seq <= playlist.oplog_seq:
+                continue
+            try:
+                playlist.apply_edit(edit)
+            except (ValueError, IndexError, TypeError) as e:
+                if self._logger:
+                    self._logger.warning(f"Skipping playlist log entry {seq}: {e}")
+            object.__setattr__(playlist, 'oplog_seq', seq)
+            self._logged_playlists[playlist.id] = playlist
+            replayed += 1
+        if replayed and self._logger:
+            self._logger.info(f"Replayed {replayed} of {len(entries)} playlist log entries")
+    
+    def _compact_playlist_log(self):
+        """Write the playlists edited through the log in full, then empty the log.
+        
+        The playlists are written under the lock edits are logged under, so a
+        written playlist's ``oplog_seq`` never covers an edit it doesn't
+        include. The log is only emptied once the write is confirmed.
+        """
+        # Edits made after this point stay queued in the log, so they survive the truncation
+        self._playlist_log.write()
+        
+        playlists_db = self.get_playlists_db()._db
+        with self._dirty_lock:
+            logged, self._logged_playlists = self._logged_playlists, {}
+            try:
+                if hasattr(playlists_db, 'changed'):
+                    for playlist in logged.values():
+                        playlists_db.changed(playlist)
+                    playlists_db.flush()
+                else:
+                    # Storify logs write errors instead of raising them
+                    last_flush = playlists_db.last_flush
+                    playlists_db.flush()
+                    if playlists_db.last_flush == last_flush:
+                        raise OSError("the playlists database was not written")
+            except Exception:
+                logged.update(self._logged_playlists)
+                self._logged_playlists = logged
+                raise
+        self._playlist_log.truncate()
+    
+    def mark_dirty(self, db_name):
+        """Record a change to a database so the next flush writes it."""
+        with self._dirty_lock:
+            self._dirty[db_name] = self._dirty.get(db_name, 0) + 1
+            pending = sum(self._dirty.values())
+        if pending >= self._max_pending:
+            self._flush_wanted.set()
+    
+    def dirty_databases(self):
+        """Names of the databases with changes not yet written to disk."""
+        with self._dirty_lock:
+            return sorted(self._dirty)
+    
+    def flush_dirty(self):
+        """Write the databases changed since the last flush and return their names."""
+        with self._flush_lock:
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, {}
+            
+            written = []
+            try:
+                if self._playlist_log.write():
+                    written.append('playlist_log')
+            except OSError as e:
+                if self._logger:
+                    self._logger.error(f"Error writing playlist log: {e}")
+            
+            for db_name in dirty:
+                # Tracks are added and removed under the index lock; holding it
+                # keeps a long scan from changing the data mid-write
+                lock = self._index_lock if db_name == 'tracks' and not self._sqlite else nullcontext()
+                try:
+                    with lock:
+                        self._get_cached_db(db_name)._db.flush()
+                    written.append(db_name)
+                except Exception as e:
+                    # Most likely a request changed the data while it was being
+                    # written; keep it dirty and try again next time
+                    with self._dirty_lock:
+                        self._dirty[db_name] = self._dirty.get(db_name, 0) + dirty[db_name]
+                    if self._logger:
+                        self._logger.error(f"Error writing {db_name} database: {e}")
+            
+            entries = self._playlist_log.written
+            if entries and entries >= self._compact_at:
+                try:
+                    self._compact_playlist_log()
+                    if 'playlists' not in written:
+                        written.append('playlists')
+                except Exception as e:
+                    if self._logger:
+                        self._logger.error(f"Error compacting playlist log: {e}")
+            return written
+    
+    def start_write_behind(self, app):
+        """Start the background flusher and flush on exit."""
+        self._max_pending = app.config.get('PERSIST_MAX_PENDING', 500)
+        self._compact_at = app.config.get('PLAYLIST_LOG_COMPACT_ENTRIES', 10000)
+        self._logger = app.logger
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        
+        interval = app.config.get('PERSIST_INTERVAL', 5.0)
+        
+        def run():
+            while True:
+                self._flush_wanted.wait(interval)
+                self._flush_wanted.clear()
+                self.flush_dirty()
+        
+        self._flusher = threading.Thread(target=run, name='write-behind', daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush_dirty)
+        self._exit_on_sigterm()
+    
+    @staticmethod
+    def _exit_on_sigterm():
+        """Turn SIGTERM into a normal exit, so the atexit flush runs.
+        
+        systemd, docker and start.sh stop the server with SIGTERM, which
+        otherwise kills Python without running atexit handlers (Ctrl-C
+        already raises KeyboardInterrupt). Left alone if something else, such
+        as gunicorn, handles SIGTERM, and outside the main thread, where
+        signal handlers can't be set.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if signal.getsignal(signal.SIGTERM) is not signal.SIG_DFL:
+            return
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    
     def flush_all(self):
         """Manually flush all databases."""
-        self._storify.flush()
+        with self._flush_lock:
+            with self._dirty_lock:
+                self._dirty = {}
+            self._playlist_log.write()
+            (self._sqlite or self._storify).flush()
     
     def close(self):
         """Close all databases."""
         if self._storify:
-            self._storify.flush()
+            self.flush_dirty()
 
 
 # Global instance
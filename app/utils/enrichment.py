@@ -0,0 +1,128 @@
+"""Reading the tags of tracks that were added before their files were read.
+
+With LAZY_METADATA, adding files stores each new track right away with its
+file name as title and ``pending`` set, so the request returns without
+waiting on the disk. This worker then reads the pending tracks' tags in the
+background (through the metadata pool and the tag cache), fills them in and
+pushes the updated tracks to /player/events clients as a ``tracks`` event.
+"""
+from collections import deque
+import threading
+
+from app.utils import metadata
+from app.utils.data_service import data_service
+from app.utils.status_poller import status_poller
+from app.utils.tag_cache import tag_cache
+
+# Tracks read, saved and pushed to clients together
+ENRICH_BATCH = 100
+
+
+class Enricher:
+    """One background thread that fills in the tags of pending tracks, oldest first.
+
+    The thread starts with the app when PRELOAD_TRACKS is set, or with the
+    first enqueued track otherwise, and first picks up the tracks left
+    pending when the server last stopped.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._queue = deque()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('PRELOAD_TRACKS', True):
+            with self._lock:
+                self._ensure_running()
+
+    def enqueue(self, track_ids):
+        """Queue tracks to have their tags read."""
+        with self._lock:
+            for track_id in track_ids:
+                if track_id not in self._queued:
+                    self._queued.add(track_id)
+                    self._queue.append(track_id)
+            if self._queue:
+                self._idle.clear()
+            self._ensure_running()
+        self._wake.set()
+
+    def wait(self, timeout=None):
+        """Wait until every queued track has been read; False if the timeout expired first."""
+        return self._idle.wait(timeout)
+
+    def _ensure_running(self):
+        if self.app is not None and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._run, name='enrichment', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        with self._lock:
+            batch = [self._queue.popleft() for _ in range(min(ENRICH_BATCH, len(self._queue)))]
+            if not batch:
+                self._wake.clear()
+                self._idle.set()
+            return batch
+
+    def _done(self, batch):
+        with self._lock:
+            self._queued.difference_update(batch)
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                self.enqueue(data_service.pending_track_ids())
+            except Exception as e:
+                self.app.logger.error(f"Error finding pending tracks: {e}")
+
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    self._wake.wait()
+                    continue
+                try:
+                    self.enrich(batch)
+                except Exception as e:
+                    self.app.logger.error(f"Error reading tags of pending tracks: {e}")
+                finally:
+                    self._done(batch)
+
+    def enrich(self, track_ids):
+        """Read the tags of the given pending tracks, fill them in and notify clients."""
+        # Pending tracks by file; more than one track can point at the same file
+        tracks = {}
+        for track_id in track_ids:
+            track = data_service.get_track(track_id)
+            # Skip tracks removed (or already read) since they were queued
+            if track is not None and track.pending and track.filename:
+                tracks.setdefault(track.filename, []).append(track)
+        if not tracks:
+            return
+
+        updated = []
+        for path, fields, error in metadata.read_all(
+            list(tracks),
+            workers=self.app.config.get('METADATA_WORKERS', 8),
+            executor=self.app.config.get('METADATA_EXECUTOR', 'thread'),
+            cache=tag_cache
+        ):
+            if error is not None:
+                # Keep the file name as title rather than retrying forever
+                self.app.logger.error(f"Error getting metadata for {path}: {error}")
+                fields = metadata.default_tags(path)
+            for track in tracks[path]:
+                track.set_tags(fields)
+                updated.append(track.to_dict())
+
+        status_poller.publish('tracks', {'tracks': updated})
+
+
+# Global instance
+enricher = Enricher()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""A small in-memory stand-in for Audacious that understands audtool commands.
+
+It is used by the ``fake`` player backend and by the benchmarks so the web app
+can be exercised without a running player. The module only depends on the
+standard library, so it can also be executed directly as a drop-in ``audtool``
+binary (set ``AUDTOOL_COMMAND`` to this file). In that mode the player state is
+kept in the JSON file named by ``FAKE_AUDACIOUS_STATE`` between invocations,
+and ``FAKE_AUDACIOUS_DELAY`` (seconds) makes every invocation hang that long
+first, to imitate an unresponsive player.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+
+# Number of arguments taken by the commands that have any
+COMMAND_ARGS = {
+    'current-song-tuple-data': 1,
+    'playback-seek': 1,
+    'playback-seek-relative': 1,
+    'playlist-addurl': 1,
+    'playlist-insurl': 2,
+    'playlist-delete': 1,
+    'playlist-song': 1,
+    'playlist-song-filename': 1,
+    'playlist-song-length': 1,
+    'playlist-song-length-seconds': 1,
+    'playlist-song-length-frames': 1,
+    'playlist-jump': 1,
+    'set-current-playlist': 1,
+    'set-current-playlist-name': 1,
+    'set-volume': 1,
+}
+
+
+def format_time(seconds):
+    """Format seconds the way audtool does (m:ss)."""
+    seconds = int(seconds or 0)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def format_total_time(seconds):
+    """Format seconds like playlist-display's total (h:mm:ss)."""
+    seconds = int(seconds or 0)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class FakeAudacious:
+    """In-memory player state driven by audtool command names."""
+
+    DEFAULT_SONG_LENGTH = 180
+
+    def __init__(self, song_lengths=None):
+        self.lock = threading.RLock()
+        # filename -> length in seconds, used when adding songs
+        self.song_lengths = song_lengths or {}
+        self.playlists = [{'name': 'Now Playing', 'entries': [], 'position': 0}]
+        self.active = 0
+        self.status = 'stopped'
+        self.volume = 50
+        self.settings = {'repeat': False, 'shuffle': False, 'stop_after': False, 'auto_advance': True}
+        self.elapsed_ms = 0
+        self.started_at = None
+        self.calls = 0
+
+        self.commands = {
+            'current-song': self._current_song,
+            'current-song-filename': lambda: self._current_entry('filename'),
+            'current-song-length': lambda: self._current_length(format_time),
+            'current-song-length-seconds': lambda: self._current_length(str),
+            'current-song-length-frames': lambda: self._current_length(lambda s: str(s * 1000)),
+            'current-song-output-length': lambda: format_time(self._time_ms() // 1000),
+            'current-song-output-length-seconds': lambda: str(self._time_ms() // 1000),
+            'current-song-output-length-frames': lambda: str(self._time_ms()),
+            'current-song-bitrate': lambda: '320000' if self._entries else '0',
+            'current-song-bitrate-kbps': lambda: '320' if self._entries else '0',
+            'current-song-tuple-data': self._current_tuple_data,
+            'playback-play': self._play,
+            'playback-pause': self._pause,
+            'playback-playpause': self._playpause,
+            'playback-stop': self._stop,
+            'playback-playing': lambda: '' if self.status == 'playing' else None,
+            'playback-paused': lambda: '' if self.status == 'paused' else None,
+            'playback-stopped': lambda: '' if self.status == 'stopped' else None,
+            'playback-status': lambda: self.status,
+            'playback-seek': lambda secs: self._seek(int(float(secs)) * 1000),
+            'playback-seek-relative': lambda secs: self._seek(self._time_ms() + int(float(secs)) * 1000),
+            'playlist-advance': lambda: self._move(1),
+            'playlist-reverse': lambda: self._move(-1),
+            'playlist-addurl': self._add_url,
+            'playlist-insurl': self._insert_url,
+            'playlist-delete': self._delete,
+            'playlist-length': lambda: str(len(self._entries)),
+            'playlist-song': lambda pos: self._entry(pos, 'title'),
+            'playlist-song-filename': lambda pos: self._entry(pos, 'filename'),
+            'playlist-song-length': lambda pos: self._entry(pos, 'length', format_time),
+            'playlist-song-length-seconds': lambda pos: self._entry(pos, 'length', str),
+            'playlist-song-length-frames': lambda pos: self._entry(pos, 'length', lambda s: str(s * 1000)),
+            'playlist-display': self._display,
+            'playlist-position': lambda: str(self._playlist['position'] + 1),
+            'playlist-jump': self._jump,
+            'playlist-clear': self._clear,
+            'number-of-playlists': lambda: str(len(self.playlists)),
+            'current-playlist': lambda: str(self.active + 1),
+            'set-current-playlist': self._set_current_playlist,
+            'current-playlist-name': lambda: self._playlist['name'],
+            'set-current-playlist-name': self._set_current_playlist_name,
+            'new-playlist': self._new_playlist,
+            'delete-current-playlist': self._delete_current_playlist,
+            'get-volume': lambda: str(self.volume),
+            'set-volume': self._set_volume,
+            'version': lambda: 'Audacious 4.3 (fake)',
+        }
+        for name in self.settings:
+            command = name.replace('_', '-')
+            self.commands[f'playlist-{command}-status'] = self._setting_status(name)
+            self.commands[f'playlist-{command}-toggle'] = self._setting_toggle(name)
+
+    # Command dispatch
+
+    def execute(self, *args):
+        """Run one audtool command; return (returncode, stdout) like the real binary."""
+        if not args:
+            return 1, ''
+        handler = self.commands.get(args[0])
+        if handler is None:
+            return 1, ''
+        with self.lock:
+            self.calls += 1
+            try:
+                result = handler(*args[1:])
+            except (TypeError, ValueError, IndexError):
+                return 1, ''
+        if result is None:
+            return 1, ''
+        return 0, result
+
+    # Helpers
+
+    @property
+    def _playlist(self):
+        return self.playlists[self.active]
+
+    @property
+    def _entries(self):
+        return self._playlist['entries']
+
+    def _make_entry(self, url):
+        filename = url[len('file://'):] if url.startswith('file://') else url
+        title = os.path.splitext(os.path.basename(filename))[0]
+        return {
+            'filename': filename,
+            'title': title,
+            'artist': None,
+            'album': None,
+            'length': int(self.song_lengths.get(filename, self.DEFAULT_SONG_LENGTH)),
+        }
+
+    def _expand(self, url):
+        """Expand M3U playlist files the way Audacious does when they are added."""
+        filename = url[len('file://'):] if url.startswith('file://') else url
+        if filename.lower().endswith(('.m3u', '.m3u8')) and os.path.isfile(filename):
+            with open(filename, encoding='utf-8') as f:
+                lines = [line.strip() for line in f]
+            return [self._make_entry(line) for line in lines if line and not line.startswith('#')]
+        return [self._make_entry(url)]
+
+    def _time_ms(self):
+        if self.status == 'playing' and self.started_at is not None:
+            return self.elapsed_ms + int((time.monotonic() - self.started_at) * 1000)
+        return self.elapsed_ms
+
+    def _current(self):
+        entries = self._entries
+        if not entries:
+            return None
+        return entries[min(self._playlist['position'], len(entries) - 1)]
+
+    def _current_entry(self, field):
+        entry = self._current()
+        return entry[field] if entry else None
+
+    def _current_song(self):
+        entry = self._current()
+        return entry['title'] if entry else 'No song playing.'
+
+    def _current_length(self, formatter):
+        entry = self._current()
+        return formatter(entry['length']) if entry else None
+
+    def _current_tuple_data(self, field):
+        entry = self._current()
+        if not entry:
+            return None
+        value = entry.get(field)
+        return '' if value is None else str(value)
+
+    def _entry(self, pos, field, formatter=None):
+        index = int(pos) - 1
+        if index < 0 or index >= len(self._entries):
+            return None
+        value = self._entries[index][field]
+        return formatter(value) if formatter else value
+
+    # Playback
+
+    def _play(self):
+        if not self._entries:
+            return ''
+        if self.status != 'playing':
+            self.started_at = time.monotonic()
+        self.status = 'playing'
+        return ''
+
+    def _pause(self):
+        if self.status == 'playing':
+            self.elapsed_ms = self._time_ms()
+            self.status = 'paused'
+        elif self.status == 'paused':
+            self._play()
+        return ''
+
+    def _playpause(self):
+        if self.status == 'playing':
+            return self._pause()
+        return self._play()
+
+    def _stop(self):
+        self.status = 'stopped'
+        self.elapsed_ms = 0
+        self.started_at = None
+        return ''
+
+    def _seek(self, ms):
+        self.elapsed_ms = max(0, ms)
+        self.started_at = time.monotonic()
+        return ''
+
+    def _move(self, step):
+        if not self._entries:
+            return ''
+        position = self._playlist['position'] + step
+        if self.settings['repeat']:
+            position %= len(self._entries)
+        self._playlist['position'] = max(0, min(position, len(self._entries) - 1))
+        self._seek(0)
+        return ''
+
+    def _jump(self, pos):
+        index = int(pos) - 1
+        if index < 0 or index >= len(self._entries):
+            return None
+        self._playlist['position'] = index
+        self._seek(0)
+        return ''
+
+    # Playlist editing
+
+    def _add_url(self, url):
+        self._entries.extend(self._expand(url))
+        return ''
+
+    def _insert_url(self, url, pos):
+        index = max(0, min(int(pos) - 1, len(self._entries)))
+        had_entries = bool(self._entries)
+        new_entries = self._expand(url)
+        self._entries[index:index] = new_entries
+        # Audacious keeps the current entry selected when songs are inserted above it
+        if had_entries and index <= self._playlist['position']:
+            self._playlist['position'] += len(new_entries)
+        return ''
+
+    def _delete(self, pos):
+        index = int(pos) - 1
+        if index < 0 or index >= len(self._entries):
+            return None
+        del self._entries[index]
+        if index < self._playlist['position']:
+            self._playlist['position'] -= 1
+        return ''
+
+    def _clear(self):
+        self._entries.clear()
+        self._playlist['position'] = 0
+        self._stop()
+        return ''
+
+    def _display(self):
+        entries = self._entries
+        lines = [f"{len(entries)} track{'' if len(entries) == 1 else 's'}."]
+        for i, entry in enumerate(entries):
+            # Titles are padded to a 60 character column; lengths stay m:ss past an hour
+            lines.append(f"{i + 1:4d} | {entry['title']:<60} | {format_time(entry['length'])}")
+        total = sum(entry['length'] for entry in entries)
+        lines.append(f"Total length: {format_total_time(total)}")
+        return '\n'.join(lines)
+
+    # Playlists
+
+    def _set_current_playlist(self, number):
+        index = int(number) - 1
+        if index < 0 or index >= len(self.playlists):
+            return None
+        self.active = index
+        return ''
+
+    def _set_current_playlist_name(self, name):
+        self._playlist['name'] = name
+        return ''
+
+    def _new_playlist(self):
+        self.playlists.insert(self.active + 1, {'name': 'New Playlist', 'entries': [], 'position': 0})
+        self.active += 1
+        return ''
+
+    def _delete_current_playlist(self):
+        del self.playlists[self.active]
+        if not self.playlists:
+            self.playlists.append({'name': 'New Playlist', 'entries': [], 'position': 0})
+        self.active = min(self.active, len(self.playlists) - 1)
+        return ''
+
+    # Volume and settings
+
+    def _set_volume(self, volume):
+        self.volume = max(0, min(100, int(volume)))
+        return ''
+
+    def _setting_status(self, name):
+        return lambda: 'on' if self.settings[name] else 'off'
+
+    def _setting_toggle(self, name):
+        def toggle():
+            self.settings[name] = not self.settings[name]
+            return ''
+        return toggle
+
+    # Persistence for the command line mode
+
+    def to_dict(self):
+        return {
+            'playlists': self.playlists,
+            'active': self.active,
+            'status': self.status,
+            'volume': self.volume,
+            'settings': self.settings,
+            'elapsed_ms': self._time_ms(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        player = cls()
+        player.playlists = data['playlists']
+        player.active = data['active']
+        player.status = data['status']
+        player.volume = data['volume']
+        player.settings = data['settings']
+        player.elapsed_ms = data['elapsed_ms']
+        if player.status == 'playing':
+            player.started_at = time.monotonic()
+        return player
+
+
+def main(argv=None):
+    """Behave like the audtool binary, persisting state in FAKE_AUDACIOUS_STATE."""
+    argv = sys.argv[1:] if argv is None else argv
+    state_path = os.getenv('FAKE_AUDACIOUS_STATE', os.path.join('data', 'fake_audacious.json'))
+    time.sleep(float(os.getenv('FAKE_AUDACIOUS_DELAY', '0')))
+
+    player = FakeAudacious()
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            player = FakeAudacious.from_dict(json.load(f))
+
+    # Like audtool, run every command on the command line in turn and stop
+    # at the first one that fails
+    returncode = 0
+    i = 0
+    while i < len(argv):
+        count = COMMAND_ARGS.get(argv[i], 0)
+        returncode, output = player.execute(*argv[i:i + 1 + count])
+        if output:
+            print(output)
+        if returncode:
+            break
+        i += 1 + count
+
+    with open(state_path, 'w') as f:
+        json.dump(player.to_dict(), f)
+
+    return returncode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
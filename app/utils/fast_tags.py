@@ -0,0 +1,482 @@
+"""Reading title, artist, album and length from the headers of common audio formats.
+
+mutagen's parsers load whole tag blocks (cover art included) and, for some
+formats, scan well into the audio to work out the length. Over SMB/NFS every
+one of those bytes is a network transfer. This reader handles MP3 (ID3v2 and
+ID3v1), FLAC, Ogg Vorbis/Opus and MP4/M4A by reading just the regions that
+hold the fields we keep and seeking past everything else, in chunks of
+CHUNK_SIZE and never more than READ_BUDGET bytes per file.
+
+``read`` returns None for anything it doesn't handle (other formats, unusual
+tag features, files that would need more than the budget) so the caller can
+fall back to mutagen.
+"""
+import struct
+
+# Bytes read at a time; small fields next to each other come from one read
+CHUNK_SIZE = 8 * 1024
+
+# Most bytes read from one file before giving up in favour of mutagen
+READ_BUDGET = 128 * 1024
+
+# How far past the ID3 tag to look for the first MPEG frame
+MPEG_SYNC_SEARCH = 4096
+
+# Bytes of each Vorbis comment read to find its key
+VORBIS_KEY_PEEK = 32
+
+# Largest Ogg page header: 27 bytes and a segment table of up to 255 entries
+OGG_PAGE_HEADER = 27 + 255
+
+# The last Ogg page, which holds the final granule position, is at most this long
+OGG_MAX_PAGE = 65307
+
+ID3_FRAMES = {
+    2: {b'TT2': 'title', b'TP1': 'artist', b'TAL': 'album'},
+    3: {b'TIT2': 'title', b'TPE1': 'artist', b'TALB': 'album'},
+    4: {b'TIT2': 'title', b'TPE1': 'artist', b'TALB': 'album'},
+}
+ID3_ENCODINGS = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')
+
+MP4_ITEMS = {b'\xa9nam': 'title', b'\xa9ART': 'artist', b'\xa9alb': 'album'}
+
+VORBIS_FIELDS = ('title', 'artist', 'album')
+
+# Other formats an ID3v2 tag is sometimes put in front of (WAV, AIFF, APE,
+# WavPack, TTA, Musepack); their audio can look like MPEG frames
+NON_MPEG_SIGNATURES = (b'RIFF', b'FORM', b'MAC ', b'wvpk', b'TTA1', b'MPCK', b'MP+')
+
+# Bitrates in kbit/s by (MPEG-1, layer) and bitrate index
+MPEG_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = (44100, 48000, 32000)
+
+
+class Unsupported(Exception):
+    """The file needs mutagen: unknown format, unhandled feature or over the read budget."""
+
+
+class _Source:
+    """Reads ranges of a file, counting the bytes.
+
+    Keeps the first chunk of the file (where most headers are) and the last
+    chunk read, so nearby fields don't cost another read.
+    """
+
+    def __init__(self, f, size, budget):
+        self.f = f
+        self.size = size
+        self.budget = budget
+        self.bytes_read = 0
+        self._head = None
+        self._chunk = (0, b'')
+
+    def read(self, offset, length, readahead=CHUNK_SIZE):
+        """Return length bytes at offset; raises Unsupported past the end of the file or the budget.
+
+        Reads at least ``readahead`` bytes when it has to go to the file.
+        """
+        end = offset + length
+        if offset < 0 or length < 0 or end > self.size:
+            raise Unsupported('read outside the file')
+        for start, data in (self._head or (0, b''), self._chunk):
+            if offset >= start and end <= start + len(data):
+                return data[offset - start:end - start]
+
+        length = min(max(length, readahead), self.size - offset, self.budget - self.bytes_read)
+        if offset + length < end:
+            raise Unsupported('over the read budget')
+        self.f.seek(offset)
+        data = self.f.read(length)
+        self.bytes_read += len(data)
+        self._chunk = (offset, data)
+        if offset == 0:
+            self._head = self._chunk
+        return data[:end - offset]
+
+    def read_upto(self, offset, length):
+        """Like read, but stop at the end of the file."""
+        return self.read(offset, min(length, self.size - offset))
+
+
+class _Spans:
+    """Reads a packet that is split over several ranges of the file (Ogg pages)."""
+
+    def __init__(self, src, spans):
+        self.src = src
+        self.spans = spans
+
+    def read(self, offset, length):
+        parts = []
+        for start, size in self.spans:
+            if offset >= size:
+                offset -= size
+                continue
+            take = min(size - offset, length)
+            parts.append(self.src.read(start + offset, take))
+            length -= take
+            offset = 0
+            if not length:
+                break
+        if length:
+            raise Unsupported('read past the end of the packet')
+        return b''.join(parts)
+
+
+def read(path, budget=READ_BUDGET):
+    """Return {'title', 'artist', 'album', 'length'} (length in seconds, tags possibly missing), or None.
+
+    Errors opening or reading the file are raised; None means "use mutagen".
+    """
+    tags, _ = read_counted(path, budget)
+    return tags
+
+
+def read_counted(path, budget=READ_BUDGET):
+    """Like read, but return (tags or None, bytes read)."""
+    with open(path, 'rb', buffering=0) as f:
+        size = f.seek(0, 2)
+        src = _Source(f, size, budget)
+        try:
+            return _read(src), src.bytes_read
+        except (Unsupported, struct.error, IndexError, ValueError):
+            return None, src.bytes_read
+
+
+def _read(src):
+    head = src.read_upto(0, 12)
+    if head[:4] == b'OggS':
+        return _ogg(src)
+    if head[4:8] == b'ftyp':
+        return _mp4(src)
+
+    tags = {}
+    audio_start = 0
+    if head[:3] == b'ID3':
+        audio_start = _id3v2_end(head)
+        after_tag = src.read_upto(audio_start, 4)
+        if after_tag == b'fLaC':
+            # FLAC files keep their tags in Vorbis comments; an ID3 tag in front is ignored
+            return _flac(src, audio_start)
+        if after_tag.startswith(NON_MPEG_SIGNATURES):
+            raise Unsupported('ID3v2 tag in front of another format')
+        _id3v2(src, tags)
+    elif head[:4] == b'fLaC':
+        return _flac(src, 0)
+    elif _mpeg_header(head[:4]) is None:
+        # Only files that start with an ID3 tag or an MPEG frame are taken
+        # for MP3s; WAV, AIFF, ASF and the like go to mutagen
+        raise Unsupported('unknown format')
+
+    tags['length'] = _mpeg_length(src, audio_start)
+    _id3v1(src, tags)
+    return tags
+
+
+def _syncsafe(data):
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+def _id3v2_end(header):
+    """Offset just past the ID3v2 tag (and its footer) that header starts."""
+    size = 10 + _syncsafe(header[6:10])
+    return size + 10 if header[5] & 0x10 else size
+
+
+def _id3v2(src, tags):
+    """Fill tags from the text frames of the ID3v2 tag at the start of the file."""
+    header = src.read(0, 10)
+    major, flags = header[3], header[5]
+    if major not in ID3_FRAMES or (flags & 0x80 and major < 4) or (major == 2 and flags & 0x40):
+        # Unknown version, whole-tag unsynchronisation or compressed v2.2 tag
+        raise Unsupported('ID3v2 feature')
+    tag_end = 10 + _syncsafe(header[6:10])
+
+    pos = 10
+    if flags & 0x40:
+        # Skip the extended header
+        if major == 3:
+            pos += 4 + struct.unpack('>I', src.read(pos, 4))[0]
+        else:
+            pos += _syncsafe(src.read(pos, 4))
+
+    frames = ID3_FRAMES[major]
+    header_size = 6 if major == 2 else 10
+    while pos + header_size <= tag_end:
+        frame = src.read(pos, header_size)
+        if frame[0] == 0:
+            break  # padding
+        if major == 2:
+            frame_id, size, frame_flags = frame[:3], int.from_bytes(frame[3:6], 'big'), 0
+        elif major == 3:
+            frame_id, size, frame_flags = frame[:4], struct.unpack('>I', frame[4:8])[0], frame[9] & 0xE0
+        else:
+            frame_id, size, frame_flags = frame[:4], _syncsafe(frame[4:8]), frame[9] & 0x4F
+        if pos + header_size + size > tag_end:
+            raise Unsupported('ID3v2 frame past the end of the tag')
+
+        name = frames.get(frame_id)
+        if name is not None and name not in tags:
+            if frame_flags:
+                # Compressed, encrypted, grouped or unsynchronised frame
+                raise Unsupported('ID3v2 frame feature')
+            tags[name] = _id3_text(src.read(pos + header_size, size))
+            if len(tags) == len(frames):
+                break
+        pos += header_size + size
+
+
+def _id3_text(data):
+    """The first value of an ID3 text frame."""
+    encoding, text = data[0], data[1:]
+    if encoding in (1, 2) and len(text) % 2:
+        text = text[:-1]
+    return text.decode(ID3_ENCODINGS[encoding]).split('\x00')[0]
+
+
+def _id3v1(src, tags):
+    """Fill the fields tags lacks from an ID3v1 tag at the end of the file, as mutagen merges them."""
+    if src.size < 128:
+        return
+    data = src.read(src.size - 128, 128)
+    if data[:3] != b'TAG':
+        return
+    for name, start, end in (('title', 3, 33), ('artist', 33, 63), ('album', 63, 93)):
+        value = data[start:end].split(b'\x00')[0].strip().decode('latin-1')
+        if value and name not in tags:
+            tags[name] = value
+
+
+def _mpeg_header(header):
+    """Decode an MPEG audio frame header into (mpeg1, layer, bitrate, sample_rate, mono, frame_length)."""
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 3
+    layer = 4 - ((header[1] >> 1) & 3)
+    bitrate_index, rate_index = header[2] >> 4, (header[2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = MPEG_BITRATES[mpeg1, layer][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[rate_index] >> (0 if mpeg1 else 1 if version == 2 else 2)
+    padding = (header[2] >> 1) & 1
+    if layer == 1:
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        frame_length = _mpeg_samples(mpeg1, layer) // 8 * bitrate // sample_rate + padding
+    return mpeg1, layer, bitrate, sample_rate, header[3] >> 6 == 3, frame_length
+
+
+def _mpeg_samples(mpeg1, layer):
+    if layer == 1:
+        return 384
+    return 1152 if mpeg1 or layer == 2 else 576
+
+
+def _mpeg_length(src, start):
+    """Length in seconds from the first frame: its Xing/Info or VBRI frame count, else the bitrate."""
+    data = src.read_upto(start, MPEG_SYNC_SEARCH)
+    i = data.find(b'\xff')
+    while i != -1:
+        frame = _mpeg_header(data[i:i + 4]) if i + 4 <= len(data) else None
+        if frame is not None:
+            # Make sure the next frame follows where this one says, not a stray 0xFF
+            following = _mpeg_header(src.read_upto(start + i + frame[5], 4) + b'\x00' * 4)
+            if following is not None and following[:2] == frame[:2] and following[3] == frame[3]:
+                break
+        i = data.find(b'\xff', i + 1)
+    else:
+        raise Unsupported('no MPEG frame found')
+
+    mpeg1, layer, bitrate, sample_rate, mono, _ = frame
+    frame_start = start + i
+    samples = _mpeg_samples(mpeg1, layer)
+
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = src.read(frame_start + 4 + side_info, 12)
+    if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 1:
+        return struct.unpack('>I', xing[8:12])[0] * samples / sample_rate
+    vbri = src.read(frame_start + 36, 18)
+    if vbri[:4] == b'VBRI':
+        return struct.unpack('>I', vbri[14:18])[0] * samples / sample_rate
+    # Like mutagen, count everything after the first frame as audio
+    return (src.size - frame_start) * 8 / bitrate
+
+
+def _vorbis_comment(read, tags):
+    """Fill tags from a Vorbis comment block (FLAC, Ogg Vorbis and Opus).
+
+    ``read(offset, length)`` returns bytes of the block; only the keys of the
+    other comments are read, so embedded pictures are skipped.
+    """
+    pos = 4 + struct.unpack('<I', read(0, 4))[0]
+    count = struct.unpack('<I', read(pos, 4))[0]
+    pos += 4
+    for _ in range(count):
+        length = struct.unpack('<I', read(pos, 4))[0]
+        pos += 4
+        key = read(pos, min(length, VORBIS_KEY_PEEK)).partition(b'=')[0]
+        name = key.decode('ascii', 'replace').lower()
+        if name in VORBIS_FIELDS and name not in tags:
+            tags[name] = read(pos, length).partition(b'=')[2].decode('utf-8', 'replace')
+        pos += length
+
+
+def _flac(src, start):
+    """Tags from the VORBIS_COMMENT block and length from STREAMINFO, skipping pictures and padding."""
+    tags = {}
+    pos = start + 4
+    while True:
+        header = src.read(pos, 4)
+        block_type, size = header[0] & 0x7F, int.from_bytes(header[1:4], 'big')
+        if block_type == 0:
+            info = src.read(pos + 4, 18)
+            sample_rate = int.from_bytes(info[10:13], 'big') >> 4
+            total_samples = int.from_bytes(info[13:18], 'big') & 0xFFFFFFFFF
+            if not sample_rate:
+                raise Unsupported('FLAC without a sample rate')
+            tags['length'] = total_samples / sample_rate
+        elif block_type == 4:
+            block = pos + 4
+            _vorbis_comment(lambda offset, length: src.read(block + offset, length), tags)
+        pos += 4 + size
+        if header[0] & 0x80:
+            break
+    if 'length' not in tags:
+        raise Unsupported('FLAC without STREAMINFO')
+    return tags
+
+
+def _ogg_packets(src, count):
+    """The first count packets of the Ogg stream as _Spans, and the stream's serial number.
+
+    Only the page headers are read here; the packets are read through the
+    spans as needed.
+    """
+    packets, spans, pos, serial = [], [], 0, None
+    while len(packets) < count:
+        # Just the header and segment table: the rest of the page is skipped
+        header = src.read(pos, 27, readahead=OGG_PAGE_HEADER)
+        if header[:4] != b'OggS':
+            raise Unsupported('bad Ogg page')
+        if serial is None:
+            serial = header[14:18]
+        elif header[14:18] != serial:
+            raise Unsupported('multiplexed Ogg streams')
+        segments = src.read(pos + 27, header[26], readahead=0)
+        offset = pos + 27 + len(segments)
+        for lacing in segments:
+            if lacing:
+                spans.append((offset, lacing))
+            offset += lacing
+            if lacing < 255:
+                packets.append(_Spans(src, spans))
+                spans = []
+                if len(packets) == count:
+                    break
+        pos = offset
+    return packets, serial
+
+
+def _ogg_last_granule(src, serial):
+    """The granule position of the stream's last page, searching back from the end of the file."""
+    for span in (CHUNK_SIZE, OGG_MAX_PAGE + 27 + 255):
+        start = max(src.size - span, 0)
+        tail = src.read(start, src.size - start)
+        i = tail.rfind(b'OggS')
+        while i != -1:
+            if tail[i + 14:i + 18] == serial and len(tail) >= i + 14:
+                granule = struct.unpack_from('<q', tail, i + 6)[0]
+                if granule >= 0:
+                    return granule
+            i = tail.rfind(b'OggS', 0, i)
+        if start == 0:
+            break
+    raise Unsupported('no final Ogg page')
+
+
+def _ogg(src):
+    """Ogg Vorbis or Opus: the comment packet for tags, the last page's granule for length."""
+    (identification, comment), serial = _ogg_packets(src, 2)
+    identification = identification.read(0, 16)
+    tags = {}
+    if identification.startswith(b'\x01vorbis') and comment.read(0, 7) == b'\x03vorbis':
+        sample_rate, pre_skip, skip = struct.unpack_from('<I', identification, 12)[0], 0, 7
+    elif identification.startswith(b'OpusHead') and comment.read(0, 8) == b'OpusTags':
+        sample_rate, pre_skip, skip = 48000, struct.unpack_from('<H', identification, 10)[0], 8
+    else:
+        raise Unsupported('Ogg codec')
+    _vorbis_comment(lambda offset, length: comment.read(skip + offset, length), tags)
+    if not sample_rate:
+        raise Unsupported('Ogg without a sample rate')
+    tags['length'] = max(_ogg_last_granule(src, serial) - pre_skip, 0) / sample_rate
+    return tags
+
+
+def _mp4_atoms(src, start, end):
+    """Yield (type, data start, atom end) for the atoms between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack('>I4s', src.read(pos, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', src.read(pos + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise Unsupported('bad MP4 atom')
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _mp4_child(src, start, end, kind):
+    for child, data_start, child_end in _mp4_atoms(src, start, end):
+        if child == kind:
+            return data_start, child_end
+    return None
+
+
+def _mp4(src):
+    """MP4/M4A: length from mvhd and tags from moov/udta/meta/ilst, seeking past mdat and the sample tables."""
+    moov = _mp4_child(src, 0, src.size, b'moov')
+    if moov is None:
+        raise Unsupported('MP4 without moov')
+
+    tags = {}
+    mvhd = _mp4_child(src, *moov, b'mvhd')
+    if mvhd is None:
+        raise Unsupported('MP4 without mvhd')
+    header = src.read(mvhd[0], 32)
+    if header[0] == 1:
+        timescale, duration = struct.unpack_from('>IQ', header, 20)
+    else:
+        timescale, duration = struct.unpack_from('>II', header, 12)
+    if not timescale:
+        raise Unsupported('MP4 without a timescale')
+    tags['length'] = duration / timescale
+
+    udta = _mp4_child(src, *moov, b'udta')
+    meta = udta and _mp4_child(src, *udta, b'meta')
+    # meta is a full box: version and flags come before its children
+    ilst = meta and _mp4_child(src, meta[0] + 4, meta[1], b'ilst')
+    if ilst:
+        for kind, item_start, item_end in _mp4_atoms(src, *ilst):
+            name = MP4_ITEMS.get(kind)
+            if name is None or name in tags:
+                continue
+            data = _mp4_child(src, item_start, item_end, b'data')
+            if data is not None:
+                # Type indicator and locale precede the value
+                tags[name] = src.read(data[0] + 8, data[1] - data[0] - 8).decode('utf-8', 'replace')
+    return tags
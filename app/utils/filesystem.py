@@ -48,4 +48,54 @@ def get_directory_contents(directory=None):
         'relative_path': str(target_path.relative_to(root_path)) if target_path != root_path else '',
         'dirs': dirs,
         'files': files
-    } 
\ No newline at end of file
+    } 
+
+def iter_audio_files(directory, extensions, recursive=True):
+    """Yield the paths of the audio files under a directory as they are found.
+    
+    Walks with os.scandir, so the file type comes from the directory listing
+    rather than a stat per file, and keeps only the directories currently
+    being listed in memory. Entries are visited in name order, hidden files
+    and directories are skipped, and a directory reached twice through
+    symlinks is listed once. Directories that can't be read are logged and
+    skipped.
+    """
+    stack = [iter(_sorted_entries(directory))]
+    seen = {_directory_key(directory)}
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            continue
+        if entry.name.startswith('.'):
+            continue
+        
+        try:
+            if entry.is_dir():
+                if recursive:
+                    key = _directory_key(entry)
+                    if key not in seen:
+                        seen.add(key)
+                        stack.append(iter(_sorted_entries(entry.path)))
+            elif entry.is_file() and os.path.splitext(entry.name)[1][1:].lower() in extensions:
+                yield entry.path
+        except OSError as e:
+            current_app.logger.error(f"Error accessing {entry.path}: {e}")
+
+
+def _sorted_entries(directory):
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except OSError as e:
+        current_app.logger.error(f"Error accessing directory {directory}: {e}")
+        return []
+
+
+def _directory_key(directory):
+    """(device, inode) of a directory path or DirEntry, following symlinks."""
+    try:
+        st = directory.stat() if isinstance(directory, os.DirEntry) else os.stat(directory)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
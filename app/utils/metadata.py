@@ -0,0 +1,163 @@
+"""Reading track metadata from audio files, one at a time or in a pool.
+
+Reading tags means opening the file and parsing its headers, which is mostly
+waiting on the disk (or the network, for a share) plus some pure-Python
+parsing in mutagen. ``read_all`` overlaps many files in a thread pool, or a
+process pool to spread the parsing over several cores, and hands the results
+back in order while keeping only a bounded number of files in flight.
+
+Given a TagCache, files whose size, mtime and inode match a cached entry are
+not parsed at all; the fields read from the others are added to the cache.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+
+from mutagen import File as MutagenFile
+
+from app.utils import fast_tags
+from app.utils.tag_cache import file_key
+
+# Files submitted to the pool ahead of the one being handed back, per worker
+WINDOW_PER_WORKER = 4
+
+# Paths looked up in the tag cache per query
+CACHE_LOOKUP_CHUNK = 500
+
+# Cache entry for a path that has none; matches no file
+_MISSING = (None, None)
+
+
+def default_tags(path):
+    """The fields of a file without tags: its name as title and no length."""
+    return {
+        'title': os.path.basename(path),
+        'artist': None,
+        'album': None,
+        'length': "0:00",
+        'length_seconds': 0
+    }
+
+
+def read_tags(path):
+    """Return the Track fields (title, artist, album, length, length_seconds) for an audio file.
+
+    The common formats are read by fast_tags from their headers; anything
+    it doesn't handle goes through mutagen. Missing tags keep their
+    defaults: the file name as title and no length. Errors from unreadable
+    files are raised to the caller.
+    """
+    fields = default_tags(path)
+
+    tags = fast_tags.read(path)
+    if tags is None:
+        tags = _read_mutagen(path)
+    for field in ('title', 'artist', 'album'):
+        if tags.get(field) is not None:
+            fields[field] = tags[field]
+
+    # Get length
+    if tags.get('length') is not None:
+        length_seconds = int(tags['length'])
+        minutes, seconds = divmod(length_seconds, 60)
+        fields['length'] = f"{int(minutes)}:{int(seconds):02d}"
+        fields['length_seconds'] = length_seconds
+    return fields
+
+
+def _read_mutagen(path):
+    """Title, artist, album and length (in seconds) as far as mutagen finds them."""
+    tags = {}
+    audio = MutagenFile(path)
+    if audio:
+        # Try to get title, artist and album - different files have different tag formats
+        if hasattr(audio, 'tags') and audio.tags:
+            for field, key, frame in (('title', 'title', 'TIT2'), ('artist', 'artist', 'TPE1'), ('album', 'album', 'TALB')):
+                if key in audio:
+                    tags[field] = audio[key][0]
+                elif frame in audio:
+                    tags[field] = audio[frame].text[0]
+
+        if hasattr(audio, 'info') and hasattr(audio.info, 'length'):
+            tags['length'] = audio.info.length
+    return tags
+
+
+def read_cached(path, cache):
+    """read_tags through the cache: the cached fields if the file is unchanged, else parse and remember."""
+    key = file_key(path)
+    fields = cache.get(path, key)
+    if fields is None:
+        fields = read_tags(path)
+        cache.put(path, key, fields)
+        cache.commit()
+    return fields
+
+
+def _read(path, cached=None):
+    """Return (key, fields, error, hit); the stat runs in the worker, next to the parse it may save."""
+    key = file_key(path) if cached is not None else None
+    if key is not None and key == cached[0]:
+        return key, cached[1], None, True
+    try:
+        return key, read_tags(path), None, False
+    except Exception as e:
+        return key, None, e, False
+
+
+def _cached_entries(paths, cache):
+    """Pair each path with its cache entry, looking them up a chunk at a time."""
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= CACHE_LOOKUP_CHUNK:
+            entries = cache.get_many(chunk)
+            yield from ((path, entries.get(path, _MISSING)) for path in chunk)
+            chunk = []
+    entries = cache.get_many(chunk) if chunk else {}
+    yield from ((path, entries.get(path, _MISSING)) for path in chunk)
+
+
+def read_all(paths, workers=4, executor='thread', cache=None):
+    """Read the tags of many files in a pool; yield (path, fields, error) in input order.
+
+    ``error`` is the exception raised for a file that couldn't be read, in
+    which case ``fields`` is None. ``executor`` is 'thread' or 'process';
+    with a single worker the files are read inline. With a ``cache``, its
+    hits skip the parse and the other files' fields are stored in it.
+    """
+    if cache is None or cache.connection is None:
+        cache = None
+        requests = ((path, None) for path in paths)
+    else:
+        # Every entry is passed on (a miss as an impossible key) so the worker stats the file
+        requests = _cached_entries(paths, cache)
+
+    def result(path, key, fields, error, hit):
+        if cache is not None:
+            cache.count(hit)
+            if not hit and fields is not None:
+                cache.put(path, key, fields)
+        return path, fields, error
+
+    try:
+        if workers <= 1:
+            for path, cached in requests:
+                yield result(path, *_read(path, cached))
+            return
+
+        pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+        window = workers * WINDOW_PER_WORKER
+        with pool_class(max_workers=workers) as pool:
+            in_flight = deque()
+            for path, cached in requests:
+                in_flight.append((path, pool.submit(_read, path, cached)))
+                if len(in_flight) >= window:
+                    path, future = in_flight.popleft()
+                    yield result(path, *future.result())
+            while in_flight:
+                path, future = in_flight.popleft()
+                yield result(path, *future.result())
+    finally:
+        if cache is not None:
+            cache.commit()
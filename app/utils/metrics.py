@@ -0,0 +1,164 @@
+"""In-process counters and histograms, rendered in the Prometheus text format.
+
+Only the standard library is used, so the numbers are per process and start
+from zero on every restart, which is what a Prometheus scrape expects.
+"""
+import bisect
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+# Upper bounds (seconds) of the latency histogram buckets
+PLAYER_CALL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        names = self.labels + ('le',)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket', _format_labels(names, key + (le,)), cumulative
+            yield f'{self.name}_sum', _format_labels(self.labels, key), total
+            yield f'{self.name}_count', _format_labels(self.labels, key), cumulative
+
+
+class Registry:
+    """The set of metrics rendered on /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+player_calls = registry.register(Counter(
+    'player_calls_total', 'Player commands sent, by command and originating route.',
+    ('command', 'route')))
+player_call_seconds = registry.register(Histogram(
+    'player_call_seconds', 'Time spent in player commands, by command and originating route.',
+    ('command', 'route'), PLAYER_CALL_BUCKETS))
+player_call_errors = registry.register(Counter(
+    'player_call_errors_total',
+    'Player commands that failed: unavailable (player unreachable), error (exception) '
+    'or rejected (circuit breaker open or no call slot).',
+    ('command', 'route', 'reason')))
+player_processes = registry.register(Counter(
+    'player_processes_total', 'audtool processes started (fork/exec), by command.',
+    ('command',)))
+http_requests = registry.register(Counter(
+    'http_requests_total', 'HTTP requests handled, by blueprint and status code.',
+    ('blueprint', 'status')))
+http_request_seconds = registry.register(Histogram(
+    'http_request_seconds', 'Time to produce HTTP responses, by blueprint.',
+    ('blueprint',), REQUEST_BUCKETS))
+tag_cache_lookups = registry.register(Counter(
+    'tag_cache_lookups_total', 'Tag reads answered from the tag cache (hit) or by parsing the file (miss).',
+    ('result',)))
+
+
+def current_route():
+    """Name what a player call is made for: the endpoint, or the background thread."""
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return threading.current_thread().name
+
+
+def init_app(app):
+    """Time every request and count it per blueprint."""
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            blueprint = request.blueprint or 'app'
+            http_request_seconds.observe(time.perf_counter() - started, blueprint=blueprint)
+            http_requests.inc(blueprint=blueprint, status=response.status_code)
+        return response
@@ -1,12 +1,79 @@
 from storify.model import Model
-from datetime import datetime
+from app.utils.track_list import TrackList
+from datetime import datetime, timedelta
+import sys
+import time
 import uuid
 
+_EPOCH = datetime(1970, 1, 1)
 
-class Playlist(Model):
+
+def _intern(value):
+    """Share one copy of strings that repeat across many tracks (artists, albums, ids)."""
+    return sys.intern(value) if type(value) is str else value
+
+
+class TrackedModel(Model):
+    """A Model that reports changes made to it after it was constructed.
+
+    DataService sets ``change_listener`` so that changing a stored model marks
+    its database for the next write-behind flush. Each model calls
+    ``_start_tracking()`` at the end of ``__init__``, so building or loading a
+    model doesn't count as a change.
+
+    The listener is called as ``listener(model, edit)``. ``edit`` is None for
+    a plain change, or a small description of it that the model can replay
+    with ``apply_edit`` (see Playlist).
+
+    Models keep their fields in ``__slots__``. Storify's Model has no
+    ``__slots__`` (and storify needs models to be Model instances), so each
+    instance still has a ``__dict__`` slot and ``__weakref__``, but nothing
+    is stored in it: CPython only allocates the dict if it is accessed or an
+    attribute outside the slots is set. Most of the saving comes from
+    interning the repeated field values (see ``_intern``).
+    """
+    __slots__ = ('_tracked',)
+    change_listener = None
+
+    def __new__(cls, *args, **kwargs):
+        self = super().__new__(cls)
+        object.__setattr__(self, '_tracked', False)
+        return self
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if self._tracked and not name.startswith('_'):
+            self._changed()
+
+    def _start_tracking(self):
+        object.__setattr__(self, '_tracked', True)
+
+    def _changed(self, edit=None):
+        listener = TrackedModel.change_listener
+        if listener is not None:
+            listener(self, edit)
+
+
+class Playlist(TrackedModel):
+    """A playlist.
+
+    Edits to ``track_ids`` and changes to the fields in EDIT_FIELDS are
+    reported as edits (``('insert', track_id, position)``, ``('extend',
+    track_ids)``, ``('remove', track_id)``, ``('move', track_id,
+    position)`` or ``('set', field, value)``) so they can be logged instead
+    of rewriting the playlist.
+    ``oplog_seq`` is the sequence number of the last logged edit the playlist
+    includes.
+    """
+    __slots__ = ('id', 'name', 'created_at', 'updated_at', 'shuffle', 'repeat', 'stop_after_current',
+                 'auto_advance', 'track_ids', 'watch_paths', 'oplog_seq')
+    
+    # Fields whose changes are reported as ('set', field, value) edits
+    EDIT_FIELDS = ('name', 'updated_at', 'shuffle', 'repeat', 'stop_after_current', 'auto_advance')
+    
     def __init__(self, playlist_id=None, name=None, created_at=None, updated_at=None,
                  shuffle=False, repeat=False, stop_after_current=False, auto_advance=True,
-                 tracks=None, watch_paths=None):
+                 tracks=None, watch_paths=None, oplog_seq=0):
         self.id = playlist_id or str(uuid.uuid4())
         self.name = name or "New Playlist"
         self.created_at = created_at or datetime.utcnow()
@@ -23,6 +90,36 @@ class Playlist(Model):
         
         # Watch paths for this playlist
         self.watch_paths = watch_paths or []
+        
+        # Last logged edit included in this playlist
+        self.oplog_seq = oplog_seq
+        
+        self._start_tracking()
+    
+    def __setattr__(self, name, value):
+        if name == 'track_ids':
+            # Edits made in place on the track list count as changes too
+            if not isinstance(value, TrackList):
+                value = TrackList(value)
+            value.on_change = self._track_ids_changed
+        elif name in self.EDIT_FIELDS and self._tracked:
+            object.__setattr__(self, name, value)
+            self._changed(('set', name, value))
+            return
+        super().__setattr__(name, value)
+    
+    def _track_ids_changed(self, *edit):
+        self._changed(edit)
+    
+    def apply_edit(self, edit):
+        """Replay a reported edit without reporting it again; False if it no longer applies."""
+        if edit[0] != 'set':
+            return self.track_ids.apply(edit)
+        _, name, value = edit
+        if name not in self.EDIT_FIELDS:
+            raise ValueError(f"{name!r} is not an editable playlist field")
+        object.__setattr__(self, name, value)
+        return True
     
     def _to_dict(self):
         """Convert to dictionary for Storify serialization."""
@@ -35,8 +132,9 @@ class Playlist(Model):
             'repeat': self.repeat,
             'stop_after_current': self.stop_after_current,
             'auto_advance': self.auto_advance,
-            'track_ids': self.track_ids,
-            'watch_paths': self.watch_paths
+            'track_ids': list(self.track_ids),
+            'watch_paths': self.watch_paths,
+            'oplog_seq': self.oplog_seq
         }
     
     @classmethod
@@ -51,8 +149,9 @@ class Playlist(Model):
             repeat=data['repeat'],
             stop_after_current=data['stop_after_current'],
             auto_advance=data['auto_advance'],
-            tracks=data['track_ids'],
-            watch_paths=data['watch_paths']
+            tracks=[_intern(track_id) for track_id in data['track_ids']],
+            watch_paths=data['watch_paths'],
+            oplog_seq=data.get('oplog_seq', 0)
         )
     
     def to_dict(self):
@@ -75,21 +174,63 @@ class Playlist(Model):
         self.updated_at = datetime.utcnow()
 
 
-class Track(Model):
+class Track(TrackedModel):
+    """A library entry.
+
+    Kept compact since there is one per file in the library: ids, artists,
+    albums and lengths are interned, so a playlist's track ids and every
+    track by the same artist share their strings, and ``created_at`` is
+    stored as seconds since the epoch and only turned into a datetime when
+    read.
+
+    ``pending`` marks a track added with just its file name whose tags are
+    still to be read (see enrichment.py).
+    """
+    __slots__ = ('id', 'title', 'artist', 'album', 'length', 'length_seconds', 'filename', 'pending', '_created')
+    
     def __init__(self, track_id=None, title=None, artist=None, album=None, 
-                 length=None, length_seconds=None, filename=None, created_at=None):
-        self.id = track_id or str(uuid.uuid4())
+                 length=None, length_seconds=None, filename=None, created_at=None, pending=False):
+        self.id = _intern(track_id) or str(uuid.uuid4())
         self.title = title
-        self.artist = artist
-        self.album = album
-        self.length = length
+        self.artist = _intern(artist)
+        self.album = _intern(album)
+        self.length = _intern(length)
         self.length_seconds = length_seconds
         self.filename = filename
-        self.created_at = created_at or datetime.utcnow()
+        self.pending = pending
+        if created_at is None:
+            object.__setattr__(self, '_created', time.time())
+        else:
+            self.created_at = created_at
+        
+        self._start_tracking()
+    
+    @property
+    def created_at(self):
+        return _EPOCH + timedelta(seconds=self._created)
+    
+    @created_at.setter
+    def created_at(self, value):
+        # A naive UTC datetime, as utcnow() returns
+        object.__setattr__(self, '_created', (value - _EPOCH).total_seconds())
+    
+    def set_tags(self, fields):
+        """Fill in the fields read from the file (see metadata.read_tags) and clear ``pending``.
+        
+        Reported as a single change rather than one per field.
+        """
+        set_field = object.__setattr__
+        set_field(self, 'title', fields['title'])
+        set_field(self, 'artist', _intern(fields['artist']))
+        set_field(self, 'album', _intern(fields['album']))
+        set_field(self, 'length', _intern(fields['length']))
+        set_field(self, 'length_seconds', fields['length_seconds'])
+        set_field(self, 'pending', False)
+        self._changed()
     
     def _to_dict(self):
         """Convert to dictionary for Storify serialization."""
-        return {
+        data = {
             'id': self.id,
             'title': self.title,
             'artist': self.artist,
@@ -99,20 +240,28 @@ class Track(Model):
             'filename': self.filename,
             'created_at': self.created_at.isoformat()
         }
+        if self.pending:
+            data['pending'] = True
+        return data
     
     @classmethod
     def _from_dict(cls, data):
         """Create instance from dictionary for Storify deserialization."""
-        return cls(
-            track_id=data['id'],
-            title=data['title'],
-            artist=data['artist'],
-            album=data['album'],
-            length=data['length'],
-            length_seconds=data['length_seconds'],
-            filename=data['filename'],
-            created_at=datetime.fromisoformat(data['created_at'])
-        )
+        # Runs once per track when the library loads, so fill the slots
+        # directly rather than through __init__ and the change tracking hook
+        track = cls.__new__(cls)
+        set_field = object.__setattr__
+        set_field(track, 'id', _intern(data['id']))
+        set_field(track, 'title', data['title'])
+        set_field(track, 'artist', _intern(data['artist']))
+        set_field(track, 'album', _intern(data['album']))
+        set_field(track, 'length', _intern(data['length']))
+        set_field(track, 'length_seconds', data['length_seconds'])
+        set_field(track, 'filename', data['filename'])
+        set_field(track, 'pending', data.get('pending', False))
+        set_field(track, '_created', (datetime.fromisoformat(data['created_at']) - _EPOCH).total_seconds())
+        track._start_tracking()
+        return track
     
     def to_dict(self):
         return {
@@ -122,11 +271,14 @@ class Track(Model):
             'album': self.album,
             'length': self.length,
             'length_seconds': self.length_seconds,
-            'filename': self.filename
+            'filename': self.filename,
+            'pending': self.pending
         }
 
 
-class WatchPath(Model):
+class WatchPath(TrackedModel):
+    __slots__ = ('id', 'path', 'recursive', 'auto_add', 'playlist_id', 'created_at')
+    
     def __init__(self, watch_path_id=None, path=None, recursive=True, auto_add=True, 
                  playlist_id=None, created_at=None):
         self.id = watch_path_id or str(uuid.uuid4())
@@ -135,6 +287,8 @@ class WatchPath(Model):
         self.auto_add = auto_add
         self.playlist_id = playlist_id
         self.created_at = created_at or datetime.utcnow()
+        
+        self._start_tracking()
     
     def _to_dict(self):
         """Convert to dictionary for Storify serialization."""
@@ -0,0 +1,417 @@
+"""Backends that carry audtool commands to Audacious.
+
+Everything in ``audtool.py`` speaks in audtool command names
+(``current-song``, ``playlist-song 3``, ...). A backend takes such a command and
+returns what audtool would have printed, or ``None`` if audtool would have
+exited with an error. That keeps the helper functions unchanged no matter how
+the player is actually reached:
+
+- ``dbus``: one long-lived session bus connection to Audacious' own
+  ``org.atheme.audacious`` interface (the one audtool itself uses), so a query
+  is a method call instead of a fork/exec. Needs the optional ``dbus-python``
+  package; commands it does not map are passed on to the subprocess backend.
+- ``subprocess``: runs the audtool binary once per command (the original
+  behaviour).
+- ``fake``: an in-process :class:`FakeAudacious` for development and benchmarks.
+
+``auto`` (the default) prefers D-Bus and falls back to the subprocess backend.
+
+Every call gets a deadline (AUDTOOL_TIMEOUT). A backend raises
+:class:`PlayerUnavailable` when the player could not be reached at all, as
+opposed to a command that merely failed; ``audtool.run_audtool`` feeds those
+into :data:`breaker` so a dead or hung player stops costing a process and an
+error log line per call.
+"""
+import contextlib
+import re
+import subprocess
+import threading
+import time
+
+from flask import current_app
+
+from app.utils import metrics
+from app.utils.fake_audacious import FakeAudacious, format_time
+
+try:
+    import dbus
+except ImportError:  # dbus-python is optional
+    dbus = None
+
+
+class BackendUnavailable(Exception):
+    """Raised when a backend cannot be used in this environment."""
+
+
+class PlayerUnavailable(Exception):
+    """Raised when a call could not reach the player (not running, hung, no audtool)."""
+
+
+class CircuitBreaker:
+    """Stops calling a player that keeps failing and probes it with backoff.
+
+    While closed, calls go through. After ``threshold`` consecutive
+    PlayerUnavailable failures the breaker opens and calls are refused
+    without touching the player. Once the backoff has passed, a single probe
+    call is let through: success closes the breaker, failure reopens it with
+    the backoff doubled, up to ``max_backoff`` seconds.
+    """
+
+    def __init__(self, threshold=3, backoff=1.0, max_backoff=30.0):
+        self._lock = threading.Lock()
+        self.configure(threshold, backoff, max_backoff)
+
+    def configure(self, threshold, backoff, max_backoff):
+        with self._lock:
+            self.threshold = max(1, int(threshold))
+            self.base_backoff = float(backoff)
+            self.max_backoff = max(float(max_backoff), self.base_backoff)
+            self._failures = 0
+            self._backoff = self.base_backoff
+            self._open_until = None
+            self._probing = False
+
+    @property
+    def is_open(self):
+        return self._open_until is not None
+
+    def allow(self):
+        """Return True if a call may go to the player now."""
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if self._probing or time.monotonic() < self._open_until:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        """Record a call that reached the player; returns True if this closed the breaker."""
+        with self._lock:
+            was_open = self._open_until is not None
+            self._failures = 0
+            self._backoff = self.base_backoff
+            self._open_until = None
+            self._probing = False
+            return was_open
+
+    def record_failure(self):
+        """Record a call that could not reach the player; returns True if this opened the breaker."""
+        with self._lock:
+            self._failures += 1
+            if not self._probing and (self._open_until is not None or self._failures < self.threshold):
+                return False
+            opened = self._open_until is None
+            self._open_until = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+            self._probing = False
+            return opened
+
+
+class PlayerBackend:
+    """Base class for player backends."""
+
+    name = None
+
+    def run(self, *args):
+        """Run one audtool command and return its output, or None on failure.
+
+        Raises PlayerUnavailable if the player could not be reached.
+        """
+        raise NotImplementedError
+
+    def run_batch(self, commands):
+        """Run several commands that each print one line; return their outputs in order."""
+        return [self.run(*command) for command in commands]
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+class SubprocessBackend(PlayerBackend):
+    """Runs the audtool binary for every command."""
+
+    name = 'subprocess'
+
+    # Commands chained into one audtool invocation by run_batch
+    BATCH_SIZE = 500
+
+    # audtool's complaints when it cannot talk to Audacious at all, as opposed
+    # to a command failing (e.g. a playlist position out of range)
+    UNREACHABLE = re.compile(r'd-bus|not running|connect', re.IGNORECASE)
+
+    def __init__(self, command='audtool', timeout=None):
+        self.command = command
+        self.timeout = timeout
+
+    def _execute(self, args):
+        cmd = [self.command] + [str(arg) for arg in args]
+        metrics.player_processes.inc(command=args[0] if args else '')
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise PlayerUnavailable(f"audtool {args[0] if args else ''} timed out after {self.timeout}s")
+        except OSError as e:
+            raise PlayerUnavailable(f"Could not run {self.command}: {e}")
+
+        if result.returncode != 0 and self.UNREACHABLE.search(result.stderr or ''):
+            raise PlayerUnavailable(result.stderr.strip())
+        return result
+
+    def run(self, *args):
+        result = self._execute(args)
+
+        if result.returncode != 0:
+            if result.stderr:
+                current_app.logger.error(f"Error in audtool: stderr: {result.stderr}")
+            return None
+
+        return result.stdout.strip()
+
+    def run_batch(self, commands):
+        """Chain up to BATCH_SIZE commands into each audtool invocation.
+
+        audtool runs every command given on its command line in turn, so a
+        batch costs one process instead of one per command.
+        """
+        results = []
+        for i in range(0, len(commands), self.BATCH_SIZE):
+            chunk = commands[i:i + self.BATCH_SIZE]
+            result = self._execute([arg for command in chunk for arg in command])
+
+            lines = result.stdout.splitlines()
+            if result.returncode == 0 and len(lines) == len(chunk):
+                results.extend(line.strip() for line in lines)
+            else:
+                # audtool stops at the first failing command; redo them one by one
+                results.extend(self.run(*command) for command in chunk)
+        return results
+
+
+class FakeBackend(PlayerBackend):
+    """Talks to an in-process FakeAudacious instead of a real player."""
+
+    name = 'fake'
+
+    def __init__(self, player=None):
+        self.player = player or FakeAudacious()
+
+    def run(self, *args):
+        returncode, output = self.player.execute(*[str(arg) for arg in args])
+        return output if returncode == 0 else None
+
+
+class DBusBackend(PlayerBackend):
+    """Keeps one D-Bus connection to Audacious and maps audtool commands onto it."""
+
+    name = 'dbus'
+    BUS_NAME = 'org.atheme.audacious'
+    OBJECT_PATH = '/org/atheme/audacious'
+
+    def __init__(self, fallback=None, timeout=None):
+        if dbus is None:
+            raise BackendUnavailable('dbus-python is not installed')
+
+        self.fallback = fallback
+        # dbus-python's own default is 25 seconds
+        self.timeout = timeout if timeout is not None else -1
+        self._lock = threading.Lock()
+        self._player = None
+        try:
+            self._connect()
+        except BackendUnavailable:
+            # Audacious may simply not be running yet; connect on first use
+            pass
+
+        self.commands = {
+            'current-song': self._current_song,
+            'current-song-filename': lambda: str(self._call('SongFilename', self._position())),
+            'current-song-length': lambda: format_time(self._call('SongLength', self._position())),
+            'current-song-length-seconds': lambda: str(int(self._call('SongLength', self._position()))),
+            'current-song-length-frames': lambda: str(int(self._call('SongFrames', self._position()))),
+            'current-song-output-length': lambda: format_time(int(self._call('Time')) // 1000),
+            'current-song-output-length-seconds': lambda: str(int(self._call('Time')) // 1000),
+            'current-song-output-length-frames': lambda: str(int(self._call('Time'))),
+            'current-song-bitrate': lambda: str(int(self._call('Info')[0])),
+            'current-song-bitrate-kbps': lambda: str(int(self._call('Info')[0]) // 1000),
+            'current-song-tuple-data': self._current_tuple_data,
+            'playback-play': lambda: self._action('Play'),
+            'playback-pause': lambda: self._action('Pause'),
+            'playback-playpause': lambda: self._action('PlayPause'),
+            'playback-stop': lambda: self._action('Stop'),
+            'playback-playing': lambda: '' if self._call('Playing') else None,
+            'playback-paused': lambda: '' if self._call('Paused') else None,
+            'playback-stopped': lambda: None if self._call('Playing') else '',
+            'playback-status': lambda: str(self._call('Status')),
+            'playback-seek': lambda secs: self._action('Seek', dbus.UInt32(int(float(secs) * 1000))),
+            'playback-seek-relative': self._seek_relative,
+            'playlist-advance': lambda: self._action('Advance'),
+            'playlist-reverse': lambda: self._action('Reverse'),
+            'playlist-addurl': lambda url: self._action('AddUrl', url),
+            'playlist-insurl': lambda url, pos: self._action('PlaylistInsUrlString', url, int(pos) - 1),
+            'playlist-delete': lambda pos: self._action('Delete', dbus.UInt32(int(pos) - 1)),
+            'playlist-length': lambda: str(int(self._call('Length'))),
+            'playlist-song': lambda pos: str(self._call('SongTitle', dbus.UInt32(int(pos) - 1))),
+            'playlist-song-filename': lambda pos: str(self._call('SongFilename', dbus.UInt32(int(pos) - 1))),
+            'playlist-song-length': lambda pos: format_time(self._call('SongLength', dbus.UInt32(int(pos) - 1))),
+            'playlist-song-length-seconds': lambda pos: str(int(self._call('SongLength', dbus.UInt32(int(pos) - 1)))),
+            'playlist-song-length-frames': lambda pos: str(int(self._call('SongFrames', dbus.UInt32(int(pos) - 1)))),
+            'playlist-position': lambda: str(self._position() + 1),
+            'playlist-jump': lambda pos: self._action('Jump', dbus.UInt32(int(pos) - 1)),
+            'playlist-clear': lambda: self._action('Clear'),
+            'playlist-repeat-status': lambda: self._on_off('Repeat'),
+            'playlist-repeat-toggle': lambda: self._action('ToggleRepeat'),
+            'playlist-shuffle-status': lambda: self._on_off('Shuffle'),
+            'playlist-shuffle-toggle': lambda: self._action('ToggleShuffle'),
+            'playlist-stop-after-status': lambda: self._on_off('StopAfter'),
+            'playlist-stop-after-toggle': lambda: self._action('ToggleStopAfter'),
+            'playlist-auto-advance-status': lambda: self._on_off('AutoAdvance'),
+            'playlist-auto-advance-toggle': lambda: self._action('ToggleAutoAdvance'),
+            'number-of-playlists': lambda: str(int(self._call('NumberOfPlaylists'))),
+            'current-playlist': lambda: str(int(self._call('GetActivePlaylist')) + 1),
+            'set-current-playlist': lambda number: self._action('SetActivePlaylist', int(number) - 1),
+            'current-playlist-name': lambda: str(self._call('GetActivePlaylistName')),
+            'set-current-playlist-name': lambda name: self._action('SetActivePlaylistName', name),
+            'new-playlist': lambda: self._action('NewPlaylist'),
+            'delete-current-playlist': lambda: self._action('DeleteActivePlaylist'),
+            'get-volume': lambda: str(max(int(v) for v in self._call('Volume'))),
+            'set-volume': lambda volume: self._action('SetVolume', int(volume), int(volume)),
+            'version': lambda: f"Audacious {self._call('Version')}",
+        }
+
+    def _connect(self):
+        try:
+            bus = dbus.SessionBus()
+            obj = bus.get_object(self.BUS_NAME, self.OBJECT_PATH)
+            self._player = dbus.Interface(obj, self.BUS_NAME)
+        except dbus.DBusException as e:
+            self._player = None
+            raise BackendUnavailable(f"Could not connect to Audacious over D-Bus: {e}")
+
+    def _call(self, method, *args):
+        return getattr(self._player, method)(*args, timeout=self.timeout)
+
+    def _action(self, method, *args):
+        self._call(method, *args)
+        return ''
+
+    def _position(self):
+        return int(self._call('Position'))
+
+    def _on_off(self, method):
+        return 'on' if self._call(method) else 'off'
+
+    def _current_song(self):
+        title = self._call('SongTitle', dbus.UInt32(self._position()))
+        return str(title) if title else 'No song playing.'
+
+    def _current_tuple_data(self, field):
+        value = self._call('SongTuple', dbus.UInt32(self._position()), field)
+        return str(value)
+
+    def _seek_relative(self, offset):
+        target = max(0, int(self._call('Time')) + int(float(offset) * 1000))
+        return self._action('Seek', dbus.UInt32(target))
+
+    def run(self, *args):
+        handler = self.commands.get(args[0]) if args else None
+        if handler is None:
+            if self.fallback is not None:
+                return self.fallback.run(*args)
+            return None
+
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._player is None:
+                        self._connect()
+                    return handler(*args[1:])
+                except (BackendUnavailable, dbus.DBusException) as e:
+                    # Audacious may have been restarted; reconnect once before giving up
+                    self._player = None
+                    if attempt:
+                        raise PlayerUnavailable(f"{args[0]} over D-Bus: {e}")
+                except (TypeError, ValueError) as e:
+                    current_app.logger.error(f"Invalid arguments for {args[0]}: {e}")
+                    return None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_call_slots = None
+
+# Shared by every backend: trips when the player stops answering
+breaker = CircuitBreaker()
+
+
+def create_backend(name, audtool_command='audtool', timeout=None):
+    """Create a backend by name ('auto', 'dbus', 'subprocess' or 'fake')."""
+    if name == 'fake':
+        return FakeBackend()
+    if name == 'subprocess':
+        return SubprocessBackend(audtool_command, timeout)
+    if name in ('dbus', 'auto'):
+        try:
+            return DBusBackend(fallback=SubprocessBackend(audtool_command, timeout), timeout=timeout)
+        except BackendUnavailable as e:
+            # Only raised when dbus-python itself is missing
+            if name == 'dbus':
+                raise
+            current_app.logger.info(f"D-Bus player backend unavailable ({e}), using audtool subprocesses")
+            return SubprocessBackend(audtool_command, timeout)
+    raise ValueError(f"Unknown player backend: {name}")
+
+
+def _configure(config):
+    """Size the call slots and the breaker from the app config."""
+    global _call_slots
+    _call_slots = threading.BoundedSemaphore(config.get('PLAYER_MAX_CONCURRENT_CALLS', 4))
+    breaker.configure(
+        config.get('PLAYER_BREAKER_THRESHOLD', 3),
+        config.get('PLAYER_BREAKER_BACKOFF', 1.0),
+        config.get('PLAYER_BREAKER_MAX_BACKOFF', 30.0)
+    )
+
+
+def get_backend():
+    """Return the process-wide backend, creating it from the app config on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _configure(current_app.config)
+                _backend = create_backend(
+                    current_app.config.get('PLAYER_BACKEND', 'auto'),
+                    current_app.config['AUDTOOL_COMMAND'],
+                    current_app.config.get('AUDTOOL_TIMEOUT', 2.0)
+                )
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (used by benchmarks and tooling)."""
+    global _backend
+    with _backend_lock:
+        if _backend is not None and _backend is not backend:
+            _backend.close()
+        _configure(current_app.config)
+        _backend = backend
+
+
+@contextlib.contextmanager
+def call_slot(timeout):
+    """Hold one of the PLAYER_MAX_CONCURRENT_CALLS slots for a player call.
+
+    Yields False instead if no slot freed up within timeout seconds.
+    """
+    slots = _call_slots
+    if slots is None:
+        yield True
+        return
+    if not slots.acquire(timeout=timeout):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        slots.release()
@@ -0,0 +1,296 @@
+import threading
+from bisect import bisect_left
+
+from app.utils import audtool
+
+# Extra edits we accept to keep the playing song in place rather than moving it
+SYNC_KEEP_BUDGET = 64
+
+
+def _unique_keys(values):
+    """Pair every value with its occurrence count so repeated entries stay distinct."""
+    seen = {}
+    keys = []
+    for value in values:
+        count = seen.get(value, 0)
+        seen[value] = count + 1
+        keys.append((value, count))
+    return keys
+
+
+def _longest_increasing(pairs):
+    """Longest run of (new_index, old_index) pairs whose old indexes increase."""
+    tails = []
+    tail_ids = []
+    previous = [None] * len(pairs)
+    for i, (_, old_index) in enumerate(pairs):
+        k = bisect_left(tails, old_index)
+        if k == len(tails):
+            tails.append(old_index)
+            tail_ids.append(i)
+        else:
+            tails[k] = old_index
+            tail_ids[k] = i
+        previous[i] = tail_ids[k - 1] if k else None
+
+    result = []
+    i = tail_ids[-1] if tail_ids else None
+    while i is not None:
+        result.append(pairs[i])
+        i = previous[i]
+    result.reverse()
+    return result
+
+
+def edit_script(old, new, keep=None):
+    """Compute the fewest deletes and inserts that turn list old into list new.
+
+    The entries left in place are a longest common subsequence of both lists,
+    found as a longest increasing subsequence of their old positions. If keep
+    is an index into old whose entry is still in new, that entry is never
+    deleted (used for the song that is playing, so moving it doesn't stop it).
+
+    Returns operations to apply in order: ``('delete', index)`` from the
+    bottom up, then ``('insert', index, values)`` from the top down, with
+    0-based indexes into the list as it is at that point.
+    """
+    old_keys = _unique_keys(old)
+    new_keys = _unique_keys(new)
+
+    # Common head and tail are left alone, so small edits only diff the middle
+    start = 0
+    while start < len(old_keys) and start < len(new_keys) and old_keys[start] == new_keys[start]:
+        start += 1
+    old_end, new_end = len(old_keys), len(new_keys)
+    while old_end > start and new_end > start and old_keys[old_end - 1] == new_keys[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+
+    old_positions = {key: i for i, key in enumerate(old_keys[start:old_end], start)}
+    pairs = [(j, old_positions[key]) for j, key in enumerate(new_keys[start:new_end], start)
+             if key in old_positions]
+
+    pivot = None
+    if keep is not None and start <= keep < old_end:
+        pivot = next((pair for pair in pairs if pair[1] == keep), None)
+    if pivot:
+        kept = (_longest_increasing([p for p in pairs if p[0] < pivot[0] and p[1] < keep])
+                + [pivot]
+                + _longest_increasing([p for p in pairs if p[0] > pivot[0] and p[1] > keep]))
+    else:
+        kept = _longest_increasing(pairs)
+
+    kept_old = {old_index for _, old_index in kept}
+    kept_new = {new_index for new_index, _ in kept}
+
+    ops = [('delete', i) for i in range(old_end - 1, start - 1, -1) if i not in kept_old]
+
+    j = start
+    while j < new_end:
+        if j in kept_new:
+            j += 1
+            continue
+        run_start = j
+        while j < new_end and j not in kept_new:
+            j += 1
+        ops.append(('insert', run_start, list(new[run_start:j])))
+
+    return ops
+
+
+class PlayerQueue:
+    """Keeps Audacious' playlist in step with the playlist we loaded into it.
+
+    Loading: the selected start track is added and played straight away; the
+    rest of the playlist is added by a background worker in chunks of
+    PLAYLIST_LOAD_CHUNK tracks: first the tracks after the start track, then
+    the ones before it are inserted above. Time to first audio therefore does
+    not depend on the playlist length. Starting another load, or clearing the
+    player, cancels a load that is still running.
+
+    Syncing: we remember which files the player holds, so when the loaded
+    playlist is edited only the difference is sent to Audacious with
+    playlist-delete/playlist-insurl, leaving the current song playing. Edits
+    made while a load is still running are applied once it finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._generation = 0
+        self._progress = None
+        self.playlist_id = None
+        self._entries = []
+        self._loading = False
+        self._pending = None
+
+    def start(self, app, playlist_id, filenames, start_index=0):
+        """Play filenames[start_index] now and queue the rest in the background."""
+        filenames = list(filenames)
+
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self.playlist_id = playlist_id
+            self._entries = filenames
+            self._pending = None
+            self._loading = len(filenames) > 1
+            self._progress = {
+                'playlist_id': playlist_id,
+                'loaded': min(1, len(filenames)),
+                'total': len(filenames),
+                'done': not self._loading
+            }
+
+        if not filenames:
+            return False
+
+        start_index = max(0, min(int(start_index or 0), len(filenames) - 1))
+
+        audtool.add_song(filenames[start_index])
+        audtool.jump_to_song(1)
+        audtool.play()
+
+        if self._loading:
+            worker = threading.Thread(
+                target=self._load_rest,
+                args=(app, generation, filenames, start_index),
+                name='playlist-loader',
+                daemon=True
+            )
+            worker.start()
+
+        return True
+
+    def loaded(self, playlist_id, filenames):
+        """Record that a playlist was loaded into the player in full."""
+        with self._lock:
+            self._generation += 1
+            self.playlist_id = playlist_id
+            self._entries = list(filenames)
+            self._pending = None
+            self._loading = False
+            self._progress = None
+
+    def cancel(self):
+        """Stop a background load that is still running and forget what was loaded."""
+        with self._lock:
+            self._generation += 1
+            self.playlist_id = None
+            self._entries = []
+            self._pending = None
+            self._loading = False
+            self._progress = None
+
+    def progress(self):
+        """Return the progress of the current load, or None if nothing was loaded."""
+        with self._lock:
+            return dict(self._progress) if self._progress else None
+
+    def sync(self, playlist_id, filenames):
+        """Apply the edits that turn the player's playlist into filenames.
+
+        Does nothing unless playlist_id is the playlist loaded in the player.
+        Returns the number of edit operations sent to the player.
+        """
+        filenames = list(filenames)
+        with self._sync_lock:
+            with self._lock:
+                if playlist_id is None or playlist_id != self.playlist_id:
+                    return 0
+                if self._loading:
+                    self._pending = filenames
+                    return 0
+                generation = self._generation
+                old = self._entries
+
+            ops = edit_script(old, filenames)
+            resume = None
+            if any(op[0] == 'delete' for op in ops):
+                # Don't delete and re-add the song that is playing if it can stay put
+                current = audtool.get_playlist_position()
+                keep_ops = edit_script(old, filenames, keep=current)
+                if len(keep_ops) <= len(ops) + SYNC_KEEP_BUDGET:
+                    ops = keep_ops
+                elif 0 <= current < len(old) and ('delete', current) in ops and old[current] in filenames:
+                    # Keeping it in place would shift too many neighbours; move
+                    # it instead and pick playback up where it was afterwards
+                    snapshot = audtool.get_player_snapshot()
+                    resume = (filenames.index(old[current]), snapshot['current_song']['position_seconds'],
+                              snapshot['status'])
+
+            for op in ops:
+                with self._lock:
+                    if generation != self._generation:
+                        return 0
+                if op[0] == 'delete':
+                    audtool.delete_song(op[1] + 1)  # audtool uses 1-indexed positions
+                else:
+                    audtool.add_songs(op[2], position=op[1] + 1)
+
+            if resume:
+                index, seconds, status = resume
+                audtool.jump_to_song(index + 1)
+                if status != 'stopped':
+                    audtool.play()
+                    audtool.seek(seconds)
+                if status == 'paused':
+                    audtool.pause()
+
+            with self._lock:
+                if generation == self._generation:
+                    self._entries = filenames
+            return len(ops)
+
+    def _advance(self, generation, count):
+        """Record count more loaded tracks; False if the load was cancelled."""
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._progress['loaded'] += count
+            self._progress['done'] = self._progress['loaded'] >= self._progress['total']
+        return True
+
+    def _finish_load(self, generation):
+        """Mark the load as finished and apply any edits made in the meantime."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._loading = False
+            pending, self._pending = self._pending, None
+            playlist_id = self.playlist_id
+        if pending is not None:
+            self.sync(playlist_id, pending)
+
+    def _load_rest(self, app, generation, filenames, start_index):
+        with app.app_context():
+            chunk = app.config.get('PLAYLIST_LOAD_CHUNK', 500)
+            try:
+                after = filenames[start_index + 1:]
+                for i in range(0, len(after), chunk):
+                    if generation != self._generation:
+                        return
+                    batch = after[i:i + chunk]
+                    audtool.add_songs(batch)
+                    if not self._advance(generation, len(batch)):
+                        return
+
+                # Tracks before the start track go above it, in order
+                before = filenames[:start_index]
+                for i in range(0, len(before), chunk):
+                    if generation != self._generation:
+                        return
+                    batch = before[i:i + chunk]
+                    audtool.add_songs(batch, position=i + 1)
+                    if not self._advance(generation, len(batch)):
+                        return
+
+                app.logger.info(f"Finished loading {len(filenames)} tracks into Audacious")
+            except Exception as e:
+                app.logger.error(f"Error loading playlist into Audacious: {e}")
+            finally:
+                self._finish_load(generation)
+
+
+# Global instance
+player_queue = PlayerQueue()
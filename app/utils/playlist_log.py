@@ -0,0 +1,125 @@
+"""Append-only log of playlist edits.
+
+Editing a playlist (adding, removing or moving a track, changing a setting)
+would otherwise rewrite the whole playlist, track ids and all, at the next
+flush. Instead DataService appends each edit to ``playlists.log`` in the data
+directory as one JSON line, so the cost on disk is proportional to the edit::
+
+    {"seq": 41, "playlist": "<id>", "edit": ["move", "<track id>", 12]}
+
+Sequence numbers increase across all playlists, and every playlist stores the
+``oplog_seq`` of the last edit it includes. On load the log is replayed onto
+the stored playlists, skipping the edits they already include. Compaction
+writes the edited playlists out in full and then empties the log, which
+bounds both its size and the replay time; the emptied log keeps a single
+``{"seq": N}`` line so numbering carries on from there.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+# Playlist fields logged as ISO timestamps
+DATETIME_FIELDS = ('updated_at',)
+
+
+def _encode(edit):
+    if edit[0] == 'set' and isinstance(edit[2], datetime):
+        return [edit[0], edit[1], edit[2].isoformat()]
+    return list(edit)
+
+
+def _decode(edit):
+    if edit[0] == 'set' and edit[1] in DATETIME_FIELDS:
+        return (edit[0], edit[1], datetime.fromisoformat(edit[2]))
+    return tuple(edit)
+
+
+class PlaylistLog:
+    """The log file, with the entries appended since the last write."""
+
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        # Entries on disk, and entries waiting for the next write
+        self.written = 0
+        self._pending = []
+        self._torn = False
+        self._lock = threading.Lock()
+
+    def read(self):
+        """Return the entries on disk as (seq, playlist id, edit), oldest first.
+
+        A last line cut short by a crash is ignored. Also moves ``seq`` past
+        the highest sequence number found.
+        """
+        entries = []
+        seq = 0
+        line = ''
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        seq = max(seq, entry['seq'])
+                        if 'playlist' in entry:
+                            entries.append((entry['seq'], entry['playlist'], _decode(entry['edit'])))
+                    except (ValueError, KeyError, IndexError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            self.written = len(entries)
+            # Start the next write on a fresh line
+            self._torn = bool(line) and not line.endswith('\n')
+            self.seq = max(self.seq, seq)
+        return entries
+
+    def append(self, playlist_id, edit):
+        """Queue an edit for the next write and return its sequence number."""
+        with self._lock:
+            self.seq += 1
+            self._pending.append({'seq': self.seq, 'playlist': playlist_id, 'edit': _encode(edit)})
+            return self.seq
+
+    def pending(self):
+        """Number of entries not written yet."""
+        return len(self._pending)
+
+    def write(self):
+        """Append the queued entries to the file and return how many there were."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if self._torn:
+                    f.write('\n')
+                    self._torn = False
+                f.write(''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in pending))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            # Keep them for the next attempt, ahead of any newer ones
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+
+        with self._lock:
+            self.written += len(pending)
+        return len(pending)
+
+    def truncate(self):
+        """Drop the entries on disk, once the playlists they edit have been written in full."""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'seq': self.seq}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.written = 0
+            self._torn = False
@@ -1,19 +1,24 @@
 from app.utils.models import Playlist, Track, WatchPath
 from app.utils.data_service import data_service
-from app.utils import audtool
+from app.utils.enrichment import enricher
+from app.utils import audtool, filesystem, metadata
+from app.utils.player_queue import player_queue
+from app.utils.tag_cache import tag_cache
 import os
 from flask import current_app
-import glob
+from collections import deque
 from pathlib import Path
 import subprocess
 import json
-from mutagen import File as MutagenFile
 from datetime import timedelta
 
 # Store the current playlist ID in memory
 # This is a simple solution since we can't modify the database schema
 _current_playlist_id = None
 
+# New tracks stored per database write during a scan
+SCAN_COMMIT_BATCH = 500
+
 class PlaylistService:
     @staticmethod
     def get_all_playlists():
@@ -56,14 +61,8 @@ class PlaylistService:
         playlists_db = data_service.get_playlists_db()
         if playlist_id in playlists_db.data:
             # Also remove associated watch paths
-            watch_paths_db = data_service.get_watch_paths_db()
-            watch_paths_to_remove = []
-            for wp_id, wp in watch_paths_db.data.items():
-                if isinstance(wp, WatchPath) and wp.playlist_id == playlist_id:
-                    watch_paths_to_remove.append(wp_id)
-            
-            for wp_id in watch_paths_to_remove:
-                del watch_paths_db[wp_id]
+            for wp in data_service.get_watch_paths_for_playlist(playlist_id):
+                data_service.remove_watch_path(wp.id)
             
             del playlists_db[playlist_id]
             return True
@@ -110,79 +109,34 @@ class PlaylistService:
         return None
     
     @staticmethod
-    def add_track_to_playlist(playlist_id, track_path):
-        """Add a track to a playlist."""
+    def add_track_to_playlist(playlist_id, track_path, sync_player=True):
+        """Add a track to a playlist.
+        
+        Pass sync_player=False when adding many tracks in a row and call
+        sync_player() once afterwards.
+        """
         playlist = PlaylistService.get_playlist(playlist_id)
         if not playlist:
             return None
         
-        tracks_db = data_service.get_tracks_db()
-        
         # Check if track already exists in the database
-        track = None
-        for existing_track in tracks_db.data.values():
-            if isinstance(existing_track, Track) and existing_track.filename == track_path:
-                track = existing_track
-                break
-        
-        if not track:
-            # Get track metadata using mutagen
+        track = data_service.find_track_by_filename(track_path)
+        
+        if not track and current_app.config.get('LAZY_METADATA', False):
+            # Store it under its file name now; the tags are read in the background
+            track = PlaylistService._new_track(track_path, None, pending=True)
+            data_service.add_track(track)
+            enricher.enqueue([track.id])
+        elif not track:
+            # Get track metadata using mutagen, unless the file was read before
             try:
-                # Default values
-                title = os.path.basename(track_path)
-                artist = None
-                album = None
-                length = "0:00"
-                length_seconds = 0
-                
-                # Extract metadata using mutagen
-                audio = MutagenFile(track_path)
-                if audio:
-                    # Try to get title - different files have different tag formats
-                    if hasattr(audio, 'tags') and audio.tags:
-                        if 'title' in audio:
-                            title = audio['title'][0]
-                        elif 'TIT2' in audio:
-                            title = audio['TIT2'].text[0]
-                        
-                        # Try to get artist
-                        if 'artist' in audio:
-                            artist = audio['artist'][0]
-                        elif 'TPE1' in audio:
-                            artist = audio['TPE1'].text[0]
-                        
-                        # Try to get album
-                        if 'album' in audio:
-                            album = audio['album'][0]
-                        elif 'TALB' in audio:
-                            album = audio['TALB'].text[0]
-                    
-                    # Get length
-                    if hasattr(audio, 'info') and hasattr(audio.info, 'length'):
-                        length_seconds = int(audio.info.length)
-                        minutes, seconds = divmod(length_seconds, 60)
-                        length = f"{int(minutes)}:{int(seconds):02d}"
-                
-                # Create the track in our database
-                track = Track(
-                    title=title,
-                    artist=artist,
-                    album=album,
-                    length=length,
-                    length_seconds=length_seconds,
-                    filename=track_path
-                )
-                tracks_db[track.id] = track
-                
+                fields = metadata.read_cached(track_path, tag_cache)
             except Exception as e:
+                fields = None
                 current_app.logger.error(f"Error getting metadata for {track_path}: {e}")
-                # Create track with minimal info if metadata extraction fails
-                filename = os.path.basename(track_path)
-                track = Track(
-                    title=filename,
-                    filename=track_path
-                )
-                tracks_db[track.id] = track
+            
+            track = PlaylistService._new_track(track_path, fields)
+            data_service.add_track(track)
         
         # Check if track is already in the playlist
         if track.id in playlist.track_ids:
@@ -192,8 +146,100 @@ class PlaylistService:
         playlist.track_ids.append(track.id)
         playlist.update_timestamp()
         
+        if sync_player:
+            PlaylistService.sync_player(playlist_id)
+        
         return track
     
+    @staticmethod
+    def _new_track(track_path, fields, pending=False):
+        """Build a track from read_tags() fields, or with minimal info if they couldn't be (or aren't yet) read."""
+        if fields is None:
+            return Track(title=os.path.basename(track_path), filename=track_path, pending=pending)
+        return Track(filename=track_path, **fields)
+    
+    @staticmethod
+    def add_tracks_to_playlist(playlist_id, track_paths, sync_player=True):
+        """Add many files to a playlist, reading the new ones' metadata in parallel.
+        
+        Files not in the library yet have their tags read by a pool of
+        METADATA_WORKERS threads (or processes, with METADATA_EXECUTOR), or
+        taken from the tag cache if unchanged since they were last read, and
+        are stored SCAN_COMMIT_BATCH at a time. With LAZY_METADATA they are
+        stored right away under their file names instead, and the enrichment
+        worker reads their tags afterwards.
+        
+        track_paths may be a generator: it is consumed as the files are
+        read, and each batch joins the playlist as soon as it is stored, so
+        a long scan shows its first tracks early and never holds the whole
+        list. The playlist gets the files in the order given. Returns the
+        number of tracks added to the playlist.
+        """
+        playlist = PlaylistService.get_playlist(playlist_id)
+        if not playlist:
+            return 0
+        
+        lazy = current_app.config.get('LAZY_METADATA', False)
+        # Paths given but not yet in the playlist, in order, and the new ones among them not stored yet
+        waiting = deque()
+        unstored = set()
+        added = 0
+        
+        def place():
+            """Add every waiting file up to the first one still being read."""
+            nonlocal added
+            track_ids = {}
+            while waiting and waiting[0] not in unstored:
+                track_id = data_service.get_track_id(waiting.popleft())
+                if track_id is not None and track_id not in playlist.track_ids:
+                    track_ids[track_id] = None
+            # One edit (and one playlist log entry) for the lot
+            playlist.track_ids.extend(track_ids)
+            added += len(track_ids)
+        
+        def paths_to_read():
+            for track_path in track_paths:
+                waiting.append(track_path)
+                if track_path not in unstored and data_service.get_track_id(track_path) is None:
+                    unstored.add(track_path)
+                    yield track_path
+                elif not unstored and len(waiting) >= SCAN_COMMIT_BATCH:
+                    # Files already in the library join a batch at a time too
+                    place()
+        
+        if lazy:
+            results = ((track_path, None, None) for track_path in paths_to_read())
+        else:
+            results = metadata.read_all(
+                paths_to_read(),
+                workers=current_app.config.get('METADATA_WORKERS', 8),
+                executor=current_app.config.get('METADATA_EXECUTOR', 'thread'),
+                cache=tag_cache
+            )
+        
+        def store(batch):
+            data_service.add_tracks(batch)
+            unstored.difference_update(track.filename for track in batch)
+            if lazy:
+                enricher.enqueue([track.id for track in batch])
+            place()
+        
+        batch = []
+        for track_path, fields, error in results:
+            if error is not None:
+                current_app.logger.error(f"Error getting metadata for {track_path}: {error}")
+            batch.append(PlaylistService._new_track(track_path, fields, pending=lazy))
+            if len(batch) >= SCAN_COMMIT_BATCH:
+                store(batch)
+                batch = []
+        store(batch)
+        
+        if added:
+            playlist.update_timestamp()
+            if sync_player:
+                PlaylistService.sync_player(playlist_id)
+        return added
+    
     @staticmethod
     def remove_track_from_playlist(playlist_id, track_id):
         """Remove a track from a playlist."""
@@ -201,6 +247,7 @@ class PlaylistService:
         if playlist and track_id in playlist.track_ids:
             playlist.track_ids.remove(track_id)
             playlist.update_timestamp()
+            PlaylistService.sync_player(playlist_id)
             return True
         return False
     
@@ -211,14 +258,11 @@ class PlaylistService:
         if not playlist or track_id not in playlist.track_ids:
             return False
         
-        # Remove track from current position
-        current_position = playlist.track_ids.index(track_id)
-        playlist.track_ids.pop(current_position)
-        
-        # Insert at new position
-        playlist.track_ids.insert(new_position, track_id)
+        playlist.track_ids.move(track_id, new_position)
         playlist.update_timestamp()
         
+        PlaylistService.sync_player(playlist_id)
+        
         return True
     
     @staticmethod
@@ -248,14 +292,8 @@ class PlaylistService:
         
         path = os.path.abspath(os.path.expanduser(path))
         
-        watch_paths_db = data_service.get_watch_paths_db()
-        
         # Check if path already exists for the playlist
-        existing = None
-        for wp in watch_paths_db.data.values():
-            if isinstance(wp, WatchPath) and wp.playlist_id == playlist_id and wp.path == path:
-                existing = wp
-                break
+        existing = data_service.find_watch_path(playlist_id, path)
         
         if existing:
             existing.recursive = recursive
@@ -269,7 +307,7 @@ class PlaylistService:
             auto_add=auto_add,
             playlist_id=playlist_id
         )
-        watch_paths_db[watch_path.id] = watch_path
+        data_service.add_watch_path(watch_path)
         
         # If auto_add is True, scan the directory and add files
         if auto_add:
@@ -280,11 +318,7 @@ class PlaylistService:
     @staticmethod
     def remove_watch_path(watch_path_id):
         """Remove a watch path."""
-        watch_paths_db = data_service.get_watch_paths_db()
-        if watch_path_id in watch_paths_db.data:
-            del watch_paths_db[watch_path_id]
-            return True
-        return False
+        return data_service.remove_watch_path(watch_path_id)
     
     @staticmethod
     def scan_watch_path(watch_path_id):
@@ -294,40 +328,77 @@ class PlaylistService:
         if not watch_path or not isinstance(watch_path, WatchPath):
             return False
         
-        # Get all audio files in the path
-        audio_files = []
-        
-        # Get allowed extensions from config
-        allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', [])
-        
-        # Build the pattern for glob
-        if watch_path.recursive:
-            pattern = f"{watch_path.path}/**/*"
-        else:
-            pattern = f"{watch_path.path}/*"
-        
-        # Find all files matching the pattern
-        for file_path in glob.glob(pattern, recursive=watch_path.recursive):
-            if os.path.isfile(file_path):
-                extension = os.path.splitext(file_path)[1][1:].lower()
-                if extension in allowed_extensions:
-                    audio_files.append(file_path)
+        # Stream the audio files in the path straight into the playlist
+        audio_files = filesystem.iter_audio_files(
+            watch_path.path,
+            current_app.config.get('ALLOWED_EXTENSIONS', []),
+            recursive=watch_path.recursive
+        )
         
         # Add files to playlist
-        for file_path in audio_files:
-            PlaylistService.add_track_to_playlist(watch_path.playlist_id, file_path)
+        PlaylistService.add_tracks_to_playlist(watch_path.playlist_id, audio_files, sync_player=False)
+        
+        PlaylistService.sync_player(watch_path.playlist_id)
         
         return True
     
     @staticmethod
     def get_watch_paths_for_playlist(playlist_id):
         """Get all watch paths for a playlist."""
-        watch_paths_db = data_service.get_watch_paths_db()
-        watch_paths = []
-        for wp in watch_paths_db.data.values():
-            if isinstance(wp, WatchPath) and wp.playlist_id == playlist_id:
-                watch_paths.append(wp)
-        return watch_paths
+        return data_service.get_watch_paths_for_playlist(playlist_id)
+    
+    @staticmethod
+    def apply_playlist_settings(playlist):
+        """Make Audacious' shuffle/repeat/stop-after/auto-advance match a playlist."""
+        audtool.apply_player_settings({
+            'shuffle': playlist.shuffle,
+            'repeat': playlist.repeat,
+            'stop_after': playlist.stop_after_current,
+            'auto_advance': playlist.auto_advance
+        })
+    
+    @staticmethod
+    def play_playlist(playlist_id, start_index=0):
+        """Start playing a playlist without waiting for all of it to be loaded.
+        
+        The track at start_index starts playing right away and the rest of the
+        playlist is added to Audacious in the background.
+        """
+        playlist = PlaylistService.get_playlist(playlist_id)
+        if not playlist:
+            return False
+        
+        # Set as current playlist in our application
+        PlaylistService.set_current_playlist(playlist_id)
+        
+        player_queue.cancel()
+        audtool.clear_playlist()
+        PlaylistService.apply_playlist_settings(playlist)
+        
+        tracks = PlaylistService.get_playlist_tracks(playlist_id)
+        current_app.logger.info(f"Starting playlist {playlist_id} at track {start_index} of {len(tracks)}")
+        
+        player_queue.start(
+            current_app._get_current_object(),
+            playlist_id,
+            [track.filename for track in tracks if track.filename],
+            start_index
+        )
+        
+        return True
+    
+    @staticmethod
+    def sync_player(playlist_id):
+        """Send edits of the playlist loaded in Audacious to the player.
+        
+        Only the difference to what the player holds is applied, so the
+        current song keeps playing.
+        """
+        if player_queue.playlist_id != playlist_id:
+            return 0
+        
+        tracks = PlaylistService.get_playlist_tracks(playlist_id)
+        return player_queue.sync(playlist_id, [track.filename for track in tracks if track.filename])
     
     @staticmethod
     def load_playlist_to_audacious(playlist_id):
@@ -340,44 +411,19 @@ class PlaylistService:
         PlaylistService.set_current_playlist(playlist_id)
         
         # Always clear current Audacious playlist to ensure complete reset
+        player_queue.cancel()
         audtool.clear_playlist()
         
         # Apply playlist settings
-        if playlist.shuffle:
-            if audtool.get_shuffle_status() != "on":
-                audtool.toggle_shuffle()
-        else:
-            if audtool.get_shuffle_status() != "off":
-                audtool.toggle_shuffle()
-                
-        if playlist.repeat:
-            if audtool.get_repeat_status() != "on":
-                audtool.toggle_repeat()
-        else:
-            if audtool.get_repeat_status() != "off":
-                audtool.toggle_repeat()
-                
-        if playlist.stop_after_current:
-            if audtool.get_stop_after_status() != "on":
-                audtool.toggle_stop_after()
-        else:
-            if audtool.get_stop_after_status() != "off":
-                audtool.toggle_stop_after()
-        
-        if playlist.auto_advance:
-            if audtool.get_auto_advance_status() != "on":
-                audtool.toggle_auto_advance()
-        else:
-            if audtool.get_auto_advance_status() != "off":
-                audtool.toggle_auto_advance()
+        PlaylistService.apply_playlist_settings(playlist)
         
-        # Add each track to Audacious
+        # Add all tracks to Audacious in one go
         tracks = PlaylistService.get_playlist_tracks(playlist_id)
         current_app.logger.info(f"Loading {len(tracks)} tracks to Audacious for playlist {playlist_id}")
         
-        for i, track in enumerate(tracks):
-            current_app.logger.info(f"Adding track {i+1}: {track.filename}")
-            audtool.add_song(track.filename)
+        filenames = [track.filename for track in tracks if track.filename]
+        audtool.add_songs(filenames)
+        player_queue.loaded(playlist_id, filenames)
         
         return True
     
@@ -402,18 +448,17 @@ class PlaylistService:
             playlist = PlaylistService.create_playlist(playlist_name)
             
             # Get settings
-            playlist.shuffle = audtool.get_shuffle_status() == "on"
-            playlist.repeat = audtool.get_repeat_status() == "on"
-            playlist.stop_after_current = audtool.get_stop_after_status() == "on"
-            playlist.auto_advance = audtool.get_auto_advance_status() == "on"
+            settings = audtool.get_player_settings()
+            playlist.shuffle = settings['shuffle']
+            playlist.repeat = settings['repeat']
+            playlist.stop_after_current = settings['stop_after']
+            playlist.auto_advance = settings['auto_advance']
             
             # Get all songs
             songs = audtool.get_all_songs()
             
-            # Add songs to playlist
-            for song in songs:
-                # Add track to playlist (this will create the track if it doesn't exist)
-                PlaylistService.add_track_to_playlist(playlist.id, song['filename'])
+            # Add songs to playlist (this will create the tracks that don't exist)
+            PlaylistService.add_tracks_to_playlist(playlist.id, [song['filename'] for song in songs])
             
             imported_playlists.append(playlist)
             
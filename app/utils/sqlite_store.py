@@ -0,0 +1,344 @@
+"""SQLite storage for DataService, an alternative to the Storify files.
+
+Each database (playlists, tracks, ...) is a table of ``key`` and a JSON
+``payload`` column holding the value exactly as Storify would encode it, plus
+indexed copies of the fields the app looks things up by (INDEXED_COLUMNS).
+Nothing is loaded at startup: rows are decoded when they are first read, and
+lookups by filename or playlist run against the indexes. Writes are collected
+per row and committed in one transaction by ``flush()``, so a flush costs the
+rows that changed rather than a rewrite of the whole database. The file is
+opened in WAL mode.
+
+``migrate_from_storify`` copies an existing Storify data directory into a new
+SQLite file; DataService does this once on the first start with
+STORAGE_BACKEND=sqlite. It can also be run by hand::
+
+    python -m app.utils.sqlite_store data/ data/library.sqlite3
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import weakref
+from collections.abc import MutableMapping
+
+from storify.model import Model
+
+# Fields copied into indexed columns, per database
+INDEXED_COLUMNS = {
+    'tracks': ('filename', 'artist', 'album', 'pending'),
+    'watch_paths': ('playlist_id',),
+}
+
+# Databases DataService keeps, in the order they are migrated
+DATABASE_NAMES = ('playlists', 'tracks', 'watch_paths', 'settings')
+
+
+def _field(value, name):
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+class SQLiteStore:
+    """One SQLite file holding every database as a table."""
+
+    def __init__(self, path, models=()):
+        self.path = path
+        self.models = list(models)
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self._databases = {}
+
+    def get_db(self, name):
+        with self.lock:
+            if name not in self._databases:
+                self._databases[name] = SQLiteDatabase(self, name)
+            return self._databases[name]
+
+    def flush(self):
+        for db in list(self._databases.values()):
+            db.flush()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    # Payload encoding, compatible with Storify's model encoding
+    def encode(self, value):
+        if isinstance(value, Model):
+            return {value._keyname(): self.encode(value._to_dict())}
+        if isinstance(value, dict):
+            return {key: self.encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.encode(item) for item in value]
+        return value
+
+    def _decode_object(self, data):
+        if len(data) == 1:
+            for model_class in self.models:
+                if model_class._keyname() in data:
+                    return model_class._from_dict(data[model_class._keyname()])
+        return data
+
+    def dumps(self, value):
+        return json.dumps(self.encode(value), separators=(',', ':'))
+
+    def loads(self, payload):
+        return json.loads(payload, object_hook=self._decode_object)
+
+
+class SQLiteDatabase:
+    """A Storify-like database backed by one table.
+
+    ``data`` is a mapping over the table. Decoded values are kept while
+    something else references them, so a model read twice is the same object,
+    and changes to it are written by the next flush once ``changed()`` has
+    been called for it.
+    """
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+        self.columns = INDEXED_COLUMNS.get(name, ())
+        self.table = f'"{name}"'
+        self._cache = weakref.WeakValueDictionary()
+        # key -> value to write, or None to delete, at the next flush
+        self._pending = {}
+        self.data = _TableMapping(self)
+
+        with store.lock:
+            columns = ''.join(f', "{column}" TEXT' for column in self.columns)
+            store.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY{columns}, payload TEXT NOT NULL)'
+            )
+            # Columns indexed since the table was created start out empty (NULL)
+            existing = {row[1] for row in store.connection.execute(f'PRAGMA table_info({self.table})')}
+            for column in self.columns:
+                if column not in existing:
+                    store.connection.execute(f'ALTER TABLE {self.table} ADD COLUMN "{column}" TEXT')
+            for column in self.columns:
+                store.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{name}_{column}" ON {self.table} ("{column}")'
+                )
+
+    def _decode(self, key, payload):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        value = self.store.loads(payload)
+        try:
+            self._cache[key] = value
+        except TypeError:
+            # Plain values (str, int, dict, ...) can't be weakly referenced
+            pass
+        return value
+
+    def get(self, key, default=None):
+        with self.store.lock:
+            if key in self._pending:
+                value = self._pending[key]
+                return default if value is None else value
+            try:
+                return self._cache[key]
+            except KeyError:
+                pass
+            row = self.store.connection.execute(
+                f'SELECT payload FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            return default if row is None else self._decode(key, row[0])
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self.store.lock:
+            self._pending[key] = value
+            try:
+                self._cache[key] = value
+            except TypeError:
+                pass
+
+    def __delitem__(self, key):
+        with self.store.lock:
+            if key not in self:
+                raise KeyError(key)
+            self._pending[key] = None
+            self._cache.pop(key, None)
+
+    def __contains__(self, key):
+        with self.store.lock:
+            if key in self._pending:
+                return self._pending[key] is not None
+            return self.store.connection.execute(
+                f'SELECT 1 FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone() is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        with self.store.lock:
+            if not self._pending:
+                return self.store.connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        return len(self.keys())
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def items(self):
+        """All (key, value) pairs, in insertion order, decoding rows as needed."""
+        with self.store.lock:
+            pending = dict(self._pending)
+            result = []
+            for key, payload in self.store.connection.execute(f'SELECT key, payload FROM {self.table} ORDER BY rowid'):
+                if key in pending:
+                    value = pending.pop(key)
+                    if value is not None:
+                        result.append((key, value))
+                else:
+                    result.append((key, self._decode(key, payload)))
+            result.extend((key, value) for key, value in pending.items() if value is not None)
+            return result
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def lookup(self, column, value):
+        """Keys of the entries whose indexed column equals value, in insertion order."""
+        with self.store.lock:
+            rows = self.store.connection.execute(
+                f'SELECT key FROM {self.table} WHERE "{column}" = ? ORDER BY rowid', (value,)
+            ).fetchall()
+            keys = [key for (key,) in rows if key not in self._pending]
+            keys.extend(key for key, pending in self._pending.items()
+                        if pending is not None and _field(pending, column) == value)
+            return keys
+
+    def changed(self, value):
+        """Queue a value that was changed in place to be written by the next flush."""
+        key = _field(value, 'id')
+        with self.store.lock:
+            if key is not None and self._cache.get(key) is value:
+                self._pending[key] = value
+
+    def flush(self):
+        """Write the pending changes in one transaction."""
+        with self.store.lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            connection = self.store.connection
+            try:
+                columns = ''.join(f', "{column}"' for column in self.columns)
+                placeholders = ', ?' * len(self.columns)
+                connection.execute('BEGIN')
+                deletes = [(key,) for key, value in pending.items() if value is None]
+                if deletes:
+                    connection.executemany(f'DELETE FROM {self.table} WHERE key = ?', deletes)
+                connection.executemany(
+                    f'INSERT OR REPLACE INTO {self.table} (key{columns}, payload) VALUES (?{placeholders}, ?)',
+                    [(key, *(_field(value, column) for column in self.columns), self.store.dumps(value))
+                     for key, value in pending.items() if value is not None]
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                # Keep the changes for the next attempt, behind any newer ones
+                pending.update(self._pending)
+                self._pending = pending
+                raise
+
+
+class _TableMapping(MutableMapping):
+    """The ``db.data`` view of a SQLiteDatabase."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, key):
+        return self._db[key]
+
+    def __setitem__(self, key, value):
+        self._db[key] = value
+
+    def __delitem__(self, key):
+        del self._db[key]
+
+    def __contains__(self, key):
+        return key in self._db
+
+    def __iter__(self):
+        return iter(self._db)
+
+    def __len__(self):
+        return len(self._db)
+
+    def get(self, key, default=None):
+        return self._db.get(key, default)
+
+    def items(self):
+        return self._db.items()
+
+    def values(self):
+        return self._db.values()
+
+    def keys(self):
+        return self._db.keys()
+
+
+_MISSING = object()
+
+
+def migrate_from_storify(data_dir, path, models=()):
+    """Copy every Storify database in data_dir into a new SQLite file at path.
+
+    Returns the number of entries copied per database.
+    """
+    from storify import Storify
+
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+
+    storify = Storify(root=data_dir, models=list(models))
+    store = SQLiteStore(path, models)
+    counts = {}
+    try:
+        for name in DATABASE_NAMES:
+            if not storify.db_exists(name):
+                continue
+            source = storify.get_db(name)
+            target = store.get_db(name)
+            for key, value in source.data.items():
+                target[key] = value
+            target.flush()
+            counts[name] = len(source.data)
+    except Exception:
+        store.connection.close()
+        os.remove(path)
+        raise
+    store.connection.close()
+    return counts
+
+
+def main(argv=None):
+    from app.utils.models import Playlist, Track, WatchPath
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print('usage: python -m app.utils.sqlite_store DATA_DIR SQLITE_PATH')
+        return 2
+    for name, count in migrate_from_storify(argv[0], argv[1], [Playlist, Track, WatchPath]).items():
+        print(f"{name}: {count} entries")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import json
+import queue
+import threading
+import time
+
+from app.utils import audtool
+from app.utils.command_queue import command_queue
+from app.utils.data_service import data_service
+from app.utils.player_queue import player_queue
+
+
+def build_player_status(snapshot):
+    """Build the status payload sent to clients from a player snapshot.
+
+    ``server_time`` is a monotonic timestamp and ``song.position_ms`` the
+    playback position at that instant, so clients can move the seek bar on
+    their own while ``status`` is 'playing' instead of asking for it.
+
+    A volume or seek still waiting in the command queue is reported in place
+    of the player's value, so sliders don't jump back until it is applied.
+    """
+    song = dict(snapshot['current_song'])
+    server_time = time.monotonic()
+    seek = command_queue.pending('seek')
+    if seek is not None:
+        audtool.set_song_position(song, seek * 1000)
+    elif snapshot['status'] == 'playing':
+        audtool.set_song_position(song, song['position_ms'] + (server_time - snapshot['sampled_at']) * 1000)
+    volume = command_queue.pending('volume')
+
+    # Find the track in our database by filename (none yet while the library loads)
+    track_id = data_service.get_track_id(song['filename'], wait=False) if song.get('filename') else None
+
+    return {
+        'status': snapshot['status'],
+        'player_available': snapshot['player_available'],
+        'server_time': server_time,
+        'position_sync': snapshot['position_sync'],
+        'song': song,
+        'track_id': track_id,
+        'volume': snapshot['volume'] if volume is None else volume,
+        'position': snapshot['position'],
+        'playlist_length': snapshot['playlist_length'],
+        'load_progress': player_queue.progress(),
+        'settings': dict(snapshot['settings'])
+    }
+
+
+def _change_key(status):
+    """The parts of a status payload whose change is worth pushing to clients."""
+    song = status['song']
+    return (
+        status['status'],
+        status['player_available'],
+        status['position_sync'],
+        song['filename'], song['title'], song['artist'], song['album'], song['length_seconds'],
+        status['position'], status['playlist_length'],
+        status['volume'],
+        tuple(sorted((status['load_progress'] or {}).items())),
+        tuple(sorted(status['settings'].items()))
+    )
+
+
+def format_sse(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StatusPoller:
+    """One background thread that watches the player and fans changes out to subscribers.
+
+    However many clients are listening on /player/events, the player is queried
+    once per STATUS_POLL_INTERVAL. Subscribers only receive a message when the
+    track, playback state, volume or settings change. The thread is started on
+    the first subscription and idles while nobody is listening.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.latest = None
+        self._latest_key = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        audtool.add_invalidation_callback(self.poke)
+
+    def subscribe(self):
+        """Register a new client and return the queue its messages arrive on."""
+        client = queue.Queue(maxsize=16)
+        with self._lock:
+            self._subscribers.add(client)
+            self._ensure_running()
+        self._wake.set()
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._subscribers.discard(client)
+
+    def publish(self, event, data):
+        """Send a message to every subscriber, dropping the oldest one for slow clients."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for client in subscribers:
+            try:
+                client.put_nowait((event, data))
+            except queue.Full:
+                try:
+                    client.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    client.put_nowait((event, data))
+                except queue.Full:
+                    # Another publisher refilled it first; this client misses one message
+                    pass
+
+    def poke(self):
+        """Wake the poller early, e.g. right after a command changed the player."""
+        self._wake.set()
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='status-poller', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self._wake.wait(self.app.config.get('STATUS_POLL_INTERVAL', 1.0))
+                self._wake.clear()
+
+                with self._lock:
+                    idle = not self._subscribers
+                if idle:
+                    # Forget the last state so a new subscriber gets a fresh one
+                    self.latest = None
+                    self._latest_key = None
+                    self._wake.wait()
+                    continue
+
+                try:
+                    self.poll()
+                except Exception as e:
+                    self.app.logger.error(f"Error polling player status: {e}")
+
+    def poll(self):
+        """Query the player once and publish the status if anything changed."""
+        status = build_player_status(audtool.get_player_snapshot())
+        key = _change_key(status)
+        if key != self._latest_key:
+            self.latest = status
+            self._latest_key = key
+            self.publish('status', status)
+
+
+# Global instance
+status_poller = StatusPoller()
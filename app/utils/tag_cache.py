@@ -0,0 +1,122 @@
+"""A persistent cache of the tags read from audio files.
+
+Reading tags parses the file's headers with mutagen; adding a directory again
+(after the tracks were removed, or the library was reset) or importing
+Audacious' playlists would read them all again. The cache keeps the fields
+read from each file in ``tag_cache.sqlite3`` in the data directory, keyed by
+path and checked against the file's size, mtime and inode, so any change to
+the file (or a different file at the same path) is read afresh.
+
+Hits and misses are counted in ``tag_cache_lookups_total`` on /metrics.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from app.utils import metrics
+from app.utils.data_service import data_service
+
+# New entries written per transaction
+COMMIT_BATCH = 500
+
+# SQLite limits the number of ? parameters in one statement
+_LOOKUP_CHUNK = 500
+
+
+def file_key(path):
+    """The (size, mtime_ns, inode) an entry must match, or None if the file can't be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class TagCache:
+    """Tags read before, by path. Does nothing until ``init_app`` opens the file."""
+
+    def __init__(self):
+        self.connection = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Open the cache file in the data directory, unless TAG_CACHE is off."""
+        if not app.config.get('TAG_CACHE', True) or self.connection is not None:
+            return
+        self.connection = sqlite3.connect(
+            os.path.join(data_service.storify.root, 'tag_cache.sqlite3'),
+            check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS tags '
+            '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, fields TEXT NOT NULL)'
+        )
+
+    def get_many(self, paths):
+        """Return {path: ((size, mtime_ns, inode), fields)} for the paths that have an entry."""
+        if self.connection is None:
+            return {}
+        entries = {}
+        paths = list(paths)
+        with self._lock:
+            for i in range(0, len(paths), _LOOKUP_CHUNK):
+                chunk = paths[i:i + _LOOKUP_CHUNK]
+                rows = self.connection.execute(
+                    f'SELECT path, size, mtime_ns, inode, fields FROM tags WHERE path IN ({",".join("?" * len(chunk))})',
+                    chunk
+                )
+                for path, size, mtime_ns, inode, fields in rows:
+                    entries[path] = ((size, mtime_ns, inode), json.loads(fields))
+        return entries
+
+    def get(self, path, key):
+        """The cached fields for path if its entry matches key, else None; counts the lookup."""
+        entry = self.get_many([path]).get(path)
+        hit = entry is not None and key is not None and entry[0] == key
+        self.count(hit)
+        return entry[1] if hit else None
+
+    def count(self, hit):
+        if self.connection is not None:
+            metrics.tag_cache_lookups.inc(result='hit' if hit else 'miss')
+
+    def put(self, path, key, fields):
+        """Remember the fields read from path; written with the next commit, or once a batch is full."""
+        if self.connection is None or key is None:
+            return
+        with self._lock:
+            self._pending.append((path, *key, json.dumps(fields)))
+            full = len(self._pending) >= COMMIT_BATCH
+        if full:
+            self.commit()
+
+    def commit(self):
+        """Write the entries added since the last commit."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending or self.connection is None:
+                return
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO tags (path, size, mtime_ns, inode, fields) VALUES (?, ?, ?, ?, ?)',
+                    pending
+                )
+                self.connection.execute('COMMIT')
+            except sqlite3.Error:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        if self.connection is not None:
+            self.commit()
+            self.connection.close()
+            self.connection = None
+
+
+# Global instance
+tag_cache = TagCache()
@@ -0,0 +1,241 @@
+from itertools import chain
+
+
+class _Block:
+    __slots__ = ('items', 'index')
+
+    def __init__(self, items, index):
+        self.items = items
+        self.index = index
+
+
+class TrackList:
+    """An ordered list of unique track ids with fast membership and positional edits.
+
+    Ids are kept in blocks of up to 2 * BLOCK_SIZE entries. A dict maps every
+    id to its block, so ``in`` is O(1), and a Fenwick tree over the block
+    sizes finds the block holding a position, or the position of a block, in
+    O(log n). insert, remove, index and pop therefore cost O(log n) plus a
+    list operation within one block, instead of O(n) on a plain list.
+
+    It behaves like the list it replaces for everything the app does with
+    ``Playlist.track_ids`` and serializes back to a plain list with
+    ``list(track_list)``. An id can only appear once; duplicates in the
+    initial ids are dropped, keeping the first.
+
+    ``on_change``, if set, is called after every edit with a description of
+    it: ``('insert', track_id, position)``, ``('extend', track_ids)``,
+    ``('remove', track_id)`` or ``('move', track_id, position)``, which
+    ``apply`` can replay.
+    """
+
+    BLOCK_SIZE = 512
+    on_change = None
+
+    def __init__(self, track_ids=()):
+        self._blocks = []
+        self._block_of = {}
+        self._tree = [0]
+        self._length = 0
+
+        ids = list(dict.fromkeys(track_ids))
+        for i in range(0, len(ids), self.BLOCK_SIZE):
+            block = _Block(ids[i:i + self.BLOCK_SIZE], len(self._blocks))
+            self._blocks.append(block)
+            self._block_of.update(dict.fromkeys(block.items, block))
+        self._length = len(ids)
+        self._rebuild_tree()
+
+    # Fenwick tree over block sizes
+    def _rebuild_tree(self):
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, 1):
+            block.index = i - 1
+            tree[i] += len(block.items)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add(self, block_index, delta):
+        i = block_index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, block_index):
+        """Number of ids in the blocks before block_index."""
+        total = 0
+        i = block_index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position):
+        """Return (block, offset) for 0 <= position < len(self)."""
+        i = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = i + step
+            if nxt < len(self._tree) and self._tree[nxt] <= position:
+                i = nxt
+                position -= self._tree[nxt]
+            step >>= 1
+        return self._blocks[i], position
+
+    def _normalize(self, position):
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError('track list index out of range')
+        return position
+
+    # List interface
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return chain.from_iterable(block.items for block in self._blocks)
+
+    def __contains__(self, track_id):
+        return track_id in self._block_of
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(self)[position]
+        block, offset = self._locate(self._normalize(position))
+        return block.items[offset]
+
+    def __eq__(self, other):
+        if isinstance(other, (TrackList, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TrackList({list(self)!r})"
+
+    def index(self, track_id):
+        block = self._block_of.get(track_id)
+        if block is None:
+            raise ValueError(f"{track_id!r} is not in track list")
+        return self._prefix(block.index) + block.items.index(track_id)
+
+    def insert(self, position, track_id):
+        """Insert track_id before position, clamped like list.insert."""
+        if track_id in self._block_of:
+            raise ValueError(f"{track_id!r} is already in track list")
+        position = self._insert(position, track_id)
+        self._changed('insert', track_id, position)
+
+    def _insert(self, position, track_id):
+        if position < 0:
+            position = max(0, position + self._length)
+        position = min(position, self._length)
+
+        if not self._blocks:
+            self._blocks.append(_Block([], 0))
+            self._rebuild_tree()
+        if position == self._length:
+            block, offset = self._blocks[-1], len(self._blocks[-1].items)
+        else:
+            block, offset = self._locate(position)
+
+        block.items.insert(offset, track_id)
+        self._block_of[track_id] = block
+        self._length += 1
+
+        if len(block.items) > 2 * self.BLOCK_SIZE:
+            # Split the block in two; block indexes shift, so rebuild the tree
+            tail = _Block(block.items[self.BLOCK_SIZE:], block.index + 1)
+            del block.items[self.BLOCK_SIZE:]
+            for moved in tail.items:
+                self._block_of[moved] = tail
+            self._blocks.insert(block.index + 1, tail)
+            self._rebuild_tree()
+        else:
+            self._add(block.index, 1)
+        return position
+
+    def append(self, track_id):
+        self.insert(self._length, track_id)
+
+    def extend(self, track_ids):
+        """Append track_ids, reported as a single edit however many there are."""
+        track_ids = list(track_ids)
+        seen = set()
+        for track_id in track_ids:
+            if track_id in self._block_of or track_id in seen:
+                raise ValueError(f"{track_id!r} is already in track list")
+            seen.add(track_id)
+        for track_id in track_ids:
+            self._insert(self._length, track_id)
+        if track_ids:
+            self._changed('extend', track_ids)
+
+    def remove(self, track_id):
+        self._remove(track_id)
+        self._changed('remove', track_id)
+
+    def _remove(self, track_id):
+        block = self._block_of.get(track_id)
+        if block is None:
+            raise ValueError(f"{track_id!r} is not in track list")
+        block.items.remove(track_id)
+        self._discard(block, track_id)
+
+    def pop(self, position=-1):
+        block, offset = self._locate(self._normalize(position))
+        track_id = block.items.pop(offset)
+        self._discard(block, track_id)
+        self._changed('remove', track_id)
+        return track_id
+
+    def move(self, track_id, position):
+        """Move track_id to position, as pop(index(track_id)) then insert(position) would."""
+        self._remove(track_id)
+        position = self._insert(position, track_id)
+        self._changed('move', track_id, position)
+
+    def _discard(self, block, track_id):
+        del self._block_of[track_id]
+        self._length -= 1
+        if block.items:
+            self._add(block.index, -1)
+        else:
+            del self._blocks[block.index]
+            self._rebuild_tree()
+
+    def apply(self, edit):
+        """Replay an edit reported to on_change, without reporting it again.
+
+        Returns False if it no longer applies (the id is already there, or
+        gone), so replaying an edit twice leaves the list unchanged.
+        """
+        if edit[0] == 'extend':
+            new_ids = [track_id for track_id in dict.fromkeys(edit[1]) if track_id not in self._block_of]
+            for track_id in new_ids:
+                self._insert(self._length, track_id)
+            return bool(new_ids)
+
+        op, track_id, *args = edit
+        if op == 'insert':
+            if track_id in self._block_of:
+                return False
+            self._insert(args[0], track_id)
+        elif op == 'remove':
+            if track_id not in self._block_of:
+                return False
+            self._remove(track_id)
+        elif op == 'move':
+            if track_id not in self._block_of:
+                return False
+            self._remove(track_id)
+            self._insert(args[0], track_id)
+        else:
+            raise ValueError(f"unknown track list edit {op!r}")
+        return True
+
+    def _changed(self, *edit):
+        if self.on_change is not None:
+            self.on_change(*edit)
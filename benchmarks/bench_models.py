@@ -0,0 +1,95 @@
+"""Measure the memory a loaded library costs per track.
+
+Each size is loaded in a fresh process the way the tracks database is: every
+track is decoded from its stored dict (fresh strings, as a decoder produces
+them) with Track._from_dict and kept in a dict by id, and one playlist holds
+all of their ids. Artists and albums repeat as in a real library (10 tracks
+per album, 10 albums per artist).
+
+    python -m benchmarks.bench_models --sizes 100000,1000000
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import report, rss_mb
+
+
+def stored_track(i, created_at):
+    """The dict a decoder would hand to Track._from_dict for track i."""
+    return {
+        'id': str(uuid.UUID(int=i)),
+        'title': f"Track {i}",
+        'artist': f"Artist {i // 100}",
+        'album': f"Album {i // 10}",
+        'length': f"{3 + i % 4}:{i % 60:02d}",
+        'length_seconds': 180 + i % 240,
+        'filename': f"/music/artist {i // 100:05d}/album {i // 10:06d}/{i % 10:02d} track.flac",
+        'created_at': (created_at + timedelta(seconds=i)).isoformat()
+    }
+
+
+def measure(size):
+    """Run in a child process: load size tracks and report the memory they take."""
+    from app.utils.models import Playlist, Track
+
+    created_at = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    gc.collect()
+    baseline = rss_mb()
+
+    def load():
+        tracks = {}
+        for i in range(size):
+            track = Track._from_dict(stored_track(i, created_at))
+            tracks[track.id] = track
+        playlist = Playlist._from_dict({
+            'id': 'all', 'name': 'Everything',
+            'created_at': created_at.isoformat(), 'updated_at': created_at.isoformat(),
+            'shuffle': False, 'repeat': False, 'stop_after_current': False, 'auto_advance': True,
+            # A separately decoded copy of the ids, as stored in the playlist
+            'track_ids': [str(uuid.UUID(int=i)) for i in range(size)],
+            'watch_paths': []
+        })
+        return tracks, playlist
+
+    tracks, playlist = load()
+    gc.collect()
+    used = (rss_mb() - baseline) * 2 ** 20
+    print(json.dumps({'bytes_per_track': used / size, 'total_mb': used / 2 ** 20}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--measure', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure)
+        return
+
+    rows = []
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    for size in (int(s) for s in args.sizes.split(',')):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_models', '--measure', str(size)],
+            capture_output=True, text=True, check=True, cwd=root, env=env
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        rows.append((
+            size,
+            f"{result['bytes_per_track']:.0f} B",
+            f"{result['total_mb']:.0f} MB"
+        ))
+
+    report('Memory of a loaded library', rows, ('tracks', 'per track', 'total'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Compare the cost of one /status worth of player queries per backend.
+
+The subprocess backend is pointed at app/utils/fake_audacious.py used as an
+audtool binary, so both backends run against the same fake player; a real
+audtool is cheaper to start than a Python interpreter, but still pays a
+fork/exec per query.
+
+    python -m benchmarks.bench_player_backend --rounds 20
+"""
+import argparse
+import os
+import tempfile
+
+from app.utils import audtool, player_backend
+from benchmarks.common import make_app, report, timed
+
+FAKE_AUDTOOL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'app', 'utils', 'fake_audacious.py')
+
+
+def status_round():
+    """The player queries made by one hit on /status."""
+    audtool.get_current_song_info()
+    audtool.get_playback_status()
+    audtool.get_volume()
+    audtool.get_playlist_position()
+    audtool.get_playlist_length()
+    audtool.get_repeat_status()
+    audtool.get_shuffle_status()
+    audtool.get_stop_after_status()
+    audtool.get_auto_advance_status()
+
+
+def run_backend(backend, rounds):
+    player_backend.set_backend(backend)
+    audtool.clear_playlist()
+    audtool.add_song('/music/artist/album/01 - first.flac')
+    audtool.play()
+    _, elapsed = timed(lambda: [status_round() for _ in range(rounds)])
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--backends', default='fake,subprocess',
+                        help='comma separated list of fake, subprocess, dbus')
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['FAKE_AUDACIOUS_STATE'] = os.path.join(tmp, 'state.json')
+        app = make_app()
+        with app.app_context():
+            for name in args.backends.split(','):
+                backend = player_backend.create_backend(name, FAKE_AUDTOOL)
+                elapsed = run_backend(backend, args.rounds)
+                rows.append((name, args.rounds, f"{elapsed / args.rounds * 1000:.2f} ms"))
+
+    report('Player queries for one /status request', rows, ('backend', 'rounds', 'per round'))
+
+
+if __name__ == '__main__':
+    main()
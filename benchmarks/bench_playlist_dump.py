@@ -0,0 +1,87 @@
+"""Time get_all_songs on large playlists.
+
+First runs the playlist-display parser checks from check_playlist_display
+(exits nonzero on a mismatch). Then reads back playlists of each size with three player calls per entry versus one playlist-display call
+plus batched filename lookups, against the fake Audacious in process and
+(with --subprocess) through app/utils/fake_audacious.py used as the audtool
+binary.
+
+    python -m benchmarks.bench_playlist_dump --sizes 100,1000,10000 --subprocess
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from app.utils import audtool, player_backend
+from benchmarks import check_playlist_display
+from benchmarks.bench_player_backend import FAKE_AUDTOOL
+from benchmarks.bench_playlist_load import make_urls
+from benchmarks.common import make_app, report, timed
+
+def count_calls(backend, func):
+    """Call func and return (result, elapsed seconds, player calls it made)."""
+    calls = 0
+    run, run_batch = backend.run, backend.run_batch
+
+    def counted_run(*args):
+        nonlocal calls
+        calls += 1
+        return run(*args)
+
+    def counted_batch(commands):
+        nonlocal calls
+        chunk = getattr(backend, 'BATCH_SIZE', 1)
+        calls += (len(commands) + chunk - 1) // chunk
+        return run_batch(commands)
+
+    backend.run = counted_run
+    if isinstance(backend, player_backend.SubprocessBackend):
+        backend.run_batch = counted_batch
+    try:
+        result, elapsed = timed(func)
+    finally:
+        del backend.run
+        backend.__dict__.pop('run_batch', None)
+    return result, elapsed, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000')
+    parser.add_argument('--subprocess', action='store_true',
+                        help='also measure the audtool subprocess backend')
+    parser.add_argument('--max-per-entry', type=int, default=300,
+                        help='skip per-entry reads through subprocesses above this size')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        failed = check_playlist_display.main()
+        print()
+
+        backends = ['fake'] + (['subprocess'] if args.subprocess else [])
+        rows = []
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ['FAKE_AUDACIOUS_STATE'] = os.path.join(tmp, 'state.json')
+            for name in backends:
+                backend = player_backend.create_backend(name, FAKE_AUDTOOL)
+                player_backend.set_backend(backend)
+                for size in (int(s) for s in args.sizes.split(',')):
+                    audtool.clear_playlist()
+                    audtool.add_songs(make_urls(size))
+                    for mode, reader in (('per entry', audtool._get_all_songs_individually),
+                                         ('bulk', audtool.get_all_songs)):
+                        if name == 'subprocess' and mode == 'per entry' and size > args.max_per_entry:
+                            rows.append((name, size, mode, 'skipped', '', ''))
+                            continue
+                        songs, elapsed, calls = count_calls(backend, reader)
+                        rows.append((name, size, mode, f"{elapsed * 1000:.1f} ms", calls, len(songs)))
+
+        report('Reading the player playlist', rows, ('backend', 'tracks', 'mode', 'time', 'calls', 'songs'))
+
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
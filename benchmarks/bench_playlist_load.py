@@ -0,0 +1,63 @@
+"""Time loading a playlist into the player, one add per track versus one bulk add.
+
+Runs against the fake Audacious, in process and (with --subprocess) through
+app/utils/fake_audacious.py used as the audtool binary, where every player
+call costs a process start like the real audtool.
+
+    python -m benchmarks.bench_playlist_load --sizes 100,1000,10000
+"""
+import argparse
+import os
+import tempfile
+
+from app.utils import audtool, player_backend
+from benchmarks.bench_player_backend import FAKE_AUDTOOL
+from benchmarks.common import make_app, report, timed
+
+
+def make_urls(count):
+    return [f"/music/artist {i // 100:03d}/album/{i:05d} - track.flac" for i in range(count)]
+
+
+def load_per_track(urls):
+    for url in urls:
+        audtool.add_song(url)
+
+
+def load_bulk(urls):
+    audtool.add_songs(urls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000')
+    parser.add_argument('--subprocess', action='store_true',
+                        help='also measure the audtool subprocess backend')
+    parser.add_argument('--max-per-track', type=int, default=1000,
+                        help='skip one-add-per-track runs through subprocesses above this size')
+    args = parser.parse_args()
+
+    backends = ['fake'] + (['subprocess'] if args.subprocess else [])
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['FAKE_AUDACIOUS_STATE'] = os.path.join(tmp, 'state.json')
+        app = make_app()
+        with app.app_context():
+            for name in backends:
+                player_backend.set_backend(player_backend.create_backend(name, FAKE_AUDTOOL))
+                for size in (int(s) for s in args.sizes.split(',')):
+                    urls = make_urls(size)
+                    for mode, loader in (('per track', load_per_track), ('bulk', load_bulk)):
+                        if name == 'subprocess' and mode == 'per track' and size > args.max_per_track:
+                            rows.append((name, size, mode, 'skipped', ''))
+                            continue
+                        audtool.clear_playlist()
+                        _, elapsed = timed(loader, urls)
+                        loaded = audtool.get_playlist_length()
+                        rows.append((name, size, mode, f"{elapsed * 1000:.1f} ms", loaded))
+
+    report('Playlist load time', rows, ('backend', 'tracks', 'mode', 'time', 'entries'))
+
+
+if __name__ == '__main__':
+    main()
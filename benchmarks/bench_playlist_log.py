@@ -0,0 +1,130 @@
+"""Compare playlist edits written through the playlist log with full rewrites.
+
+For each playlist size a data directory holding one playlist of that many
+tracks is created, then 200 edits (a mix of moves, removes and adds) are
+made, each followed by a write-behind flush as if the flusher ran after every
+request. ``full`` disables the log (PLAYLIST_LOG_COMPACT_ENTRIES=0), so every
+flush rewrites the playlist; ``log`` appends the edit instead. Each run is a
+fresh process per backend:
+
+- per edit: flush time and bytes written per edit
+- replay: loading the playlists again with the edits still in the log
+
+    python -m benchmarks.bench_playlist_log --sizes 10000,100000 --backend storify
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import make_app, report, timed
+
+EDITS = 200
+
+
+def bytes_written():
+    """Bytes this process has written so far, or None where /proc is not available."""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(backend, workdir, size, compact_at):
+    """Run in a child process: edit one playlist and time the flushes."""
+    os.chdir(workdir)
+    from app.utils.data_service import data_service
+    from app.utils.models import Playlist
+
+    app = make_app(STORAGE_BACKEND=backend, PERSIST_INTERVAL=3600, PLAYLIST_LOG_COMPACT_ENTRIES=compact_at)
+    data_service.init_app(app)
+    playlists_db = data_service.get_playlists_db()
+    playlist = Playlist(name='Everything', tracks=[f"track-{i:07d}" for i in range(size)])
+    playlists_db[playlist.id] = playlist
+    data_service.flush_dirty()
+
+    rng = random.Random(1)
+    before = bytes_written()
+    elapsed = 0.0
+    for i in range(EDITS):
+        track_ids = playlist.track_ids
+        kind = i % 3
+        if kind == 0:
+            track_ids.move(track_ids[rng.randrange(len(track_ids))], rng.randrange(len(track_ids)))
+        elif kind == 1:
+            track_ids.remove(track_ids[rng.randrange(len(track_ids))])
+        else:
+            track_ids.append(f"new-{i:07d}")
+        playlist.update_timestamp()
+        _, flush = timed(data_service.flush_dirty)
+        elapsed += flush
+    after = bytes_written()
+
+    written = None if before is None else (after - before) / EDITS
+    print(json.dumps({'flush': elapsed / EDITS, 'written': written, 'playlist': playlist.id}))
+
+
+def replay(backend, workdir, playlist_id):
+    """Run in a child process: time loading the edited playlist."""
+    os.chdir(workdir)
+    from app.utils.data_service import data_service
+
+    app = make_app(STORAGE_BACKEND=backend, PERSIST_INTERVAL=3600)
+    data_service.init_app(app)
+    _, elapsed = timed(lambda: data_service.get_playlists_db().data[playlist_id])
+    print(json.dumps({'replay': elapsed}))
+
+
+def run_child(root, *args):
+    env = dict(os.environ, PYTHONPATH=root)
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_playlist_log', *args],
+        capture_output=True, text=True, check=True, cwd=root, env=env
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--backend', default='storify', choices=('storify', 'sqlite'))
+    parser.add_argument('--measure', nargs=4, help=argparse.SUPPRESS)
+    parser.add_argument('--replay', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        backend, workdir, size, compact_at = args.measure
+        measure(backend, workdir, int(size), int(compact_at))
+        return
+    if args.replay:
+        replay(*args.replay)
+        return
+
+    rows = []
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for size in (int(s) for s in args.sizes.split(',')):
+        for mode, compact_at in (('full', 0), ('log', 10000)):
+            with tempfile.TemporaryDirectory() as workdir:
+                result = run_child(root, '--measure', args.backend, workdir, str(size), str(compact_at))
+                loaded = run_child(root, '--replay', args.backend, workdir, result['playlist'])
+            written = '-' if result['written'] is None else f"{result['written'] / 1024:.1f} KB"
+            rows.append((
+                size, mode,
+                f"{result['flush'] * 1000:.2f} ms",
+                written,
+                f"{loaded['replay'] * 1000:.0f} ms"
+            ))
+
+    report(f'{EDITS} playlist edits, one flush each ({args.backend})',
+           rows, ('tracks', 'mode', 'flush per edit', 'written per edit', 'load'))
+
+
+if __name__ == '__main__':
+    main()
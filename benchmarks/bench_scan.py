@@ -0,0 +1,135 @@
+"""Compare adding a directory of new files one by one with the pooled, batched path.
+
+Generates small tagged MP3 files and adds them to a playlist:
+
+- per file: add_track_to_playlist for each file, as scan_watch_path used to
+- pooled: add_tracks_to_playlist, reading tags in a pool of --workers threads
+  (and processes, when more than one CPU is available) and storing the new
+  tracks in batches
+- rescan: the last pooled set again after removing its tracks from the
+  library, so every file's tags come from the tag cache
+- lazy: add_tracks_to_playlist with LAZY_METADATA, where the call returns
+  once the tracks are stored under their file names and the enrichment
+  worker reads the tags afterwards
+
+"returned" is how long the call took, "tags read" how long until every
+track had its tags.
+
+``--latency`` adds a delay to every tag read to stand in for a network share,
+where opening and reading each file waits on a round trip.
+
+    python -m benchmarks.bench_scan --files 2000 --latency 0.005
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import make_app, report, timed
+
+# One MPEG-1 Layer III frame header (128 kbit/s, 44.1 kHz, stereo) padded to the frame size
+MP3_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+
+def make_files(directory, count):
+    """Write count tagged MP3 files of a few seconds each."""
+    from mutagen.id3 import ID3, TALB, TIT2, TPE1
+
+    os.makedirs(directory)
+    template = os.path.join(directory, 'template.mp3')
+    with open(template, 'wb') as f:
+        f.write(MP3_FRAME * 100)
+
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"{i:06d}.mp3")
+        shutil.copyfile(template, path)
+        tags = ID3()
+        tags.add(TIT2(encoding=3, text=f"Track {i}"))
+        tags.add(TPE1(encoding=3, text=f"Artist {i // 100}"))
+        tags.add(TALB(encoding=3, text=f"Album {i // 10}"))
+        tags.save(path)
+        paths.append(path)
+    os.remove(template)
+    return paths
+
+
+def with_latency(read_tags, latency):
+    def read(path):
+        time.sleep(latency)
+        return read_tags(path)
+    return read
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    try:
+        from app.utils import metadata, metrics
+        from app.utils.data_service import data_service
+        from app.utils.enrichment import enricher
+        from app.utils.playlist_service import PlaylistService
+        from app.utils.tag_cache import tag_cache
+
+        if args.latency:
+            metadata.read_tags = with_latency(metadata.read_tags, args.latency)
+
+        modes = [('per file', 'thread', 1), ('pooled', 'thread', 1), ('pooled', 'thread', args.workers)]
+        if (os.cpu_count() or 1) > 1:
+            modes.append(('pooled', 'process', os.cpu_count()))
+        modes.append(('rescan', 'thread', args.workers))
+        modes.append(('lazy', 'thread', args.workers))
+
+        rows = []
+        app = make_app(PLAYER_BACKEND='fake', PERSIST_INTERVAL=3600)
+        with app.app_context():
+            data_service.init_app(app)
+            tag_cache.init_app(app)
+            enricher.init_app(app)
+            for n, (name, executor, workers) in enumerate(modes):
+                if name == 'rescan':
+                    for track_id in playlist.track_ids:
+                        data_service.remove_track(track_id)
+                else:
+                    paths = make_files(os.path.join(workdir, f"music{n}"), args.files)
+                playlist = PlaylistService.create_playlist(f"Scan {n}")
+                app.config.update(METADATA_WORKERS=workers, METADATA_EXECUTOR=executor,
+                                  LAZY_METADATA=name == 'lazy')
+                hits = metrics.tag_cache_lookups.value(result='hit')
+
+                if name == 'per file':
+                    def scan():
+                        for path in paths:
+                            PlaylistService.add_track_to_playlist(playlist.id, path, sync_player=False)
+                else:
+                    def scan():
+                        PlaylistService.add_tracks_to_playlist(playlist.id, paths, sync_player=False)
+
+                start = time.perf_counter()
+                _, returned = timed(scan)
+                assert len(playlist.track_ids) == args.files
+                enricher.wait()
+                elapsed = time.perf_counter() - start
+                assert not data_service.pending_track_ids()
+                rows.append((name, executor if workers > 1 else '-', workers,
+                             f"{returned:.2f} s", f"{elapsed:.2f} s", f"{args.files / elapsed:.0f}/s",
+                             metrics.tag_cache_lookups.value(result='hit') - hits))
+            data_service.flush_dirty()
+            tag_cache.close()
+
+        report(f'Adding {args.files} new files (latency {args.latency * 1000:.0f} ms per file)',
+               rows, ('path', 'pool', 'workers', 'returned', 'tags read', 'files', 'cache hits'))
+    finally:
+        os.chdir('/')
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
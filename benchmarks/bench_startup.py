@@ -0,0 +1,103 @@
+"""Measure how long the server takes to become usable with a large library.
+
+For each library size a Storify data directory is generated (that many
+tracks, all in one playlist) and ``run.py`` is launched on it with the fake
+player. The script then polls the server and reports, from launch:
+
+- status: the first successful ``/status``, when the UI becomes usable
+- tracks: the first successful ``/playlists/current``, the track listing the
+  UI asks for next, which needs the whole library
+
+once with the tracks read in the background at startup (PRELOAD_TRACKS) and
+once with them read on first use.
+
+    python -m benchmarks.bench_startup --sizes 10000,100000
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.bench_storage import generate
+from benchmarks.common import report
+
+TIMEOUT = 300
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, start):
+    """Poll url until it answers with success and return the seconds since start."""
+    while time.perf_counter() - start < TIMEOUT:
+        try:
+            with urllib.request.urlopen(url, timeout=TIMEOUT) as response:
+                if json.load(response).get('success'):
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, ValueError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer within {TIMEOUT}s")
+
+
+def launch(root, workdir, preload):
+    """Start run.py on workdir and time the first /status and /playlists/current."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=root,
+        PORT=str(port),
+        DEBUG='False',
+        PLAYER_BACKEND='fake',
+        PRELOAD_TRACKS=str(preload)
+    )
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(root, 'run.py')],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        ready = wait_for(f"http://127.0.0.1:{port}/status", start)
+        tracks = wait_for(f"http://127.0.0.1:{port}/playlists/current", start)
+    finally:
+        server.terminate()
+        server.wait()
+    return ready, tracks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000')
+    args = parser.parse_args()
+
+    rows = []
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as workdir:
+            data_dir = os.path.join(workdir, 'data')
+            os.makedirs(data_dir)
+            generate(data_dir, size)
+
+            for preload in (True, False):
+                ready, tracks = launch(root, workdir, preload)
+                rows.append((
+                    size,
+                    'background' if preload else 'on first use',
+                    f"{ready * 1000:.0f} ms",
+                    f"{tracks * 1000:.0f} ms"
+                ))
+
+    report('Time from launching run.py', rows, ('tracks', 'library loaded', 'status', 'tracks'))
+
+
+if __name__ == '__main__':
+    main()
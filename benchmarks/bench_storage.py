@@ -0,0 +1,123 @@
+"""Compare the Storify and SQLite storage backends on startup, memory and flush cost.
+
+For each library size a Storify data directory is generated (that many tracks,
+all in one playlist) and migrated to SQLite. Each backend is then measured in
+a fresh process through DataService:
+
+- startup: opening the storage, listing the playlists and looking one track
+  up by filename, as the first requests do
+- memory: growth of the process' resident memory during startup
+- flush: writing one renamed track and one track added to the playlist
+
+    python -m benchmarks.bench_storage --sizes 10000,100000,500000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import make_app, report, rss_mb, timed
+
+
+def generate(data_dir, size):
+    """Write a Storify data directory with size tracks in one playlist."""
+    from storify import Storify
+    from app.utils.models import Playlist, Track, WatchPath
+
+    storify = Storify(root=data_dir, models=[Playlist, Track, WatchPath])
+    tracks = storify.get_db('tracks')
+    playlist = Playlist(name='Everything')
+    track_ids = []
+    for i in range(size):
+        track = Track(
+            title=f"Track {i}",
+            artist=f"Artist {i // 1000}",
+            album=f"Album {i // 10}",
+            length='3:00',
+            length_seconds=180,
+            filename=f"/music/artist {i // 1000:04d}/album {i // 10:05d}/{i:06d}.flac"
+        )
+        tracks[track.id] = track
+        track_ids.append(track.id)
+    playlist.track_ids = track_ids
+    storify.get_db('playlists')[playlist.id] = playlist
+    storify.get_db('watch_paths')
+    storify.flush()
+
+
+def measure(backend, workdir, size):
+    """Run in a child process: measure one backend through DataService."""
+    os.chdir(workdir)
+    from app.utils.data_service import data_service
+    from app.utils.models import Track
+
+    app = make_app(STORAGE_BACKEND=backend, PERSIST_INTERVAL=3600)
+    baseline = rss_mb()
+
+    def start():
+        data_service.init_app(app)
+        playlists = list(data_service.get_playlists_db().data.values())
+        filename = f"/music/artist {(size // 2) // 1000:04d}/album {(size // 2) // 10:05d}/{size // 2:06d}.flac"
+        return playlists, data_service.find_track_by_filename(filename)
+
+    (playlists, track), startup = timed(start)
+    memory = rss_mb() - baseline
+
+    track.title = 'Renamed'
+    new_track = data_service.add_track(Track(title='New', filename='/music/new.flac'))
+    playlists[0].track_ids.append(new_track.id)
+    written, flush = timed(data_service.flush_dirty)
+
+    print(json.dumps({'startup': startup, 'memory': memory, 'flush': flush, 'written': written}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--measure', nargs=3, metavar=('BACKEND', 'WORKDIR', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        backend, workdir, size = args.measure
+        measure(backend, workdir, int(size))
+        return
+
+    from app.utils.models import Playlist, Track, WatchPath
+    from app.utils.sqlite_store import migrate_from_storify
+
+    rows = []
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as workdir:
+            data_dir = os.path.join(workdir, 'data')
+            os.makedirs(data_dir)
+            generate(data_dir, size)
+
+            start = time.perf_counter()
+            migrate_from_storify(data_dir, os.path.join(data_dir, 'library.sqlite3'), [Playlist, Track, WatchPath])
+            migration = time.perf_counter() - start
+
+            for backend in ('storify', 'sqlite'):
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_storage', '--measure', backend, workdir, str(size)],
+                    capture_output=True, text=True, check=True, cwd=root, env=env
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                rows.append((
+                    size, backend,
+                    f"{result['startup'] * 1000:.0f} ms",
+                    f"{result['memory']:.0f} MB",
+                    f"{result['flush'] * 1000:.1f} ms",
+                    ','.join(result['written']),
+                    f"{migration * 1000:.0f} ms" if backend == 'sqlite' else ''
+                ))
+
+    report('Storage backends', rows, ('tracks', 'backend', 'startup', 'memory', 'flush', 'written', 'migration'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""Compare reading tags with mutagen against the header-only reader (fast_tags).
+
+Generates small files in each format fast_tags handles (MP3 with ID3v2, FLAC,
+Ogg Vorbis, Ogg Opus and M4A), each tagged by mutagen and optionally carrying
+embedded cover art, then reads every file both ways and reports per file the
+bytes read from disk (the process's read() total, as a network share would
+transfer them) and the wall time. Files where the two disagree on title,
+artist, album or whole-second length are counted as mismatches.
+
+First checks that formats fast_tags leaves to mutagen (WAV and AIFF whose
+samples happen to look like MPEG frames, and a WAV behind an ID3 tag) are
+handed back rather than misread as MP3, and exits nonzero if not.
+
+    python -m benchmarks.bench_tags --files 200 --cover-kb 200
+"""
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+from benchmarks.bench_scan import MP3_FRAME
+from benchmarks.common import report
+
+# Bytes of (incompressible-looking) audio data after the headers of every file
+AUDIO_BYTES = 512 * 1024
+
+
+def bytes_read():
+    """Bytes this process has read through read() calls so far."""
+    with open('/proc/self/io') as f:
+        for line in f:
+            if line.startswith('rchar:'):
+                return int(line.split()[1])
+    raise RuntimeError('/proc/self/io has no rchar')
+
+
+def cover(kb):
+    from mutagen.flac import Picture
+
+    picture = Picture()
+    picture.type = 3
+    picture.mime = 'image/jpeg'
+    picture.data = os.urandom(kb * 1024)
+    return picture
+
+
+def make_mp3(path, i, cover_kb):
+    from mutagen.id3 import APIC, ID3, TALB, TIT2, TPE1
+
+    with open(path, 'wb') as f:
+        f.write(MP3_FRAME * (AUDIO_BYTES // len(MP3_FRAME)))
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=f"Track {i}"))
+    tags.add(TPE1(encoding=3, text=f"Artist {i // 10}"))
+    tags.add(TALB(encoding=3, text=f"Album {i // 5}"))
+    if cover_kb:
+        tags.add(APIC(encoding=0, mime='image/jpeg', type=3, desc='', data=os.urandom(cover_kb * 1024)))
+    tags.save(path)
+
+
+def make_flac(path, i, cover_kb):
+    from mutagen.flac import FLAC
+
+    # STREAMINFO: 4096-sample blocks, 44.1 kHz stereo 16-bit, (180 + i) seconds
+    samples = 44100 * (180 + i % 60)
+    info = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+    info += ((44100 << 44) | (1 << 41) | (15 << 36) | samples).to_bytes(8, 'big') + b'\x00' * 16
+    with open(path, 'wb') as f:
+        f.write(b'fLaC' + bytes([0x80]) + len(info).to_bytes(3, 'big') + info)
+        f.write(b'\xff\xf8' + os.urandom(AUDIO_BYTES))
+    audio = FLAC(path)
+    audio['title'] = f"Track {i}"
+    audio['artist'] = f"Artist {i // 10}"
+    audio['album'] = f"Album {i // 5}"
+    if cover_kb:
+        audio.add_picture(cover(cover_kb))
+    audio.save()
+
+
+def make_ogg(path, i, cover_kb, opus):
+    from mutagen.oggopus import OggOpus
+    from mutagen.oggvorbis import OggVorbis
+    from mutagen.ogg import OggPage
+
+    serial = 0x1234 + i
+    if opus:
+        identification = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 48000, 0, 0)
+        headers = [[identification], [b'OpusTags' + struct.pack('<I', 0) + struct.pack('<I', 0)]]
+        rate = 48000
+    else:
+        identification = b'\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, 44100, 0, 128000, 0, 0xB8, 1)
+        comment = b'\x03vorbis' + struct.pack('<I', 0) + struct.pack('<I', 0) + b'\x01'
+        headers = [[identification], [comment, b'\x05vorbis' + b'\x00' * 32]]
+        rate = 44100
+
+    pages = []
+    for packets in headers:
+        page = OggPage()
+        page.serial, page.sequence, page.position = serial, len(pages), 0
+        page.packets = packets
+        page.first = len(pages) == 0
+        pages.append(page)
+    # Audio in pages of about 4 KB, as encoders write them
+    seconds = 180 + i % 60
+    count = AUDIO_BYTES // 4096
+    for n in range(count):
+        page = OggPage()
+        page.serial, page.sequence = serial, len(pages)
+        page.position = rate * seconds * (n + 1) // count + (312 if opus else 0)
+        page.packets = [os.urandom(4000)]
+        page.last = n == count - 1
+        pages.append(page)
+    with open(path, 'wb') as f:
+        for page in pages:
+            f.write(page.write())
+
+    audio = (OggOpus if opus else OggVorbis)(path)
+    audio['title'] = f"Track {i}"
+    audio['artist'] = f"Artist {i // 10}"
+    audio['album'] = f"Album {i // 5}"
+    if cover_kb:
+        import base64
+        audio['metadata_block_picture'] = base64.b64encode(cover(cover_kb).write()).decode('ascii')
+    audio.save()
+
+
+def pcm(seconds):
+    """16-bit stereo 44.1 kHz samples that happen to contain valid MPEG frames."""
+    size = 44100 * 4 * seconds
+    return (MP3_FRAME * (size // len(MP3_FRAME) + 1))[:size]
+
+
+def make_wav(path, seconds):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        f.writeframes(pcm(seconds))
+
+
+def make_aiff(path, seconds):
+    frames = 44100 * seconds
+    # COMM holds the sample rate as an 80-bit float: 44100 = 1.3458 * 2^15
+    comm = struct.pack('>hIh', 2, frames, 16) + b'\x40\x0e\xac\x44' + b'\x00' * 6
+    ssnd = struct.pack('>II', 0, 0) + pcm(seconds)
+    body = b'AIFF' + b'COMM' + struct.pack('>I', len(comm)) + comm + b'SSND' + struct.pack('>I', len(ssnd)) + ssnd
+    with open(path, 'wb') as f:
+        f.write(b'FORM' + struct.pack('>I', len(body)) + body)
+
+
+def make_id3_wav(path, seconds):
+    from mutagen.id3 import ID3, TIT2
+
+    make_wav(path, seconds)
+    with open(path, 'rb') as f:
+        wav = f.read()
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text='Tagged WAV'))
+    tags.save(path, v1=0)
+    with open(path, 'ab') as f:
+        f.write(wav)
+
+
+# Formats fast_tags must hand back to mutagen
+OTHER_FORMATS = {
+    'wav': make_wav,
+    'aiff': make_aiff,
+    'id3.wav': make_id3_wav,
+}
+
+
+def check_other_formats(workdir):
+    """Return the OTHER_FORMATS fast_tags read itself instead of returning None."""
+    from app.utils import fast_tags
+
+    failures = []
+    for name, make in OTHER_FORMATS.items():
+        path = os.path.join(workdir, f"other.{name}")
+        make(path, 2)
+        tags = fast_tags.read(path)
+        if tags is not None:
+            failures.append(f"{name}: {tags}")
+    return len(OTHER_FORMATS), failures
+
+
+def atom(kind, *children):
+    body = b''.join(children)
+    return struct.pack('>I4s', 8 + len(body), kind) + body
+
+
+def make_m4a(path, i, cover_kb):
+    from mutagen.mp4 import MP4, MP4Cover
+
+    timescale, duration = 44100, 44100 * (180 + i % 60)
+    mvhd = atom(b'mvhd', struct.pack('>B3xIIII', 0, 0, 0, 1000, duration * 1000 // timescale), b'\x00' * 80)
+    mdhd = atom(b'mdhd', struct.pack('>B3xIIIIHH', 0, 0, 0, timescale, duration, 0, 0))
+    hdlr = atom(b'hdlr', struct.pack('>B3xI4s12x', 0, 0, b'soun'), b'\x00')
+    stsd = atom(b'stsd', struct.pack('>B3xI', 0, 0))
+    moov = atom(b'moov', mvhd, atom(b'trak', atom(b'mdia', mdhd, hdlr, atom(b'minf', atom(b'stbl', stsd)))))
+    with open(path, 'wb') as f:
+        f.write(atom(b'ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom'))
+        f.write(atom(b'mdat', os.urandom(AUDIO_BYTES)))
+        f.write(moov)
+
+    audio = MP4(path)
+    audio['\xa9nam'] = f"Track {i}"
+    audio['\xa9ART'] = f"Artist {i // 10}"
+    audio['\xa9alb'] = f"Album {i // 5}"
+    if cover_kb:
+        audio['covr'] = [MP4Cover(os.urandom(cover_kb * 1024), MP4Cover.FORMAT_JPEG)]
+    audio.save()
+
+
+FORMATS = {
+    'mp3': make_mp3,
+    'flac': make_flac,
+    'ogg': lambda path, i, cover_kb: make_ogg(path, i, cover_kb, opus=False),
+    'opus': lambda path, i, cover_kb: make_ogg(path, i, cover_kb, opus=True),
+    'm4a': make_m4a,
+}
+
+
+def mp4_tags(path, tags):
+    """Add the MP4 atoms read_tags' mutagen path doesn't look at, for comparing results."""
+    from mutagen.mp4 import MP4
+
+    audio = MP4(path)
+    for field, key in (('title', '\xa9nam'), ('artist', '\xa9ART'), ('album', '\xa9alb')):
+        if key in audio.tags:
+            tags[field] = audio.tags[key][0]
+    return tags
+
+
+def measure(read, paths):
+    """Return (bytes read per file, ms per file, results)."""
+    results = []
+    before = bytes_read()
+    start = time.perf_counter()
+    for path in paths:
+        results.append(read(path))
+    elapsed = time.perf_counter() - start
+    return (bytes_read() - before) / len(paths), elapsed * 1000 / len(paths), results
+
+
+def same(fast, slow):
+    if fast is None:
+        return True
+    return (all(fast.get(field) == slow.get(field) for field in ('title', 'artist', 'album'))
+            and int(fast['length']) == int(slow.get('length') or 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--cover-kb', type=int, default=200)
+    args = parser.parse_args()
+
+    from app.utils import fast_tags, metadata
+
+    rows = []
+    workdir = tempfile.mkdtemp()
+    try:
+        total, failures = check_other_formats(workdir)
+        print(f"Other formats: {total - len(failures)}/{total} left to mutagen")
+        for failure in failures:
+            print(f"  read as MP3: {failure}")
+        print()
+
+        for name, make in FORMATS.items():
+            for cover_kb in sorted({0, args.cover_kb}):
+                paths = []
+                for i in range(args.files):
+                    path = os.path.join(workdir, f"{name}-{cover_kb}-{i:05d}.{name}")
+                    make(path, i, cover_kb)
+                    paths.append(path)
+
+                slow_bytes, slow_ms, slow = measure(metadata._read_mutagen, paths)
+                if name == 'm4a':
+                    slow = [mp4_tags(path, tags) for path, tags in zip(paths, slow)]
+                fast_bytes, fast_ms, fast = measure(fast_tags.read, paths)
+                rows.append((
+                    name, f"{cover_kb} KB",
+                    f"{slow_bytes / 1024:.1f} KB", f"{fast_bytes / 1024:.1f} KB",
+                    f"{slow_ms:.3f} ms", f"{fast_ms:.3f} ms",
+                    sum(result is None for result in fast),
+                    sum(not same(f, s) for f, s in zip(fast, slow))
+                ))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(f'Reading tags of {args.files} files per row, per file',
+           rows, ('format', 'cover', 'mutagen read', 'fast read', 'mutagen time', 'fast time',
+                  'fallbacks', 'mismatches'))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Compare TrackList with a plain list for the playlist edits the app makes.
+
+Each size starts from a playlist of that many tracks and times 1000 of each
+operation as PlaylistService performs them: adding a track (membership check,
+then append), removing one, moving one (index, pop, insert) and looking one up.
+
+    python -m benchmarks.bench_track_list --sizes 1000,10000,100000
+"""
+import argparse
+import random
+
+from app.utils.track_list import TrackList
+from benchmarks.common import report, timed
+
+OPERATIONS = 1000
+
+
+def add(ids, new_ids):
+    for track_id in new_ids:
+        if track_id not in ids:
+            ids.append(track_id)
+
+
+def remove(ids, victims):
+    for track_id in victims:
+        if track_id in ids:
+            ids.remove(track_id)
+
+
+def move(ids, moves):
+    for track_id, position in moves:
+        current = ids.index(track_id)
+        ids.pop(current)
+        ids.insert(position, track_id)
+
+
+def contains(ids, probes):
+    return sum(1 for track_id in probes if track_id in ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rows = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        rng = random.Random(args.seed)
+        base = [f"track-{i:07d}" for i in range(size)]
+        new_ids = [f"new-{i:07d}" for i in range(OPERATIONS)]
+        victims = rng.sample(base, min(OPERATIONS, size))
+        moves = [(rng.choice(base), rng.randrange(size)) for _ in range(OPERATIONS)]
+        probes = rng.sample(base, min(OPERATIONS, size))
+
+        for name, factory in (('list', list), ('TrackList', TrackList)):
+            _, build = timed(factory, base)
+            row = [size, name, f"{build * 1000:.1f} ms"]
+            for func, data in ((add, new_ids), (remove, victims), (move, moves), (contains, probes)):
+                ids = factory(base)
+                _, elapsed = timed(func, ids, data)
+                row.append(f"{elapsed * 1000:.1f} ms")
+            rows.append(row)
+
+    report(f'{OPERATIONS} playlist edits of each kind',
+           rows, ('tracks', 'container', 'build', 'add', 'remove', 'move', 'contains'))
+
+
+if __name__ == '__main__':
+    main()
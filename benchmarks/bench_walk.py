@@ -0,0 +1,142 @@
+"""Compare listing a watch path with glob against the streaming scandir walker.
+
+Generates a tree of empty files (--files of them, --per-dir to a directory,
+one in ten with a non-audio extension) and lists the audio files in it:
+
+- glob: glob.glob('**/*') into a list, then os.path.isfile and the extension
+  check on every entry, as scan_watch_path used to
+- scandir: filesystem.iter_audio_files, consumed as it yields
+
+reporting the time to the first file, the total time and the peak Python
+memory (tracemalloc). Then both feed add_tracks_to_playlist with
+LAZY_METADATA and the fake player, and the time until the first track is in
+the playlist is reported.
+
+    python -m benchmarks.bench_walk --files 1000000
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from benchmarks.common import make_app, report
+
+
+def make_tree(root, files, per_dir):
+    """Create files empty files, per_dir to a directory, in directories of up to 100 subdirectories."""
+    for i in range(files):
+        if i % per_dir == 0:
+            directory = os.path.join(root, f"{i // per_dir // 100:04d}", f"{i // per_dir % 100:02d}")
+            os.makedirs(directory)
+        extension = 'jpg' if i % 10 == 9 else 'mp3'
+        open(os.path.join(directory, f"{i:07d}.{extension}"), 'wb').close()
+
+
+def glob_files(directory, extensions):
+    audio_files = []
+    for file_path in glob.glob(f"{directory}/**/*", recursive=True):
+        if os.path.isfile(file_path):
+            if os.path.splitext(file_path)[1][1:].lower() in extensions:
+                audio_files.append(file_path)
+    return audio_files
+
+
+def measure(walk):
+    """Consume walk(); return (seconds to the first path, seconds in all, count, peak MB).
+
+    Memory is measured in a second run, since tracing allocations slows the walk.
+    """
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in walk():
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _ in walk():
+        pass
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return first, elapsed, count, peak
+
+
+def first_track(playlist, add):
+    """Run add() and return (seconds until the playlist had a track, seconds in all)."""
+    seen = []
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            if len(playlist.track_ids):
+                seen.append(time.perf_counter())
+                return
+            time.sleep(0.0005)
+
+    watcher = threading.Thread(target=watch)
+    start = time.perf_counter()
+    watcher.start()
+    add()
+    elapsed = time.perf_counter() - start
+    done.set()
+    watcher.join()
+    return (seen[0] if seen else time.perf_counter()) - start, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--per-dir', type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    try:
+        from app.utils import filesystem
+        from app.utils.data_service import data_service
+        from app.utils.playlist_service import PlaylistService
+
+        music = os.path.join(workdir, 'music')
+        make_tree(music, args.files, args.per_dir)
+
+        app = make_app(PLAYER_BACKEND='fake', PERSIST_INTERVAL=3600, LAZY_METADATA=True)
+        extensions = app.config['ALLOWED_EXTENSIONS']
+        walks = {
+            'glob': lambda: glob_files(music, extensions),
+            'scandir': lambda: filesystem.iter_audio_files(music, extensions),
+        }
+
+        rows = []
+        with app.app_context():
+            for name, walk in walks.items():
+                first, elapsed, count, peak = measure(walk)
+                rows.append((name, count, f"{first * 1000:.1f} ms", f"{elapsed:.2f} s", f"{peak:.1f} MB"))
+        report(f'Listing {args.files} files', rows, ('walker', 'audio files', 'first file', 'all', 'peak memory'))
+
+        rows = []
+        with app.app_context():
+            data_service.init_app(app)
+            for name, walk in walks.items():
+                playlist = PlaylistService.create_playlist(name)
+                first, elapsed = first_track(
+                    playlist, lambda: PlaylistService.add_tracks_to_playlist(playlist.id, walk(), sync_player=False)
+                )
+                rows.append((name, len(playlist.track_ids), f"{first * 1000:.0f} ms", f"{elapsed:.2f} s"))
+                for track_id in list(playlist.track_ids):
+                    data_service.remove_track(track_id)
+            data_service.flush_dirty()
+        report(f'Adding {args.files} files to a playlist (LAZY_METADATA)',
+               rows, ('walker', 'tracks', 'first track', 'all'))
+    finally:
+        os.chdir('/')
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Check the playlist-display parser against the dumps in corpus/playlist_display/.
+
+Every dump is parsed with audtool.parse_playlist_display and compared with
+its entry in expected.json (None for output that must be rejected). The
+dumps follow audtool's own format strings: titles padded to 60 characters
+(counted in UTF-8 characters, so CJK and combining marks line up
+differently), lengths as m:ss even past an hour, no length at all for
+streams, and an h:mm:ss total. They cover an empty playlist, a long one,
+non-ASCII titles and titles containing " | " and digits.
+
+The same titles are then loaded into the fake player, whose dump must parse
+back to the same entries, so the fake audtool keeps printing what the
+parser expects. Exits nonzero on any mismatch.
+
+    python -m benchmarks.check_playlist_display
+"""
+import json
+import os
+import sys
+
+from app.utils import audtool
+from app.utils.fake_audacious import FakeAudacious
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'corpus', 'playlist_display')
+
+
+def _first_difference(parsed, expected):
+    if parsed == expected:
+        return None
+    if parsed is None or expected is None:
+        return f"got {parsed!r}, expected {expected!r}"
+    if len(parsed) != len(expected):
+        return f"got {len(parsed)} entries, expected {len(expected)}"
+    for got, want in zip(parsed, expected):
+        if got != want:
+            return f"got {got!r}, expected {want!r}"
+
+
+def _seconds(length):
+    minutes, seconds = length.split(':')
+    return int(minutes) * 60 + int(seconds)
+
+
+def check_corpus():
+    """Parse every corpus dump; return (dumps checked, failure messages)."""
+    with open(os.path.join(CORPUS, 'expected.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+
+    failures = []
+    for name, entries in sorted(expected.items()):
+        with open(os.path.join(CORPUS, name), encoding='utf-8') as f:
+            difference = _first_difference(audtool.parse_playlist_display(f.read()), entries)
+        if difference:
+            failures.append(f"{name}: {difference}")
+    return len(expected), failures
+
+
+def check_fake_player():
+    """Dump the corpus playlists from the fake player; return (dumps checked, failure messages)."""
+    with open(os.path.join(CORPUS, 'expected.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+
+    checked = 0
+    failures = []
+    for name, entries in sorted(expected.items()):
+        # The fake titles entries after their file names and knows every length
+        if entries is None or any('/' in entry['title'] or entry['length'] is None for entry in entries):
+            continue
+        filenames = [f"/music/{entry['title']}.mp3" for entry in entries]
+        player = FakeAudacious({filename: _seconds(entry['length'])
+                                for filename, entry in zip(filenames, entries)})
+        for filename in filenames:
+            player.execute('playlist-addurl', filename)
+        returncode, output = player.execute('playlist-display')
+        difference = _first_difference(audtool.parse_playlist_display(output), entries)
+        if returncode or difference:
+            failures.append(f"fake {name}: {difference or f'exit status {returncode}'}")
+        checked += 1
+    return checked, failures
+
+
+def main():
+    failures = []
+    for label, check in (('Parser corpus', check_corpus), ('Fake player dumps', check_fake_player)):
+        total, failed = check()
+        print(f"{label}: {total - len(failed)}/{total} parsed as expected")
+        for failure in failed:
+            print(f"  mismatch: {failure}")
+        failures.extend(failed)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
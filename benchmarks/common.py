@@ -0,0 +1,40 @@
+"""Shared helpers for the benchmark scripts."""
+import os
+import resource
+import time
+
+from flask import Flask
+
+
+def make_app(**config):
+    """Create a bare Flask app carrying the project config, for an app context."""
+    app = Flask('benchmarks')
+    app.config.from_object('config')
+    app.config.update(config)
+    return app
+
+
+def rss_mb():
+    """Current resident memory; peak RSS where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(func, *args, **kwargs):
+    """Call func and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def report(title, rows, headers):
+    """Print a simple aligned table."""
+    print(title)
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
+    print()
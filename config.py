@@ -27,6 +27,50 @@ DATA_DIR = expand_path(os.getenv('DATA_DIR', './data'))
 # Audacious settings
 AUDACIOUS_DEFAULT_DIR = expand_path(os.getenv('AUDACIOUS_DEFAULT_DIR', '~/Music'))
 AUDTOOL_COMMAND = os.getenv('AUDTOOL_COMMAND', 'audtool')
+# How to reach Audacious: auto (D-Bus if available, else audtool), dbus, subprocess or fake
+PLAYER_BACKEND = os.getenv('PLAYER_BACKEND', 'auto')
+# Seconds a player status snapshot is shared between requests
+PLAYER_SNAPSHOT_TTL = float(os.getenv('PLAYER_SNAPSHOT_TTL', '0.25'))
+# Seconds between player checks made by the background poller behind /player/events
+STATUS_POLL_INTERVAL = float(os.getenv('STATUS_POLL_INTERVAL', '1.0'))
+# Seconds between real playback position queries while a song keeps playing
+PLAYER_POSITION_RESYNC = float(os.getenv('PLAYER_POSITION_RESYNC', '10.0'))
+# Start playlists at the chosen track and add the rest in the background
+PROGRESSIVE_PLAYLIST_START = os.getenv('PROGRESSIVE_PLAYLIST_START', 'True') == 'True'
+# Tracks added per player call by the background playlist loader
+PLAYLIST_LOAD_CHUNK = int(os.getenv('PLAYLIST_LOAD_CHUNK', '500'))
+# Seconds the mirrored repeat/shuffle/stop-after/auto-advance state is trusted
+PLAYER_SETTINGS_MAX_AGE = float(os.getenv('PLAYER_SETTINGS_MAX_AGE', '30.0'))
+# Seconds a single player call may take before it is abandoned
+AUDTOOL_TIMEOUT = float(os.getenv('AUDTOOL_TIMEOUT', '2.0'))
+# Player calls allowed in flight at once, across all requests and threads
+PLAYER_MAX_CONCURRENT_CALLS = int(os.getenv('PLAYER_MAX_CONCURRENT_CALLS', '4'))
+# Consecutive unreachable-player failures before player calls are paused
+PLAYER_BREAKER_THRESHOLD = int(os.getenv('PLAYER_BREAKER_THRESHOLD', '3'))
+# Seconds before the first probe of a paused player, doubling up to the maximum
+PLAYER_BREAKER_BACKOFF = float(os.getenv('PLAYER_BREAKER_BACKOFF', '1.0'))
+PLAYER_BREAKER_MAX_BACKOFF = float(os.getenv('PLAYER_BREAKER_MAX_BACKOFF', '30.0'))
+# Minimum seconds between volume (or seek) commands sent while a slider is dragged
+PLAYER_COMMAND_INTERVAL = float(os.getenv('PLAYER_COMMAND_INTERVAL', '0.1'))
+# Where data is kept: 'storify' (msgpack files) or 'sqlite' (one indexed SQLite file)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'storify')
+# Seconds between background writes of changed databases to disk
+PERSIST_INTERVAL = float(os.getenv('PERSIST_INTERVAL', '5.0'))
+# Changes that trigger a write before PERSIST_INTERVAL has passed
+PERSIST_MAX_PENDING = int(os.getenv('PERSIST_MAX_PENDING', '500'))
+# Playlist log entries that trigger writing the edited playlists in full; 0 disables the log
+PLAYLIST_LOG_COMPACT_ENTRIES = int(os.getenv('PLAYLIST_LOG_COMPACT_ENTRIES', '10000'))
+# Load the track library in a background thread at startup instead of on first use
+PRELOAD_TRACKS = os.getenv('PRELOAD_TRACKS', 'True') == 'True'
+# Files whose tags are read at once when scanning a directory, and whether by threads or processes
+METADATA_WORKERS = int(os.getenv('METADATA_WORKERS', '8'))
+METADATA_EXECUTOR = os.getenv('METADATA_EXECUTOR', 'thread')
+
+# Remember the tags read from each file and reuse them while the file is unchanged
+TAG_CACHE = os.getenv('TAG_CACHE', 'True') == 'True'
+
+# Add new files under their file names at once and read their tags in the background
+LAZY_METADATA = os.getenv('LAZY_METADATA', 'False') == 'True'
 
 # File browser settings
 FILE_BROWSER_ROOT = expand_path(os.getenv('FILE_BROWSER_ROOT', AUDACIOUS_DEFAULT_DIR))
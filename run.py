@@ -1,6 +1,7 @@
 from app import create_app
+import os
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=app.config['DEBUG']) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=app.config['DEBUG'])
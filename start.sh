@@ -24,4 +24,4 @@ fi
 
 # Run the application
 echo "Starting music player..."
-python3 run.py
\ No newline at end of file
+exec python3 run.py
\ No newline at end of file